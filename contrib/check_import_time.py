@@ -0,0 +1,94 @@
+"""
+Cold start budget for the electrumsv-sdk cli.
+
+Runs each command under `python -X importtime` and fails if the cumulative import time of the
+`electrumsv_sdk` package exceeds the budget (the best of several runs is used to smooth out noise).
+Also fails if a heavy dependency (or asyncio) is imported on a path that does not need it.
+
+Usage:
+    python3 ./contrib/check_import_time.py [--budget-ms=150] [--runs=5]
+
+The budget can also be set via the SDK_IMPORT_TIME_BUDGET_MS environment variable.
+"""
+import argparse
+import logging
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Set, Tuple
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger('script')
+
+DEFAULT_BUDGET_MS = int(os.environ.get("SDK_IMPORT_TIME_BUDGET_MS", 150))
+
+# command args -> heavy modules that must not be imported for this command
+COMMANDS: Dict[Tuple[str, ...], Set[str]] = {
+    ("status",): {"bitcoinx", "colorama", "electrumsv_node", "psutil", "requests", "tailer",
+        "aiohttp", "asyncio"},
+    ("node", "getinfo"): {"bitcoinx", "colorama", "psutil", "tailer", "aiohttp", "asyncio"},
+}
+
+# e.g. "import time:       387 |      74266 |   electrumsv_sdk.commands"
+IMPORTTIME_REGEX = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+class ImportTimeBudgetExceededError(Exception):
+    pass
+
+
+def measure(args: Tuple[str, ...]) -> Tuple[float, Set[str]]:
+    """returns the cumulative import time (ms) of 'electrumsv_sdk' and all imported modules"""
+    process = subprocess.run([sys.executable, "-X", "importtime", "-m", "electrumsv_sdk", *args],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    # the exit code is ignored - 'node getinfo' fails if no node is running but the imports
+    # have already happened by then
+    package_time_us = 0
+    imported_modules: Set[str] = set()
+    for line in process.stderr.splitlines():
+        match = IMPORTTIME_REGEX.match(line)
+        if not match:
+            continue
+        module_name = match.group(4)
+        imported_modules.add(module_name.split(".")[0])
+        if module_name == "electrumsv_sdk":
+            package_time_us = int(match.group(2))
+    return package_time_us / 1000, imported_modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="electrumsv-sdk cold start time budget")
+    parser.add_argument("--budget-ms", type=int, default=DEFAULT_BUDGET_MS,
+        help="maximum cumulative import time of the electrumsv_sdk package")
+    parser.add_argument("--runs", type=int, default=5, help="number of runs per command")
+    parsed_args = parser.parse_args()
+
+    failures: List[str] = []
+    for args, forbidden_modules in COMMANDS.items():
+        command = " ".join(args)
+        timings = []
+        for _ in range(parsed_args.runs):
+            elapsed_ms, imported_modules = measure(args)
+            timings.append(elapsed_ms)
+
+        best_ms = min(timings)
+        logger.debug(f"'{command}': best={best_ms:.1f}ms, worst={max(timings):.1f}ms "
+            f"(budget={parsed_args.budget_ms}ms)")
+        if best_ms > parsed_args.budget_ms:
+            failures.append(f"'{command}' took {best_ms:.1f}ms to import which is over the "
+                f"budget of {parsed_args.budget_ms}ms")
+
+        unexpected_imports = forbidden_modules & imported_modules
+        if unexpected_imports:
+            failures.append(f"'{command}' imported: {sorted(unexpected_imports)} - these should "
+                f"only be imported on the code paths that use them")
+
+    if failures:
+        raise ImportTimeBudgetExceededError("\n".join(failures))
+
+    logger.debug("Import time is within budget for all commands")
+
+
+if __name__ == "__main__":
+    main()
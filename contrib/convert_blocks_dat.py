@@ -0,0 +1,33 @@
+"""
+Converts hex-per-line '.dat' block files (as written by older versions of
+`utils.write_raw_blocks_to_file`) to indexed binary block archives (see:
+electrumsv_sdk/block_archive.py).
+
+Usage:
+    python3 ./contrib/convert_blocks_dat.py [--start-height=0] <file.dat> [<file.dat> ...]
+
+Each '<name>.dat' is converted to '<name>.blocks' (and '<name>.blocks.index') alongside it. The
+'.dat' files do not record the heights of the blocks so they are numbered from --start-height.
+"""
+import argparse
+import logging
+
+from electrumsv_sdk.block_archive import convert_dat_file
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger('script')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="convert .dat block files to block archives")
+    parser.add_argument("--start-height", type=int, default=0,
+        help="the height of the first block in each file (default: 0)")
+    parser.add_argument("dat_files", nargs="+", help="hex-per-line block files")
+    parsed_args = parser.parse_args()
+
+    for dat_file in parsed_args.dat_files:
+        convert_dat_file(dat_file, start_height=parsed_args.start_height)
+
+
+if __name__ == "__main__":
+    main()
@@ -29,7 +29,7 @@ try:
     commands.start("node", component_id='node2')
 
     # Cleanup from previous runs (if any)
-    for filepath in ("common_blocks.dat", "node1_blocks.dat", "node2_blocks.dat"):
+    for filepath in ("common_blocks.blocks", "node1_blocks.blocks", "node2_blocks.blocks"):
         try:
             utils.delete_raw_blocks_file(filepath)
         except FileNotFoundError:
@@ -37,12 +37,12 @@ try:
 
     electrumsv_node.is_node_running()
 
-    # Generate common_blocks.dat
+    # Generate common_blocks.blocks
     utils.call_any_node_rpc('generatetoaddress', 200, slush_fund_address, node_id='node1')
-    utils.write_raw_blocks_to_file(filepath="common_blocks.dat", node_id='node1')
+    utils.write_raw_blocks_to_file(filepath="common_blocks.blocks", node_id='node1')
 
     # Submit common_blocks to node2 so that both nodes are equivalent
-    utils.submit_blocks_from_file(node_id='node2', filepath='common_blocks.dat')
+    utils.submit_blocks_from_file(node_id='node2', filepath='common_blocks.blocks')
 
     # Node1: Send 100 bitcoins to ElectrumSV 1st receive address and mine 1 block
     utils.call_any_node_rpc('importprivkey', slush_fund_private_key, 'slush_fund_key',
@@ -52,7 +52,7 @@ try:
     rawtx = utils.call_any_node_rpc('getrawtransaction', txid, node_id='node1')['result']
 
     utils.call_any_node_rpc('generate', 1, node_id='node1')
-    utils.write_raw_blocks_to_file(filepath="node1_blocks.dat", node_id='node1')
+    utils.write_raw_blocks_to_file(filepath="node1_blocks.blocks", node_id='node1')
 
     # Node2: Mine another empty block and **THEN** send 100 bitcoins to ElectrumSV 1st
     #   receive address and mine 1 block (will have a chain length advantage of 1)
@@ -61,6 +61,6 @@ try:
     utils.call_any_node_rpc('generate', 1, node_id='node2')
     utils.call_any_node_rpc('sendrawtransaction', rawtx, node_id='node2')
     utils.call_any_node_rpc('generate', 1, node_id='node2')
-    utils.write_raw_blocks_to_file(filepath="node2_blocks.dat", node_id='node2')
+    utils.write_raw_blocks_to_file(filepath="node2_blocks.blocks", node_id='node2')
 finally:
     commands.stop()
@@ -7,6 +7,6 @@ logger = logging.getLogger("simulate-fresh-reorg")
 
 
 if electrumsv_node.is_node_running():
-    utils.submit_blocks_from_file(node_id='node1', filepath='node1_blocks.dat')
+    utils.submit_blocks_from_file(node_id='node1', filepath='node1_blocks.blocks')
 else:
     logger.exception("node unavailable")
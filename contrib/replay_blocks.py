@@ -0,0 +1,42 @@
+"""
+Replays the blocks of a block file (a block archive or a hex-per-line '.dat' file) onto a running
+node (see: `utils.submit_blocks_from_file`) and reports the throughput e.g. to seed a fresh node
+for a reorg or to benchmark block processing.
+
+Usage:
+    python3 ./contrib/replay_blocks.py [--node-id=node1] [--from-height=N] [--to-height=N]
+        [--window=16] [--first-height=0] <file>
+"""
+import argparse
+import logging
+import sys
+
+from electrumsv_sdk import utils
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger('script')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="submit the blocks of a block file to a node")
+    parser.add_argument("--node-id", default="node1", help="the node component (default: node1)")
+    parser.add_argument("--from-height", type=int, default=None,
+        help="the first height to submit (default: the first block of the file)")
+    parser.add_argument("--to-height", type=int, default=None,
+        help="the last height to submit (default: the last block of the file)")
+    parser.add_argument("--window", type=int, default=utils.SUBMIT_WINDOW,
+        help=f"the maximum number of blocks per batch (default: {utils.SUBMIT_WINDOW})")
+    parser.add_argument("--first-height", type=int, default=0,
+        help="the height of the first block of a '.dat' file (default: 0)")
+    parser.add_argument("file", help="a block archive or '.dat' file")
+    parsed_args = parser.parse_args()
+
+    result = utils.submit_blocks_from_file(parsed_args.node_id, parsed_args.file,
+        from_height=parsed_args.from_height, to_height=parsed_args.to_height,
+        window=parsed_args.window, first_height=parsed_args.first_height)
+    if result['rejected']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
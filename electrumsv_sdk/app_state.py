@@ -5,8 +5,6 @@ from pathlib import Path
 import sys
 from typing import List, Optional
 
-from electrumsv_node import electrumsv_node
-
 from .argparsing import ArgParser
 from .config import Config
 from .constants import NameSpace, LOG_LEVEL
@@ -43,10 +41,14 @@ class AppState:
         self.calling_context_dir: Path = Path(os.getcwd())
         self.sdk_package_dir: Path = Path(MODULE_DIR)
 
-        # Ensure all three plugin locations are importable
-        sys.path.insert(0, f"{self.config.SDK_HOME_DIR}")  # user_components
-        sys.path.insert(0, f"{self.calling_context_dir}")  # local plugins
-        sys.path.insert(0, str(self.sdk_package_dir))  # builtin_components
+        # Ensure all three plugin locations are importable (AppState is instantiated for every
+        # command handled by the supervisor daemon so avoid growing sys.path indefinitely)
+        for plugin_location in (f"{self.config.SDK_HOME_DIR}",  # user_components
+                f"{self.calling_context_dir}",  # local plugins
+                str(self.sdk_package_dir)):  # builtin_components
+            if plugin_location in sys.path:
+                sys.path.remove(plugin_location)
+            sys.path.insert(0, plugin_location)
 
         self.controller = Controller(self)
 
@@ -57,6 +59,9 @@ class AppState:
         os.makedirs(log_dir, exist_ok=True)
         AppState.file_handler = logging.FileHandler(log_dir / logfile_name)
         AppState.file_handler.setLevel(LOG_LEVEL)
+        # the same format as the console so that the lines can be indexed (see: log_index.py)
+        AppState.file_handler.setFormatter(logging.Formatter(
+            '%(asctime)s %(levelname)-8s %(name)-24s %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
         root_logger.addHandler(AppState.file_handler)
 
     def handle_first_ever_run(self) -> None:
@@ -78,4 +83,5 @@ class AppState:
                 config = {"is_first_run": False}
                 f.write(json.dumps(config, indent=4))
 
+            from electrumsv_node import electrumsv_node
             electrumsv_node.reset()
@@ -10,14 +10,17 @@ import argparse
 from argparse import ArgumentParser, _SubParsersAction
 import logging
 import sys
-from typing import Dict, List, Tuple, cast, Optional
+from typing import Any, Dict, List, Tuple, cast, Optional
 
-from .constants import NameSpace
+from .constants import NameSpace, RESTART_POLICIES, RestartPolicy, DEFAULT_MAX_RESTARTS
 from .config import CLIInputs, ParsedArgs
+from .cpu_affinity import CPU_LAYOUTS
 from .sdk_types import SubcommandIndicesType, ParserMap, RawArgsMap, SubcommandParsedArgsMap, \
     SelectedComponent
 from .validate_cli_args import ValidateCliArgs
 from .components import ComponentStore
+from .plugin_registry import CLI_OPTION_TYPES
+from .resource_monitor import DEFAULT_SAMPLE_INTERVAL
 
 logger = logging.getLogger("argparsing")
 
@@ -25,7 +28,8 @@ logger = logging.getLogger("argparsing")
 class ArgParser:
     def __init__(self) -> None:
         # globals that are packed into CLIInputs after argparsing
-        self.namespace: str = ""  # 'start', 'stop', 'reset', 'node', or 'status'
+        # 'start', 'stop', 'reset', 'node', 'status', 'supervisor', 'top' or 'logs'
+        self.namespace: str = ""
         self.selected_component: SelectedComponent = ""
         self.component_args: List[str] = []  # e.g. store arguments to pass to the electrumsv's cli
         # interface
@@ -61,7 +65,8 @@ class ArgParser:
     def parse_first_arg(self, arg: str, cur_cmd_name: str,
             subcommand_indices: SubcommandIndicesType) -> Tuple[str, Dict[str, List[int]]]:
         if arg in {NameSpace.INSTALL, NameSpace.START, NameSpace.STOP, NameSpace.RESET,
-                NameSpace.NODE, NameSpace.STATUS, NameSpace.CONFIG}:
+                NameSpace.NODE, NameSpace.STATUS, NameSpace.CONFIG, NameSpace.SUPERVISOR,
+                NameSpace.TOP, NameSpace.LOGS}:
             cur_cmd_name = arg
             self.namespace = arg
             subcommand_indices[arg] = []
@@ -71,7 +76,8 @@ class ArgParser:
             subcommand_indices[NameSpace.TOP_LEVEL].append(0)
         else:
             logger.error("First argument must be one of: "
-                "[start, stop, reset, node, status, config, --help, --version]")
+                "[start, stop, reset, node, status, config, supervisor, top, logs, --help, "
+                "--version]")
             sys.exit(1)
 
         return cur_cmd_name, subcommand_indices
@@ -186,6 +192,15 @@ class ArgParser:
             elif self.namespace == NameSpace.CONFIG:
                 subcommand_indices[cur_cmd_name].append(index)
 
+            elif self.namespace == NameSpace.SUPERVISOR:
+                subcommand_indices[cur_cmd_name].append(index)
+
+            elif self.namespace == NameSpace.TOP:
+                subcommand_indices[cur_cmd_name].append(index)
+
+            elif self.namespace == NameSpace.LOGS:
+                subcommand_indices[cur_cmd_name].append(index)
+
             # print(f"subcommand_indices={subcommand_indices}, index={index}, arg={arg}")
 
         if self.namespace in {NameSpace.START, NameSpace.INSTALL, NameSpace.RESET, NameSpace.STOP}:
@@ -236,7 +251,13 @@ class ArgParser:
                 inline_flag=parsed_args.inline,
                 new_terminal_flag=parsed_args.new_terminal,
                 component_id=parsed_args.id,
-                component_args=self.component_args
+                component_args=self.component_args,
+                restart_policy=parsed_args.restart,
+                max_restarts=parsed_args.max_restarts,
+                cgroup_flag=parsed_args.cgroup,
+                cpus=parsed_args.cpus,
+                cpu_layout=parsed_args.cpu_layout,
+                instance_count=parsed_args.count,
             )
         elif self.namespace == NameSpace.RESET:
             self.cli_inputs = CLIInputs(
@@ -258,11 +279,42 @@ class ArgParser:
                 namespace=self.namespace,
                 selected_component=self.selected_component,
                 component_id=parsed_args.id,
+                history_id=parsed_args.history,
             )
         elif self.namespace == NameSpace.CONFIG:
             self.cli_inputs = CLIInputs(
                 namespace=self.namespace,
                 sdk_home_dir=str(parsed_args.sdk_home_dir),
+                supervisor_autostart=parsed_args.supervisor_autostart,
+            )
+        elif self.namespace == NameSpace.SUPERVISOR:
+            self.cli_inputs = CLIInputs(
+                namespace=self.namespace,
+                supervisor_action=parsed_args.action,
+                force_flag=parsed_args.force,
+            )
+        elif self.namespace == NameSpace.TOP:
+            self.cli_inputs = CLIInputs(
+                namespace=self.namespace,
+                component_id=parsed_args.id,
+                sample_interval=parsed_args.interval,
+                sample_count=parsed_args.count,
+                export_path=parsed_args.export,
+            )
+        elif self.namespace == NameSpace.LOGS:
+            self.cli_inputs = CLIInputs(
+                namespace=self.namespace,
+                selected_component=parsed_args.type,
+                component_id=parsed_args.id,
+                follow_flag=parsed_args.follow,
+                log_since=parsed_args.since,
+                log_level=parsed_args.level,
+                logs_action=parsed_args.action,
+                log_until=parsed_args.until,
+                log_logger=parsed_args.logger,
+                log_pattern=parsed_args.pattern,
+                counts_flag=parsed_args.counts,
+                log_limit=parsed_args.limit,
             )
         elif self.namespace == NameSpace.TOP_LEVEL:
             self.cli_inputs = CLIInputs(
@@ -327,6 +379,9 @@ class ArgParser:
         start_parser = namespaces.add_parser("start", help="specify which servers to run")
         start_parser.add_argument("--new", action="store_true",
             help="run a new instance with unique 'id'")
+        start_parser.add_argument("--count", type=int, default=1,
+            help="start this many new instances (each with a unique 'id') concurrently and wait "
+            "until they are all ready")
         start_parser.add_argument("--gui", action="store_true",
             help="run in gui mode (electrumsv only)")
         start_parser.add_argument("--background", action="store_true", help="spawn in background")
@@ -339,6 +394,20 @@ class ArgParser:
             "https://github.com url or a local git repo path e.g. G:/electrumsv (optional)")
         start_parser.add_argument("--branch", type=str, default="", help="git repo branch ("
             "optional)")
+        start_parser.add_argument("--restart", type=str, default=RestartPolicy.NEVER,
+            choices=RESTART_POLICIES, help="restart policy enforced by the supervisor for "
+            "background components (default: never)")
+        start_parser.add_argument("--max-restarts", type=int, default=DEFAULT_MAX_RESTARTS,
+            help=f"give up after this many consecutive restarts (default: "
+            f"{DEFAULT_MAX_RESTARTS})")
+        start_parser.add_argument("--cgroup", action="store_true", help="limit the cpu, memory "
+            "and i/o of each background component with its own cgroup v2 slice (linux only - "
+            "see: resource_limits in config.json)")
+        start_parser.add_argument("--cpus", type=str, default="", help="pin the component's "
+            "processes to these cpus e.g. '0-3,6' (linux only)")
+        start_parser.add_argument("--cpu-layout", type=str, default="", choices=CPU_LAYOUTS,
+            help="'auto' pins each component to the least used cpus (linux only - see: "
+            "cpu_affinity in the plugin's manifest.json)")
 
         # add <component_types> from plugins
         subparsers = start_parser.add_subparsers(help="subcommand", required=False)
@@ -393,6 +462,9 @@ class ArgParser:
         node_parser.add_argument("--id", type=str, default="",
             help="select node instance by unique identifier (cannot mix this option with rpcport / "
                  "rpchost args)")
+        node_parser.add_argument("--batch", type=str, default="",
+            help="read newline-delimited rpc calls from a file (or '-' for stdin) and send them as "
+                 "json-rpc batches - the responses are written to stdout as json lines in order")
         # NOTE: all args are actually directed at the bitcoin RPC over http
         return node_parser
 
@@ -402,6 +474,8 @@ class ArgParser:
         )
         status_parser.add_argument("--id", type=str, default="", help="human-readable identifier "
             "for component (e.g. 'electrumsv1')")
+        status_parser.add_argument("--history", type=str, default="", help="show the lifecycle "
+            "events (starting, running, ready, stopped, failed) recorded for this component id")
         return status_parser
 
     def add_config_argparser(self, namespaces: _SubParsersAction) -> ArgumentParser:
@@ -410,8 +484,74 @@ class ArgParser:
         )
         config_parser.add_argument("--sdk-home-dir", type=str, default="", help="The location to "
             "store the component data")
+        config_parser.add_argument("--supervisor-autostart", choices=("on", "off"), default="",
+            help="start the supervisor daemon on demand when a component is started with "
+                "--background (default: off)")
         return config_parser
 
+    def add_supervisor_argparser(self, namespaces: _SubParsersAction) -> ArgumentParser:
+        supervisor_parser = namespaces.add_parser(
+            "supervisor", help="manage the (optional) long-lived supervisor daemon which executes "
+                "start, stop, reset, node and status commands on behalf of the cli"
+        )
+        # optional because every ArgumentParser is fed its (possibly empty) args
+        supervisor_parser.add_argument("action", type=str, nargs="?", default="status",
+            choices=["start", "stop", "status"],
+            help="start, stop or get the status of the supervisor daemon (default: status)")
+        supervisor_parser.add_argument("--force", action="store_true", default=False,
+            help="stop the supervisor even if background components are still running (they are "
+                "left running but their exit is no longer recorded)")
+        return supervisor_parser
+
+    def add_top_argparser(self, namespaces: _SubParsersAction) -> ArgumentParser:
+        top_parser = namespaces.add_parser(
+            "top", help="live view of the cpu, memory, i/o, file descriptors and threads used by "
+                "each running component (including its child processes)"
+        )
+        top_parser.add_argument("--id", type=str, default="", help="only sample this component "
+            "(e.g. 'node1')")
+        top_parser.add_argument("--interval", type=float, default=DEFAULT_SAMPLE_INTERVAL,
+            help=f"seconds between samples (default: {DEFAULT_SAMPLE_INTERVAL})")
+        top_parser.add_argument("--count", type=int, default=0, help="exit after this many "
+            "samples (default: run until Ctrl + C)")
+        top_parser.add_argument("--export", type=str, default="", help="write all samples to "
+            "this json file on exit")
+        return top_parser
+
+    def add_logs_argparser(self, namespaces: _SubParsersAction) -> ArgumentParser:
+        logs_parser = namespaces.add_parser(
+            "logs", help="show the logs of all (or the selected) components interleaved by "
+                "timestamp or search them (via an index)"
+        )
+        # optional because every ArgumentParser is fed its (possibly empty) args
+        logs_parser.add_argument("action", type=str, nargs="?", default="show",
+            choices=["show", "search"],
+            help="show (and optionally follow) the logs or search all of the logs in LOGS_DIR "
+                "(default: show)")
+        logs_parser.add_argument("-f", "--follow", action="store_true",
+            help="keep streaming new log lines (including those of components that are started "
+                "later)")
+        logs_parser.add_argument("--id", type=str, default="", help="only these component ids "
+            "(comma-separated e.g. 'node1,electrumsv1')")
+        logs_parser.add_argument("--type", type=str, default="", help="only these component "
+            "types (comma-separated e.g. 'node,merchant_api')")
+        logs_parser.add_argument("--since", type=str, default="", help="only lines logged since "
+            "e.g. '15m', '2h', '1d' or '2022-05-12 10:00:00' (default: the latest log file of "
+            "each component)")
+        logs_parser.add_argument("--level", type=str, default="", help="only lines with at least "
+            "this level (e.g. 'warning' - the default for search is 'error')")
+        logs_parser.add_argument("--until", type=str, default="", help="search: only lines "
+            "logged until e.g. '5m' (ago) or '2022-05-12 11:00:00'")
+        logs_parser.add_argument("--logger", type=str, default="", help="search: only lines of "
+            "this logger (e.g. 'supervisor')")
+        logs_parser.add_argument("--pattern", type=str, default="", help="search: only records "
+            "(a line and its traceback) matching this regular expression")
+        logs_parser.add_argument("--counts", action="store_true", help="search: show the number "
+            "of lines per component, level and logger instead")
+        logs_parser.add_argument("--limit", type=int, default=0, help="search: show at most this "
+            "many records")
+        return logs_parser
+
     def add_global_flags(self, top_level_parser: ArgumentParser) -> None:
         top_level_parser.add_argument(
             "--version", action="store_true", dest="version", default=False,
@@ -430,6 +570,9 @@ class ArgParser:
         node_parser = self.add_node_argparser(namespaces)
         status_parser = self.add_status_argparser(namespaces)
         config_parser = self.add_config_argparser(namespaces)
+        supervisor_parser = self.add_supervisor_argparser(namespaces)
+        top_parser = self.add_top_argparser(namespaces)
+        logs_parser = self.add_logs_argparser(namespaces)
 
         # register top-level ArgumentParsers
         self.parser_map[NameSpace.TOP_LEVEL] = top_level_parser
@@ -440,6 +583,9 @@ class ArgParser:
         self.parser_map[NameSpace.NODE] = node_parser
         self.parser_map[NameSpace.STATUS] = status_parser
         self.parser_map[NameSpace.CONFIG] = config_parser
+        self.parser_map[NameSpace.SUPERVISOR] = supervisor_parser
+        self.parser_map[NameSpace.TOP] = top_parser
+        self.parser_map[NameSpace.LOGS] = logs_parser
 
         # prepare raw_args
         for namespace, parser in self.parser_map.items():
@@ -447,6 +593,23 @@ class ArgParser:
             self.parser_raw_args_map[namespace] = []
 
     def extend_cli(self, selected_component: SelectedComponent, namespace: str) -> List[str]:
+        """plugin-specific cli options are read from the plugin's manifest (without importing
+        the plugin module). Plugins without a manifest can instead provide an
+        'extend_<namespace>_cli' function in their main module."""
+        cli_options = self.component_store.plugin_registry.get_cli_extensions(
+            selected_component, namespace)
+        if cli_options is not None:
+            parser = self.parser_map[namespace]
+            new_options_list: List[str] = []
+            for cli_option in cli_options:
+                kwargs: Dict[str, Any] = {key: value for key, value in cli_option.items()
+                    if key != 'flags'}
+                if 'type' in kwargs:
+                    kwargs['type'] = CLI_OPTION_TYPES[kwargs['type']]
+                action = parser.add_argument(*cli_option['flags'], **kwargs)
+                new_options_list.append(action.dest)
+            return new_options_list
+
         component_module = self.component_store.import_plugin_module(selected_component)
         try:
             parser = self.parser_map[namespace]
@@ -455,9 +618,8 @@ class ArgParser:
             cli_extender = getattr(main_module, "extend_" + namespace + "_cli")
             new_parser, new_options = cli_extender(parser)
             self.parser_map[namespace] = new_parser
-            new_options_list: List[str] = new_options  # mypy workaround
+            new_options_list = new_options  # mypy workaround
             return new_options_list
         except AttributeError:
             # no 'extend_start_cli' method present for this plugin
             return []
-
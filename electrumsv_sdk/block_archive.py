@@ -0,0 +1,298 @@
+"""
+A binary, indexed archive of raw blocks (see: utils.write_raw_blocks_to_file and
+utils.submit_blocks_from_file) - the replacement for the hex-per-line '.dat' files.
+
+An archive consists of two files:
+
+- '<name>.blocks' - MAGIC followed by the raw blocks, each prefixed with its length (uint64 -
+  blocks can be larger than 4 GiB).
+- '<name>.blocks.index' - one fixed-size entry per block in the order that they were appended:
+  the height (uint32), the offset (uint64) and length (uint64) of the block in the data file and
+  the block hash (32 bytes in internal byte order).
+
+Readers memory-map both files so that a block can be fetched by height or hash without reading
+the rest of the archive. A block is always written before its index entry so a crash while
+appending leaves at most an unindexed partial block at the end of the data file (which is
+ignored by readers and truncated when the archive is next opened for appending).
+
+Existing '.dat' files can be converted with convert_dat_file (see: contrib/convert_blocks_dat.py).
+"""
+import hashlib
+import logging
+import mmap
+import os
+from pathlib import Path
+import struct
+from typing import Callable, Dict, Iterator, NamedTuple, Optional, Tuple, Union
+
+logger = logging.getLogger("block-archive")
+
+# the last byte is the version of the format (version 1 had uint32 lengths and is not supported)
+MAGIC_PREFIX = b"ESVBLK\x00"
+MAGIC = MAGIC_PREFIX + b"\x02"
+ARCHIVE_SUFFIX = ".blocks"
+INDEX_SUFFIX = ".index"
+LENGTH_STRUCT = struct.Struct("<Q")
+INDEX_ENTRY_STRUCT = struct.Struct("<IQQ32s")
+
+
+class BlockArchiveError(Exception):
+    pass
+
+
+class IndexEntry(NamedTuple):
+    height: int
+    offset: int  # of the block itself (i.e. after its length prefix)
+    length: int
+    block_hash: bytes  # internal byte order (see: hash_to_hex_str)
+
+
+def get_index_path(path: Path) -> Path:
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def is_block_archive(path: Union[Path, str]) -> bool:
+    """by the magic bytes (of any version - see: check_format_version) - or by the suffix for an
+    archive that does not exist yet"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC_PREFIX)) == MAGIC_PREFIX
+    except FileNotFoundError:
+        return Path(path).suffix == ARCHIVE_SUFFIX
+
+
+def check_format_version(path: Path) -> None:
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+    if magic != MAGIC:
+        raise BlockArchiveError(f"{path} is in an unsupported format (version {magic[-1]} - "
+            f"expected version {MAGIC[-1]}). Convert it again from the '.dat' file.")
+
+
+def get_block_hash(raw_block: bytes) -> bytes:
+    """the double sha256 of the 80 byte header"""
+    return hashlib.sha256(hashlib.sha256(raw_block[:80]).digest()).digest()
+
+
+def hash_to_hex_str(block_hash: bytes) -> str:
+    return block_hash[::-1].hex()
+
+
+def hex_str_to_hash(hex_str: str) -> bytes:
+    return bytes.fromhex(hex_str)[::-1]
+
+
+def get_valid_entry_count(index_size: int, data_size: int,
+        read_entry: Callable[[int], IndexEntry]) -> int:
+    """the number of complete index entries whose blocks are complete too"""
+    count = index_size // INDEX_ENTRY_STRUCT.size
+    while count:
+        entry = read_entry(count - 1)
+        if entry.offset + entry.length <= data_size:
+            break
+        count -= 1
+    return count
+
+
+class BlockArchiveWriter:
+    """Appends blocks to an archive (which is created if it does not exist)."""
+
+    def __init__(self, path: Union[Path, str]) -> None:
+        self.path = Path(path)
+        self.index_path = get_index_path(self.path)
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            with open(self.path, 'wb') as f:
+                f.write(MAGIC)
+            open(self.index_path, 'wb').close()
+        elif not is_block_archive(self.path):
+            raise BlockArchiveError(f"{self.path} is not a block archive")
+        check_format_version(self.path)
+        if not self.index_path.exists():
+            raise BlockArchiveError(f"the index of {self.path} is missing: {self.index_path}")
+
+        self.data_file = open(self.path, 'r+b')
+        self.index_file = open(self.index_path, 'r+b')
+        self.count = 0
+        self.last_entry: Optional[IndexEntry] = None
+        self._recover()
+
+    def _read_entry(self, index: int) -> IndexEntry:
+        self.index_file.seek(index * INDEX_ENTRY_STRUCT.size)
+        return IndexEntry(*INDEX_ENTRY_STRUCT.unpack(
+            self.index_file.read(INDEX_ENTRY_STRUCT.size)))
+
+    def _recover(self) -> None:
+        """discards a partially appended block (if any)"""
+        data_size = self.data_file.seek(0, os.SEEK_END)
+        index_size = self.index_file.seek(0, os.SEEK_END)
+        self.count = get_valid_entry_count(index_size, data_size, self._read_entry)
+        self.last_entry = self._read_entry(self.count - 1) if self.count else None
+        data_end = self.last_entry.offset + self.last_entry.length if self.last_entry \
+            else len(MAGIC)
+        if data_size != data_end or index_size != self.count * INDEX_ENTRY_STRUCT.size:
+            logger.warning(f"discarding a partially written block at the end of {self.path}")
+            self.data_file.truncate(data_end)
+            self.index_file.truncate(self.count * INDEX_ENTRY_STRUCT.size)
+        self.data_file.seek(data_end)
+        self.index_file.seek(self.count * INDEX_ENTRY_STRUCT.size)
+
+    @property
+    def last_height(self) -> Optional[int]:
+        return self.last_entry.height if self.last_entry else None
+
+    def append(self, height: int, raw_block: bytes) -> IndexEntry:
+        offset = self.data_file.tell() + LENGTH_STRUCT.size
+        self.data_file.write(LENGTH_STRUCT.pack(len(raw_block)))
+        self.data_file.write(raw_block)
+        entry = IndexEntry(height, offset, len(raw_block), get_block_hash(raw_block))
+        self.index_file.write(INDEX_ENTRY_STRUCT.pack(*entry))
+        self.count += 1
+        self.last_entry = entry
+        return entry
+
+    def flush(self) -> None:
+        """the data is flushed before the index (see: module docstring)"""
+        self.data_file.flush()
+        self.index_file.flush()
+
+    def close(self) -> None:
+        if not self.data_file.closed:
+            self.flush()
+            self.data_file.close()
+            self.index_file.close()
+
+    def __enter__(self) -> "BlockArchiveWriter":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+class BlockArchive:
+    """A memory-mapped reader of an archive. Blocks appended after it was opened are not seen
+    (open it again for those)."""
+
+    def __init__(self, path: Union[Path, str]) -> None:
+        self.path = Path(path)
+        self.index_path = get_index_path(self.path)
+        if not self.path.exists() or not is_block_archive(self.path):
+            raise BlockArchiveError(f"{self.path} is not a block archive")
+        check_format_version(self.path)
+
+        self._data_file = open(self.path, 'rb')
+        self._index_file = open(self.index_path, 'rb')
+        data_size = os.fstat(self._data_file.fileno()).st_size
+        index_size = os.fstat(self._index_file.fileno()).st_size
+        self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        # mmap cannot map empty files
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if index_size else None
+        self.count = get_valid_entry_count(index_size, data_size, self.get_entry)
+        self.first_height = self.get_entry(0).height if self.count else 0
+        self._height_index: Optional[Dict[int, int]] = None
+        self._hash_index: Optional[Dict[bytes, int]] = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self) -> "BlockArchive":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def get_entry(self, index: int) -> IndexEntry:
+        assert self._index is not None  # typing bug
+        return IndexEntry(*INDEX_ENTRY_STRUCT.unpack_from(self._index,
+            index * INDEX_ENTRY_STRUCT.size))
+
+    def find_entry(self, height: int) -> Optional[IndexEntry]:
+        # the heights of an archive are normally consecutive so the position is known
+        index = height - self.first_height
+        if 0 <= index < self.count:
+            entry = self.get_entry(index)
+            if entry.height == height:
+                return entry
+        if self._height_index is None:
+            self._height_index = {self.get_entry(index).height: index
+                for index in range(self.count)}
+        index_of_height = self._height_index.get(height)
+        return self.get_entry(index_of_height) if index_of_height is not None else None
+
+    def find_entry_by_hash(self, block_hash: Union[bytes, str]) -> Optional[IndexEntry]:
+        """'block_hash' as a hex string (display order) or bytes (internal byte order)"""
+        if isinstance(block_hash, str):
+            block_hash = hex_str_to_hash(block_hash)
+        if self._hash_index is None:
+            self._hash_index = {self.get_entry(index).block_hash: index
+                for index in range(self.count)}
+        index = self._hash_index.get(block_hash)
+        return self.get_entry(index) if index is not None else None
+
+    def read_block(self, entry: IndexEntry) -> bytes:
+        return self._data[entry.offset:entry.offset + entry.length]
+
+    def get_block(self, height: int) -> Optional[bytes]:
+        entry = self.find_entry(height)
+        return self.read_block(entry) if entry else None
+
+    def get_block_by_hash(self, block_hash: Union[bytes, str]) -> Optional[bytes]:
+        entry = self.find_entry_by_hash(block_hash)
+        return self.read_block(entry) if entry else None
+
+    def iter_entries(self, from_height: Optional[int]=None, to_height: Optional[int]=None) \
+            -> Iterator[IndexEntry]:
+        """in the order that the blocks were appended"""
+        for index in range(self.count):
+            entry = self.get_entry(index)
+            if (from_height is None or entry.height >= from_height) and \
+                    (to_height is None or entry.height <= to_height):
+                yield entry
+
+    def iter_blocks(self, from_height: Optional[int]=None, to_height: Optional[int]=None) \
+            -> Iterator[Tuple[IndexEntry, bytes]]:
+        for entry in self.iter_entries(from_height, to_height):
+            yield entry, self.read_block(entry)
+
+    def close(self) -> None:
+        if not self._data_file.closed:
+            self._data.close()
+            if self._index is not None:
+                self._index.close()
+            self._data_file.close()
+            self._index_file.close()
+
+
+def delete_block_archive(path: Union[Path, str]) -> None:
+    path = Path(path)
+    os.remove(path)
+    index_path = get_index_path(path)
+    if index_path.exists():
+        os.remove(index_path)
+
+
+def convert_dat_file(dat_path: Union[Path, str], archive_path: Optional[Union[Path, str]]=None,
+        start_height: int=0) -> Path:
+    """Converts a hex-per-line '.dat' file (streamed line by line) to a new archive (by default
+    alongside it with the '.blocks' suffix). The '.dat' files do not record the heights of the
+    blocks so they are numbered consecutively from 'start_height'."""
+    dat_path = Path(dat_path)
+    archive_path = Path(archive_path) if archive_path else dat_path.with_suffix(ARCHIVE_SUFFIX)
+    if archive_path.exists():
+        delete_block_archive(archive_path)
+
+    with open(dat_path, 'r') as f, BlockArchiveWriter(archive_path) as writer:
+        height = start_height
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                raw_block = bytes.fromhex(line)
+            except ValueError:
+                raise BlockArchiveError(f"{dat_path}: line {line_number} is not a hex block") \
+                    from None
+            writer.append(height, raw_block)
+            height += 1
+    logger.info(f"converted {dat_path} to {archive_path} ({height - start_height} blocks)")
+    return archive_path
@@ -49,10 +49,6 @@ class Plugin(AbstractPlugin):
 
         self.id = self.plugin_tools.get_id(self.COMPONENT_NAME)
         self.port = self.DEFAULT_PORT
-        # The primary reason we need this to be the current directory is so that the `settings.conf`
-        # file is directly accessible to the MAPI executable (it should look there first).
-        os.chdir(self.src)
-
         # EXE RUN MODE
         load_env_vars()
         try:
@@ -67,9 +63,11 @@ class Plugin(AbstractPlugin):
         logfile = self.plugin_tools.get_logfile_path(self.id)
         status_endpoint = f"http://localhost:{self.DEFAULT_PORT}"
 
+        # The primary reason we need this to be the current directory is so that the `settings.conf`
+        # file is directly accessible to the executable (it should look there first).
         self.plugin_tools.spawn_process(str(command), env_vars=os.environ.copy(), id=self.id,
             component_name=self.COMPONENT_NAME, src=self.src, logfile=logfile,
-            status_endpoint=status_endpoint)
+            status_endpoint=status_endpoint, cwd=self.src)
 
     def stop(self) -> None:
         self.plugin_tools.call_for_component_id_or_type(self.COMPONENT_NAME, callable=kill_process)
@@ -2,9 +2,8 @@ from functools import partial
 import logging
 import os
 import sys
-from argparse import ArgumentParser
 from pathlib import Path
-from typing import Optional, Tuple, List, Set
+from typing import Optional, Set
 
 from electrumsv_sdk.sdk_types import AbstractPlugin
 from electrumsv_sdk.components import Component, ComponentTypedDict, ComponentMetadata
@@ -16,30 +15,6 @@ from electrumsv_sdk.config import CLIInputs, Config
 from .local_tools import LocalTools
 
 
-def extend_start_cli(start_parser: ArgumentParser) -> Tuple[ArgumentParser, List[str]]:
-    """if this method is present it allows extension of the start argparser only.
-    This occurs dynamically and adds the new cli options as attributes of the CLIInputs object"""
-    start_parser.add_argument("--regtest", action="store_true", help="run on regtest")
-    start_parser.add_argument("--testnet", action="store_true", help="run on testnet")
-    start_parser.add_argument("--deterministic-seed", action="store_true", help="use "
-        "deterministic seed for wallet")
-
-    # variable names to be pulled from the start_parser
-    new_options = ['regtest', 'testnet', 'deterministic_seed']
-    return start_parser, new_options
-
-
-def extend_reset_cli(reset_parser: ArgumentParser) -> Tuple[ArgumentParser, List[str]]:
-    """if this method is present it allows extension of the start argparser only.
-    This occurs dynamically and adds the new cli options as attributes of the CLIInputs object"""
-    reset_parser.add_argument("--deterministic-seed", action="store_true", help="use "
-        "deterministic seed for wallet")
-
-    # variable names to be pulled from the start_parser
-    new_options = ['deterministic_seed']
-    return reset_parser, new_options
-
-
 class Plugin(AbstractPlugin):
 
     # ---------- Environment Variables ---------- #
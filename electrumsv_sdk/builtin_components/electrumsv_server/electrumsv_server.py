@@ -1,9 +1,8 @@
 import logging
 import os
 import sys
-from argparse import ArgumentParser
 from pathlib import Path
-from typing import Optional, Tuple, List, Set
+from typing import Optional, Set
 import shutil
 
 from electrumsv_sdk.sdk_types import AbstractPlugin
@@ -18,28 +17,6 @@ from .local_tools import LocalTools
 MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
-def extend_start_cli(start_parser: ArgumentParser) -> Tuple[ArgumentParser, List[str]]:
-    """if this method is present it allows extension of the start argparser only.
-    This occurs dynamically and adds the new cli options as attributes of the CLIInputs object"""
-    start_parser.add_argument("--mapi-broadcast", action="store_true",
-        help="turn on broadcasting via the merchant api")
-    start_parser.add_argument("--mapi-host", type=str, default="127.0.0.1",
-        help="merchant api host")
-    start_parser.add_argument("--mapi-port", type=int, default=5051,
-        help="merchant api port")
-
-    start_parser.add_argument("--regtest", action="store_true", help="run on regtest")
-    start_parser.add_argument("--testnet", action="store_true", help="run on testnet")
-    start_parser.add_argument("--scaling-testnet", action="store_true",
-        help="run on scaling-testnet")
-    start_parser.add_argument("--main", action="store_true", help="run on mainnet")
-
-    # variable names to be pulled from the start_parser
-    new_options = ['mapi_broadcast', "mapi_host", "mapi_port", "regtest", "scaling_testnet",
-        "testnet", "main"]
-    return start_parser, new_options
-
-
 class Plugin(AbstractPlugin):
     SERVER_HOST = "127.0.0.1"
     SERVER_PORT = 24242
@@ -70,7 +47,6 @@ class Plugin(AbstractPlugin):
         logfile = self.plugin_tools.get_logfile_path(self.id)
         env_vars = {"PYTHONUNBUFFERED": "1"}
         os.makedirs(self.ELECTRUMSV_SERVER_MODULE_PATH.joinpath("data"), exist_ok=True)
-        os.chdir(self.ELECTRUMSV_SERVER_MODULE_PATH)
         command = f"{sys.executable} -m electrumsv_server --wwwroot-path=wwwroot " \
             f"--data-path={self.datadir} "
 
@@ -78,7 +54,7 @@ class Plugin(AbstractPlugin):
         command += f"--{network_choice}"
 
         # These mapi attributes are added to cli_inputs as extension cli options
-        # (see: extend_start_cli() above)
+        # (see: manifest.json)
         if self.cli_inputs.cli_extension_args['mapi_broadcast']:
             command += (f" --mapi-broadcast "
                         f"--mapi-host={self.cli_inputs.cli_extension_args['mapi_host']} "
@@ -86,7 +62,7 @@ class Plugin(AbstractPlugin):
 
         self.plugin_tools.spawn_process(command, env_vars=env_vars, id=self.id,
             component_name=self.COMPONENT_NAME, src=self.src, logfile=logfile,
-            metadata={"datadir": str(self.datadir)})
+            metadata={"datadir": str(self.datadir)}, cwd=self.ELECTRUMSV_SERVER_MODULE_PATH)
 
     def stop(self) -> None:
         self.logger.debug("Attempting to kill the process if it is even running")
@@ -2,9 +2,8 @@ import logging
 import os
 import shutil
 import sys
-from argparse import ArgumentParser
 from pathlib import Path
-from typing import Optional, Tuple, List, Set
+from typing import Optional, Set
 
 from electrumsv_sdk.sdk_types import AbstractPlugin
 from electrumsv_sdk.config import CLIInputs, Config
@@ -15,17 +14,6 @@ from electrumsv_sdk.plugin_tools import PluginTools
 from .local_tools import LocalTools
 
 
-def extend_start_cli(start_parser: ArgumentParser) -> Tuple[ArgumentParser, List[str]]:
-    """if this method is present it allows extension of the start argparser only.
-    This occurs dynamically and adds the new cli options as attributes of the CLIInputs object"""
-    start_parser.add_argument("--regtest", action="store_true", help="run on regtest")
-    start_parser.add_argument("--testnet", action="store_true", help="run on testnet")
-
-    # variable names to be pulled from the start_parser
-    new_options = ['regtest', 'testnet']
-    return start_parser, new_options
-
-
 class Plugin(AbstractPlugin):
 
     BITCOIN_NETWORK = os.getenv("BITCOIN_NETWORK", "regtest")  # 'BITCOIN_NETWORK' is the SDK global
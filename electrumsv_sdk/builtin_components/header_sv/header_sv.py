@@ -55,10 +55,6 @@ class Plugin(AbstractPlugin):
 
         self.id = self.plugin_tools.get_id(self.COMPONENT_NAME)
         self.port = self.DEFAULT_PORT
-        # The primary reason we need this to be the current directory is so that the `settings.conf`
-        # file is directly accessible to the MAPI executable (it should look there first).
-        os.chdir(self.src)
-
         # EXE RUN MODE
         load_env_vars()
         try:
@@ -73,9 +69,11 @@ class Plugin(AbstractPlugin):
         status_endpoint = "http://localhost:33444/api/v1/chain/tips"
 
         environment = os.environ.copy()
+        # The primary reason we need this to be the current directory is so that the `settings.conf`
+        # file is directly accessible to the executable (it should look there first).
         self.plugin_tools.spawn_process(str(command), env_vars=environment, id=self.id,
             component_name=self.COMPONENT_NAME, src=self.src, logfile=logfile,
-            status_endpoint=status_endpoint)
+            status_endpoint=status_endpoint, cwd=self.src)
 
     def stop(self) -> None:
         self.plugin_tools.call_for_component_id_or_type(self.COMPONENT_NAME, callable=kill_process)
@@ -4,6 +4,8 @@ import threading
 import time
 import requests
 
+from electrumsv_sdk.readiness import iter_backoff_delays
+
 
 class MerchantAPIUnavailableError(Exception):
     pass
@@ -34,7 +36,7 @@ class AddNodeThread(threading.Thread):
             "password": "rpcpassword",
             "remarks": "remarks"
         }
-        while True:
+        for delay in iter_backoff_delays():
             result = None
             try:
                 result = requests.post(self.mapi_add_node, data=json.dumps(body),
@@ -49,10 +51,11 @@ class AddNodeThread(threading.Thread):
                                           f"Reason: {result.content}")
                 else:
                     self.logger.exception("Unexpected exception connecting to mAPI")
-            if time.time() >= self.start_time + self.wait_time:
+            remaining_time = self.start_time + self.wait_time - time.time()
+            if remaining_time <= 0:
                 raise MerchantAPIUnavailableError(f"The merchant API is still unreachable after "
                     f"{self.wait_time} seconds")
-            time.sleep(1)
+            time.sleep(min(delay, remaining_time))
 
     def run(self):
         self.add_node_until_successful()
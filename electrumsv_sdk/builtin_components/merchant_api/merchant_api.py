@@ -5,8 +5,6 @@ import sys
 from pathlib import Path
 from typing import Optional, Set
 
-from electrumsv_node import electrumsv_node
-
 from electrumsv_sdk.builtin_components._common.utils import download_and_init_postgres, \
     start_postgres, stop_postgres
 from electrumsv_sdk.builtin_components.merchant_api.add_node_to_mapi_thread import AddNodeThread
@@ -15,15 +13,20 @@ from electrumsv_sdk.config import CLIInputs, Config
 from electrumsv_sdk.components import Component
 from electrumsv_sdk.utils import get_directory_name, kill_process
 from electrumsv_sdk.plugin_tools import PluginTools
+from electrumsv_sdk import readiness
+from electrumsv_sdk.readiness import HttpProbe, JsonRpcProbe, PostgresProbe
 
 from .install import download_and_install, get_run_path, chmod_exe, MERCHANT_API_VERSION, \
     load_env_vars, prepare_fresh_postgres
-from .check_db_config import check_postgres_db, drop_db_on_install, pg_connect, POSTGRES_HOST
+from .check_db_config import check_postgres_db, drop_db_on_install, POSTGRES_HOST
 
 SDK_POSTGRES_PORT = int(os.environ.get('SDK_POSTGRES_PORT', "5432"))
 SDK_PORTABLE_MODE = int(os.environ.get('SDK_PORTABLE_MODE', "0"))
 SDK_SKIP_POSTGRES_INIT: int = int(os.environ.get('SDK_SKIP_POSTGRES_INIT', "0"))
 
+DEPENDENCY_READY_TIMEOUT = 10.0
+MAPI_READY_TIMEOUT = 20.0
+
 
 class Plugin(AbstractPlugin):
 
@@ -85,10 +88,6 @@ class Plugin(AbstractPlugin):
 
         self.id = self.plugin_tools.get_id(self.COMPONENT_NAME)
         self.port = self.MERCHANT_API_PORT
-        # The primary reason we need this to be the current directory is so that the `settings.conf`
-        # file is directly accessible to the MAPI executable (it should look there first).
-        os.chdir(self.src)
-
         # EXE RUN MODE
         load_env_vars()
         try:
@@ -103,27 +102,33 @@ class Plugin(AbstractPlugin):
         logfile = self.plugin_tools.get_logfile_path(self.id)
         status_endpoint = "http://127.0.0.1:5050/mapi/feeQuote"
 
-        if not electrumsv_node.is_node_running(rpchost=self.NODE_HOST, rpcport=self.NODE_RPC_PORT,
-                rpcuser=self.NODE_RPC_USERNAME, rpcpassword=self.NODE_RPC_PASSWORD):
+        node_probe = JsonRpcProbe(f"http://{self.NODE_HOST}:{self.NODE_RPC_PORT}",
+            rpcuser=self.NODE_RPC_USERNAME, rpcpassword=self.NODE_RPC_PASSWORD)
+        postgres_probe = PostgresProbe(POSTGRES_HOST, SDK_POSTGRES_PORT, user="mapimaster",
+            password="mapimasterpass")
+        if readiness.wait_until_ready([node_probe], DEPENDENCY_READY_TIMEOUT) is None:
             self.logger.error(f"The bitcoin node's RPC API is unreachable at "
                 f"{self.NODE_HOST}:{self.NODE_RPC_PORT}. Launching {self.COMPONENT_NAME} aborted.")
             return
 
-        try:
-            asyncio.run(pg_connect())
-        except ConnectionRefusedError:
-            self.logger.exception(f"Connection to postgres on {POSTGRES_HOST}:{SDK_POSTGRES_PORT} "
-                                  f"failed")
+        if readiness.wait_until_ready([postgres_probe], DEPENDENCY_READY_TIMEOUT) is None:
+            self.logger.error(f"Connection to postgres on {POSTGRES_HOST}:{SDK_POSTGRES_PORT} "
+                f"failed")
             return
 
+        # The primary reason we need this to be the current directory is so that the `settings.conf`
+        # file is directly accessible to the MAPI executable (it should look there first).
         self.plugin_tools.spawn_process(str(command), env_vars=os.environ.copy(), id=self.id,
             component_name=self.COMPONENT_NAME, src=self.src, logfile=logfile,
-            status_endpoint=status_endpoint)
+            status_endpoint=status_endpoint, cwd=self.src)
+
+        if not self.plugin_tools.wait_until_ready([HttpProbe(status_endpoint)],
+                deadline=MAPI_READY_TIMEOUT):
+            return
 
         self.add_node_thread = AddNodeThread(mapi_url="http://127.0.0.1:5050", max_wait_time=20)
         self.add_node_thread.start()
 
-        # will keep trying to add node until mAPI REST API available (up to a limited wait time)
         self.logger.info("Adding node to mAPI instance (if not already added)")
         self.add_node_thread.join()
 
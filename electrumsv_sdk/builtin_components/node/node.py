@@ -1,31 +1,20 @@
 import logging
 import os
-from argparse import ArgumentParser
 from pathlib import Path
-from typing import Optional, Tuple, List, Set
+from typing import Optional, Set
 
 from electrumsv_sdk.sdk_types import AbstractPlugin
 from electrumsv_sdk.config import CLIInputs, Config
 from electrumsv_sdk.components import Component, ComponentTypedDict, ComponentMetadata
 from electrumsv_sdk.utils import get_directory_name
 from electrumsv_sdk.plugin_tools import PluginTools
+from electrumsv_sdk.readiness import JsonRpcProbe
 
 from electrumsv_node import electrumsv_node
 
 from .local_tools import LocalTools
 
 
-def extend_start_cli(start_parser: ArgumentParser) -> Tuple[ArgumentParser, List[str]]:
-    """if this method is present it allows extension of the start argparser only.
-    This occurs dynamically and adds the new cli options as attributes of the CLIInputs object"""
-    start_parser.add_argument("--regtest", action="store_true", help="run on regtest")
-    start_parser.add_argument("--testnet", action="store_true", help="run on testnet")
-
-    # variable names to be pulled from the start_parser
-    new_options = ['regtest', 'testnet']
-    return start_parser, new_options
-
-
 class Plugin(AbstractPlugin):
 
     BITCOIN_NETWORK = os.getenv("BITCOIN_NETWORK", "regtest")
@@ -35,9 +24,12 @@ class Plugin(AbstractPlugin):
     DEFAULT_ZMQ_PORT = 28332
 
     # if ports == None -> set by deterministic port allocation
-    NODE_PORT: int = int(os.environ.get("NODE_PORT") or DEFAULT_PORT)
-    NODE_P2P_PORT: int = int(os.environ.get("NODE_P2P_PORT") or DEFAULT_P2P_PORT)
-    NODE_ZMQ_PORT: int = int(os.environ.get("NODE_ZMQ_PORT") or DEFAULT_ZMQ_PORT)
+    NODE_PORT: Optional[int] = int(os.environ["NODE_PORT"]) \
+        if os.environ.get("NODE_PORT") else None
+    NODE_P2P_PORT: Optional[int] = int(os.environ["NODE_P2P_PORT"]) \
+        if os.environ.get("NODE_P2P_PORT") else None
+    NODE_ZMQ_PORT: Optional[int] = int(os.environ["NODE_ZMQ_PORT"]) \
+        if os.environ.get("NODE_ZMQ_PORT") else None
 
     NODE_RPCALLOWIP = os.environ.get("NODE_RPCALLOWIP")  # else 127.0.0.1
     NODE_RPCBIND = os.environ.get("NODE_RPCBIND")
@@ -77,22 +69,18 @@ class Plugin(AbstractPlugin):
         self.datadir, self.id = self.plugin_tools.allocate_datadir_and_id()
         self.tools.process_cli_args()  # cli args may override network in env vars
 
-        if self.NODE_PORT:
-            self.port = self.NODE_PORT
-        else:
-            self.port = self.plugin_tools.allocate_port()
-
-        if self.NODE_P2P_PORT:
-            self.p2p_port = self.NODE_P2P_PORT
-        else:
-            self.p2p_port = self.plugin_tools.get_component_port(self.DEFAULT_P2P_PORT,
-                self.COMPONENT_NAME, self.id)
-
-        if self.NODE_ZMQ_PORT:
-            self.zmq_port = self.NODE_ZMQ_PORT
-        else:
-            self.zmq_port = self.plugin_tools.get_component_port(self.DEFAULT_ZMQ_PORT,
-                self.COMPONENT_NAME, self.id)
+        # ports set via env vars are used as-is - all others are allocated (and leased) together
+        default_ports = {'rpcport': self.DEFAULT_PORT, 'p2p_port': self.DEFAULT_P2P_PORT,
+            'zmq_port': self.DEFAULT_ZMQ_PORT}
+        env_var_ports = {'rpcport': self.NODE_PORT, 'p2p_port': self.NODE_P2P_PORT,
+            'zmq_port': self.NODE_ZMQ_PORT}
+        ports = self.plugin_tools.allocate_ports({purpose: port for purpose, port
+            in default_ports.items() if env_var_ports[purpose] is None})
+        ports.update({purpose: port for purpose, port in env_var_ports.items()
+            if port is not None})
+        self.port = ports['rpcport']
+        self.p2p_port = ports['p2p_port']
+        self.zmq_port = ports['zmq_port']
 
         extra_params = ["-bind=127.0.0.1"]
         if self.NODE_RPCALLOWIP:
@@ -118,10 +106,12 @@ class Plugin(AbstractPlugin):
                 p2p_port=self.p2p_port
             )
         )
-        if electrumsv_node.is_node_running():
-            return
-        else:
-            self.logger.exception("node failed to start")
+        # the rpc port accepts connections while the node is still warming up (loading the block
+        # index etc.) so only a successful rpc call means that it is ready
+        probe = JsonRpcProbe(f"http://127.0.0.1:{self.port}", rpcuser="rpcuser",
+            rpcpassword="rpcpassword")
+        if not self.plugin_tools.wait_until_ready([probe]):
+            self.logger.error("node failed to start")
 
     def stop(self) -> None:
         """The bitcoin node requires graceful shutdown via the RPC API - a good example of why this
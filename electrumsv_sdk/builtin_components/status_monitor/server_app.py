@@ -15,10 +15,8 @@ import aiohttp
 
 from aiohttp import web
 from aiohttp.web_ws import WebSocketResponse
-from filelock import FileLock
 
-from electrumsv_sdk.components import ComponentTypedDict
-from electrumsv_sdk.config import Config
+from electrumsv_sdk.components import ComponentStore, ComponentTypedDict
 from electrumsv_sdk.utils import get_directory_name
 
 # might be running this as __main__
@@ -30,8 +28,6 @@ REFRESH_INTERVAL = 1.0
 
 COMPONENT_NAME = get_directory_name(__file__)
 logger = logging.getLogger(COMPONENT_NAME)
-filelock_logger = logging.getLogger("filelock")
-filelock_logger.setLevel(logging.WARNING)
 aiohttp_logger = logging.getLogger("aiohttp")
 aiohttp_logger.setLevel(logging.WARNING)
 
@@ -39,15 +35,8 @@ aiohttp_logger.setLevel(logging.WARNING)
 class ApplicationState(object):
 
     def __init__(self) -> None:
-        self.config = Config()
-        self.file_name = "component_state.json"
-        assert self.config.SDK_HOME_DIR is not None
-        self.lock_path = self.config.SDK_HOME_DIR / "component_state.json.lock"
-        self.component_state_path = self.config.SDK_HOME_DIR / self.file_name
-
-
-        self.file_lock = FileLock(str(self.lock_path), timeout=5)  # pylint: disable=abstract-class-instantiated
-        self.previous_state = self.read_state()  # compare at regularly to detect change
+        self.component_store = ComponentStore()
+        self.last_seq = self.component_store.get_latest_seq()  # tail the journal from here
         self.websockets: Set[WebSocketResponse] = set()
         self.websockets_lock: threading.Lock = threading.Lock()
 
@@ -70,10 +59,10 @@ class ApplicationState(object):
             self.websockets.remove(ws)
 
     def update_status_thread(self) -> None:
-        """periodically checks every REFRESH_INTERVAL seconds the component_state.json file (
-        protected by a file lock for multiprocess access). If there are changes in any
-        components, it will detect this and push the relevant components to the
-        push_notification_queue (and therefore all websockets) and log the change."""
+        """periodically checks every REFRESH_INTERVAL seconds the lifecycle journal in
+        component_state.sqlite (which is safe for multiprocess access) for events newer than the
+        last one seen. Each component with new events is pushed to the push_notification_queue
+        (and therefore all websockets) and the change is logged."""
 
         def log_and_push_change(current_component_state: ComponentTypedDict) -> None:
             logger.debug(
@@ -85,29 +74,23 @@ class ApplicationState(object):
             self.push_notification_queue.put(current_component_state)
 
         while True:
-            current_state = self.read_state()
-            if not current_state:
-                time.sleep(10)
-                logger.debug("there is no state in component_state.json yet...")
-                continue
+            events = self.component_store.get_events(since_seq=self.last_seq)
+            compacted_seq = self.component_store.get_compacted_seq()
+            if self.last_seq < compacted_seq:
+                # the journal was compacted past our position - resync from the full snapshot
+                changed_ids = list(self.read_state())
+                self.last_seq = compacted_seq
+            else:
+                changed_ids = list(dict.fromkeys(event['component_id'] for event in events))
+
+            if events:
+                self.last_seq = max(self.last_seq, events[-1]['seq'])
 
-            # status change from previous
-            for id in current_state.keys():
-                current_component_state: ComponentTypedDict = current_state[id]
-                prev_component_state = self.previous_state.get(id)
-
-                # new component (new id)
-                if not prev_component_state:
-                    log_and_push_change(current_component_state)
-                    continue
-
-                # change from previous
-                match = current_component_state.get('last_updated') == \
-                        prev_component_state.get('last_updated')
-                if current_component_state and not match:
-                    log_and_push_change(current_component_state)
+            current_state = self.read_state()
+            for id in changed_ids:
+                if id in current_state:
+                    log_and_push_change(current_state[id])
 
-            self.previous_state = current_state
             time.sleep(REFRESH_INTERVAL)
 
     def push_notifications_thread(self) -> None:
@@ -127,14 +110,7 @@ class ApplicationState(object):
                 asyncio.run_coroutine_threadsafe(ws.send_str(json.dumps(component)), loop)
 
     def read_state(self) -> Dict[str, ComponentTypedDict]:
-        with self.file_lock:
-            with open(self.component_state_path, 'r') as f:
-                data = f.read()
-                if data:
-                    component_state: Dict[str, ComponentTypedDict] = json.loads(data)
-                    return component_state
-                else:
-                    return {}
+        return self.component_store.get_status()
 
     async def manual_heartbeat(self, ws: WebSocketResponse, ws_id: int) -> None:
         """It seems that aiohttp's built-in heartbeat functionality has bugs
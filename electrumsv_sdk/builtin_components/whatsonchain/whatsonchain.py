@@ -63,7 +63,6 @@ class Plugin(AbstractPlugin):
                 self.RPC_PASSWORD):
             sys.exit(1)
 
-        os.chdir(self.src)
         # npm without .cmd extension doesn't work with Popen shell=False
         if sys.platform == "win32":
             command = f"npm.cmd start"
@@ -83,7 +82,7 @@ class Plugin(AbstractPlugin):
         status_endpoint="http://127.0.0.1:3002"
         self.plugin_tools.spawn_process(command, env_vars=env_vars, id=self.id,
             component_name=self.COMPONENT_NAME, src=self.src, logfile=logfile,
-            status_endpoint=status_endpoint)
+            status_endpoint=status_endpoint, cwd=self.src)
 
     def stop(self) -> None:
         """some components require graceful shutdown via a REST API or RPC API but most can use the
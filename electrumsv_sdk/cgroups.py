@@ -0,0 +1,211 @@
+"""
+cgroup v2 resource limits for background components on linux (see: `start --background --cgroup`).
+
+The supervisor places each component in its own cgroup (a "slice") under SDK_CGROUP_ROOT (default:
+/sys/fs/cgroup/electrumsv-sdk) with the cpu, memory and io controllers enabled so that one
+component cannot starve the others (e.g. electrumsv syncing while the node mines). The process is
+moved into its slice before it executes the component so that every process that it spawns is
+limited too. The slice is removed once the component has exited for good (i.e. it is kept for
+restarts).
+
+The limits of a component type can be set with "resource_limits" in the plugin's manifest.json
+and overridden per component type or id with "resource_limits" in config.json e.g.
+
+    "resource_limits": {
+        "node": {"cpus": 2, "cpu_weight": 200, "memory_max": "4G", "io_weight": 200},
+        "electrumsv1": {"cpus": 1, "memory_max": "2G"}
+    }
+
+Creating cgroups requires root or a delegated subtree (e.g. `systemd-run --user --scope -p
+Delegate=yes`) - SDK_CGROUP_ROOT must then point at a writable directory within it.
+"""
+import logging
+import os
+from pathlib import Path
+import re
+import sys
+from typing import Dict, List, Optional, TypedDict, Union
+
+from .config import Config
+
+logger = logging.getLogger("cgroups")
+
+CGROUP_MOUNT = Path("/sys/fs/cgroup")
+DEFAULT_CGROUP_ROOT = CGROUP_MOUNT / "electrumsv-sdk"
+CONTROLLERS = ("cpu", "memory", "io")
+CPU_PERIOD = 100000  # microseconds
+
+SIZE_REGEX = re.compile(r"^(\d+(?:\.\d+)?)([KMGT]?)i?B?$", re.IGNORECASE)
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+class CgroupError(Exception):
+    pass
+
+
+class ResourceLimitsTypedDict(TypedDict, total=False):
+    cpus: float  # cpu.max as a number of cpus (e.g. 0.5 or 2)
+    cpu_weight: int  # cpu.weight: 1 - 10000 (default: 100)
+    memory_max: Union[int, str]  # memory.max in bytes or e.g. "512M" or "4G"
+    io_weight: int  # io.weight: 1 - 10000 (default: 100)
+
+
+class CgroupStatsTypedDict(TypedDict):
+    cpu_usage_usec: int
+    cpu_throttled_usec: int
+    nr_throttled: int
+    memory_current: int
+    memory_peak: Optional[int]  # linux >= 5.19
+    oom_kills: int
+    num_processes: int
+
+
+def is_cgroup_v2_supported() -> bool:
+    return sys.platform == 'linux' and (CGROUP_MOUNT / "cgroup.controllers").exists()
+
+
+def get_cgroup_root() -> Path:
+    return Path(os.environ.get("SDK_CGROUP_ROOT", DEFAULT_CGROUP_ROOT))
+
+
+def parse_size(value: Union[int, str]) -> int:
+    if isinstance(value, int):
+        return value
+    match = SIZE_REGEX.match(value.strip())
+    if match is None:
+        raise ValueError(f"invalid size: '{value}' (expected e.g. 536870912, '512M' or '4G')")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def get_resource_limits(component_type: str, component_id: str,
+        defaults: Optional[ResourceLimitsTypedDict]=None, config: Optional[Config]=None) \
+        -> ResourceLimitsTypedDict:
+    """'defaults' (i.e. of the manifest) < config.json per component type < config.json per
+    component id"""
+    config = config if config else Config()
+    limits = ResourceLimitsTypedDict(**defaults) if defaults else ResourceLimitsTypedDict()
+    configured: Dict[str, ResourceLimitsTypedDict] = \
+        config.read_config_json().get('resource_limits', {})
+    limits.update(configured.get(component_type, {}))
+    limits.update(configured.get(component_id, {}))
+    return limits
+
+
+def get_limit_files(limits: ResourceLimitsTypedDict) -> Dict[str, str]:
+    """{interface file: value}"""
+    files: Dict[str, str] = {}
+    if limits.get('cpus'):
+        files["cpu.max"] = f"{int(limits['cpus'] * CPU_PERIOD)} {CPU_PERIOD}"
+    if limits.get('cpu_weight'):
+        files["cpu.weight"] = str(limits['cpu_weight'])
+    if limits.get('memory_max'):
+        files["memory.max"] = str(parse_size(limits['memory_max']))
+    if limits.get('io_weight'):
+        files["io.weight"] = f"default {limits['io_weight']}"
+    return files
+
+
+def read_key_values(path: Path) -> Dict[str, int]:
+    """e.g. cpu.stat or memory.events"""
+    values: Dict[str, int] = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                key, _, value = line.partition(" ")
+                if value.strip().isdigit():
+                    values[key] = int(value)
+    except (FileNotFoundError, PermissionError):
+        pass
+    return values
+
+
+def read_int(path: Path) -> Optional[int]:
+    try:
+        with open(path, "r") as f:
+            value = f.read().strip()
+    except (FileNotFoundError, PermissionError):
+        return None
+    return int(value) if value.isdigit() else None
+
+
+def read_cgroup_stats(path: Path) -> Optional[CgroupStatsTypedDict]:
+    """None if the cgroup no longer exists"""
+    if not path.is_dir():
+        return None
+    cpu_stat = read_key_values(path / "cpu.stat")
+    memory_events = read_key_values(path / "memory.events")
+    try:
+        with open(path / "cgroup.procs", "r") as f:
+            num_processes = sum(1 for line in f if line.strip())
+    except (FileNotFoundError, PermissionError):
+        num_processes = 0
+    return CgroupStatsTypedDict(
+        cpu_usage_usec=cpu_stat.get("usage_usec", 0),
+        cpu_throttled_usec=cpu_stat.get("throttled_usec", 0),
+        nr_throttled=cpu_stat.get("nr_throttled", 0),
+        memory_current=read_int(path / "memory.current") or 0,
+        memory_peak=read_int(path / "memory.peak"),
+        oom_kills=memory_events.get("oom_kill", 0),
+        num_processes=num_processes,
+    )
+
+
+class ComponentCgroup:
+
+    def __init__(self, component_id: str, root: Optional[Path]=None) -> None:
+        self.root = root if root is not None else get_cgroup_root()
+        self.path = self.root / component_id
+
+    def enable_controllers(self) -> None:
+        """the controllers must be enabled in the root's subtree_control for the slices to be
+        limited by them (the root's parent must already delegate them to the root)"""
+        try:
+            with open(self.root / "cgroup.controllers", "r") as f:
+                available = set(f.read().split())
+        except FileNotFoundError:
+            available = set(CONTROLLERS)
+        missing = [controller for controller in CONTROLLERS if controller not in available]
+        if missing:
+            logger.warning(f"cgroup controllers are not available in {self.root}: {missing}")
+        enabled = " ".join(f"+{controller}" for controller in CONTROLLERS
+            if controller in available)
+        if enabled:
+            with open(self.root / "cgroup.subtree_control", "w") as f:
+                f.write(enabled)
+
+    def create(self, limits: ResourceLimitsTypedDict) -> None:
+        try:
+            limit_files = get_limit_files(limits)
+        except (TypeError, ValueError) as e:
+            raise CgroupError(f"invalid resource limits: {limits} ({e})") from e
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            self.enable_controllers()
+            os.makedirs(self.path, exist_ok=True)
+            for filename, value in limit_files.items():
+                with open(self.path / filename, "w") as f:
+                    f.write(value)
+        except OSError as e:
+            raise CgroupError(f"failed to create the cgroup: {self.path} ({e})") from e
+        logger.debug(f"created cgroup: {self.path} with: {limit_files}")
+
+    def wrap_args(self, args: List[str]) -> List[str]:
+        """the shell moves itself into the cgroup before it executes the component so that there
+        is no window in which the component (or its children) could escape the limits"""
+        return ["/bin/sh", "-c", 'echo $$ > "$0" && exec "$@"', str(self.path / "cgroup.procs")] \
+            + args
+
+    def get_stats(self) -> Optional[CgroupStatsTypedDict]:
+        return read_cgroup_stats(self.path)
+
+    def remove(self) -> bool:
+        """only possible once every process in it has exited"""
+        try:
+            os.rmdir(self.path)
+        except FileNotFoundError:
+            return True
+        except OSError as e:
+            logger.warning(f"failed to remove the cgroup: {self.path} ({e})")
+            return False
+        logger.debug(f"removed cgroup: {self.path}")
+        return True
@@ -1,16 +1,34 @@
 """This defines a set of exposed public methods for using the SDK as a library"""
 import logging
-from typing import Dict, Optional, Tuple, Any
+from typing import Dict, Iterable, List, Optional, Tuple, Any
 
-from .components import ComponentStore, ComponentTypedDict
+from .components import ComponentStore, ComponentTypedDict, ComponentEventTypedDict
 from .app_state import AppState
 from .constants import NameSpace
 from .controller import Controller
+from .exceptions import CommandFailedError
+from .node_rpc import RPCCall, get_node_rpc_client
+from .supervisor_client import forward_command
 from .utils import call_any_node_rpc
 
 logger = logging.getLogger("commands")
 
 
+def _run_command(arguments: List[str]) -> None:
+    """executed by the supervisor daemon if one is running (see: supervisor.py) otherwise
+    in-process. Raises CommandFailedError if the supervisor reports that the command failed."""
+    exit_code = forward_command(list(arguments))
+    if exit_code is not None:
+        if exit_code != 0:
+            raise CommandFailedError(arguments, exit_code)
+        return
+
+    app_state = AppState(arguments)
+    app_state.handle_first_ever_run()
+    controller = Controller(app_state)
+    controller.run(app_state.cli_inputs)
+
+
 def install(component_type: str, repo: str = "", branch: str = "",
         component_id: str = "") -> None:
 
@@ -24,10 +42,7 @@ def install(component_type: str, repo: str = "", branch: str = "",
 
     # Must place component type after install options:
     arguments.append(component_type)
-    app_state = AppState(arguments)
-    app_state.handle_first_ever_run()
-    controller = Controller(app_state)
-    controller.install(app_state.cli_inputs)
+    _run_command(arguments)
 
 
 def _validate_network(network: str, component_type: str) -> None:
@@ -43,9 +58,10 @@ def _validate_network(network: str, component_type: str) -> None:
 def start(component_type: str, component_args: Optional[Tuple[str]]=None, repo: str = "",
         branch: str = "", new_instance: bool = False, gui: bool = False,
         mode: str="new-terminal", component_id: str = "", network: str="",
-        deterministic_seed: bool=False) -> None:
+        deterministic_seed: bool=False, count: int=1) -> None:
     """mode: can be 'background', 'new-terminal' or 'inline'
-    network: can be 'regtest' or 'testnet' """
+    network: can be 'regtest' or 'testnet'
+    count: the number of new instances to start (returns once they are all ready)"""
 
     arguments = ["", NameSpace.START]
     if repo:
@@ -54,6 +70,8 @@ def start(component_type: str, component_args: Optional[Tuple[str]]=None, repo:
         arguments.append(f"--branch={branch}")
     if new_instance:
         arguments.append("--new")
+    if count != 1:
+        arguments.append(f"--count={count}")
     if gui:
         arguments.append("--gui")
     if mode:
@@ -74,10 +92,7 @@ def start(component_type: str, component_args: Optional[Tuple[str]]=None, repo:
     if component_args:
         arguments.extend(component_args)  # e.g. e.g. access electrumsv's internal CLI
 
-    app_state = AppState(arguments)
-    app_state.handle_first_ever_run()
-    controller = Controller(app_state)
-    controller.start(app_state.cli_inputs)
+    _run_command(arguments)
 
 
 def stop(component_type: Optional[str]=None, component_id: str = "") -> None:
@@ -90,10 +105,7 @@ def stop(component_type: Optional[str]=None, component_id: str = "") -> None:
     if component_type:
         arguments.append(component_type)
 
-    app_state = AppState(arguments)
-    app_state.handle_first_ever_run()
-    controller = Controller(app_state)
-    controller.stop(app_state.cli_inputs)
+    _run_command(arguments)
 
 
 def reset(component_type: Optional[str]=None, component_id: str = "", repo: str = "",
@@ -114,10 +126,7 @@ def reset(component_type: Optional[str]=None, component_id: str = "", repo: str
     if component_type:
         arguments.append(component_type)
 
-    app_state = AppState(arguments)
-    app_state.handle_first_ever_run()
-    controller = Controller(app_state)
-    controller.reset(app_state.cli_inputs)
+    _run_command(arguments)
 
 
 def node(method: str, *args: str, node_id: str = 'node1') -> Any:
@@ -128,7 +137,27 @@ def node(method: str, *args: str, node_id: str = 'node1') -> Any:
         return {}
 
 
+def node_batch(calls: Iterable[RPCCall], node_id: str = 'node1') -> List[Dict[str, Any]]:
+    """JSON-RPC batch e.g. node_batch([('getblockhash', [height]) for height in range(10000)])
+    returns the response of each call in order. Large batches are split up automatically (see:
+    NodeRPCClient.call_batch)."""
+    return list(get_node_rpc_client(node_id).call_batch(calls))
+
+
 def status(component_type: str = "", component_id: str = "") -> Dict[str, ComponentTypedDict]:
     component_store = ComponentStore()
     status = component_store.get_status(component_type, component_id)
     return status
+
+
+def history(component_id: str) -> List[ComponentEventTypedDict]:
+    """lifecycle events recorded for the component (oldest first)"""
+    component_store = ComponentStore()
+    return component_store.get_history(component_id)
+
+
+def events(since_seq: int = 0) -> List[ComponentEventTypedDict]:
+    """all lifecycle events newer than 'since_seq' - pass the 'seq' of the last event seen to
+    tail the journal"""
+    component_store = ComponentStore()
+    return component_store.get_events(since_seq=since_seq)
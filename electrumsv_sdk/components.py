@@ -1,5 +1,5 @@
 """
-all status changes for each component are persisted and read from component_state.json
+all status changes for each component are persisted and read from component_state.sqlite
 
 STARTUP:
 - immediate success is achieved (no exceptions at launch)    state=Running
@@ -19,7 +19,7 @@ are still online
 - if state=Failed & reachable then                           state=Running
 - if state=Failed & NOT reachable then remains as            state=Failed
 
-the status-monitor server will continue monitoring all entries in the component_state.json
+the status-monitor server will continue monitoring all entries in the component_state.sqlite
 regardless of which state they are in.
 - If state=Failed but the service becomes reachable subsequently, the status will return to
 state=Running.
@@ -30,17 +30,26 @@ import datetime
 import json
 import logging
 import os
+import sqlite3
 import sys
+import threading
 from importlib import import_module
 from pathlib import Path
-from typing import Optional, Union, Dict, cast
-from filelock import FileLock
+from types import TracebackType
+from typing import Any, Callable, Iterable, Optional, Union, Dict, List, Tuple, Type, cast
 
 from .config import CLIInputs, Config
-from .constants import ComponentState
+from .constants import ComponentEvent, ComponentState
+from .plugin_registry import PluginRegistry
 from .sdk_types import AbstractPlugin, AbstractModuleType
 
 TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# The journal is compacted every JOURNAL_COMPACTION_INTERVAL appended events and only the most
+# recent JOURNAL_EVENTS_PER_COMPONENT events of each component survive a compaction (the current
+# state of every component is always available in full from the 'components' table).
+JOURNAL_COMPACTION_INTERVAL = int(os.environ.get("SDK_JOURNAL_COMPACTION_INTERVAL", 1000))
+JOURNAL_EVENTS_PER_COMPONENT = int(os.environ.get("SDK_JOURNAL_EVENTS_PER_COMPONENT", 100))
 MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 logger = logging.getLogger("component-store")
@@ -59,6 +68,13 @@ class ComponentMetadata(TypedDict, total=False):
     datadir: str
     p2p_port: int
     config_path: str  # path for electrumsv wallets (depending on which network)
+    time_to_ready: float  # seconds from spawning the process until the readiness probes passed
+    stop_latency: float  # seconds from signalling the process until it (and its children) exited
+    restart_count: int  # number of times the supervisor restarted the component
+    time_to_recover: float  # seconds from the last unexpected exit until it was ready again
+    cgroup: str  # path of the component's cgroup v2 slice (see: cgroups.py)
+    cpu_affinity: str  # the cpus that its processes are pinned to e.g. "0-3,6"
+    cpu_layout: str  # "manual" or "auto" (see: cpu_affinity.py)
 
 
 class ComponentTypedDict(TypedDict):
@@ -73,6 +89,25 @@ class ComponentTypedDict(TypedDict):
     last_updated: Optional[str]
 
 
+class PortLeaseTypedDict(TypedDict):
+    port: int
+    component_id: str
+    component_type: str
+    purpose: str  # e.g. 'rpcport', 'p2p_port'
+    leased_at: str
+
+
+class ComponentEventTypedDict(TypedDict):
+    seq: int
+    component_id: str
+    component_type: str
+    event: str
+    component_state: Optional[str]
+    pid: Optional[int]
+    exit_code: Optional[int]
+    timestamp: str
+
+
 class Component:
     def __init__(
         self,
@@ -93,7 +128,7 @@ class Component:
         self.component_state = ComponentState.from_str(str(component_state))
         self.location = str(location)
         self.metadata = metadata
-        self.logging_path = str(logging_path)
+        self.logging_path = str(logging_path) if logging_path is not None else None
         self.last_updated = last_updated
         if not last_updated:
             self.last_updated = get_str_datetime()
@@ -129,135 +164,526 @@ class Component:
         return cls(**component_dict)
 
 
+def _to_optional_text(value: Optional[Union[str, Path]]) -> Optional[str]:
+    """NULL rather than the text 'None' (which is what a missing location becomes in Component)"""
+    return str(value) if value is not None and str(value) != "None" else None
+
+
+class _WriteTransaction:
+    """'BEGIN IMMEDIATE' takes the sqlite write lock up-front so that a read-modify-write cannot be
+    interleaved with a write from another process (sqlite's busy timeout handles the waiting).
+
+    Writers apply their changes to the cached snapshot inside of the transaction so the snapshot
+    is discarded (and re-read on next use) if the transaction is rolled back or fails to commit."""
+
+    def __init__(self, cache: "_StoreCache") -> None:
+        self.cache = cache
+        self.db = cache.db
+        self.lock = cache.lock
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.lock.acquire()
+        try:
+            self.db.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self.lock.release()
+            raise
+        return self.db
+
+    def __exit__(self, exc_type: Optional[Type[BaseException]],
+            exc_value: Optional[BaseException], traceback: Optional[TracebackType]) -> None:
+        try:
+            if exc_type is not None:
+                self.rollback()
+                return
+            try:
+                self.db.execute("COMMIT")
+            except Exception:
+                self.rollback()
+                raise
+        finally:
+            self.lock.release()
+
+    def rollback(self) -> None:
+        self.cache.snapshot = None
+        # sqlite has already rolled back the transaction after some errors (e.g. SQLITE_FULL)
+        if self.db.in_transaction:
+            self.db.execute("ROLLBACK")
+
+
+class _StoreCache:
+    """Process-wide state shared by every ComponentStore instance that uses the same database file.
+
+    The snapshot of all rows is only re-read when sqlite's 'data_version' changes (i.e. when
+    another connection - usually another process - has committed a write). Writes made via this
+    connection are applied to the snapshot directly."""
+
+    def __init__(self, db: sqlite3.Connection, file_identity: Tuple[int, int]) -> None:
+        self.db = db
+        self.file_identity = file_identity
+        # the connection is shared by threads (e.g. the status_monitor) - sqlite serializes each
+        # statement but the lock is needed to stop transactions from interleaving
+        self.lock = threading.RLock()
+        self.data_version: Optional[int] = None
+        self.snapshot: Optional[Dict[str, ComponentTypedDict]] = None
+
+
+# {database path: _StoreCache}
+_store_caches: Dict[Path, _StoreCache] = {}
+_store_caches_lock = threading.Lock()
+
+
+def _copy_component_dict(component_dict: ComponentTypedDict) -> ComponentTypedDict:
+    """callers are free to mutate what they are given (e.g. Component.from_dict) so the cached
+    snapshot is never handed out directly"""
+    component_dict = cast(ComponentTypedDict, dict(component_dict))
+    metadata = component_dict['metadata']
+    if metadata is not None:
+        component_dict['metadata'] = cast(ComponentMetadata, dict(metadata))
+    return component_dict
+
+
 class ComponentStore:
-    """multiprocess safe read/write access to component_state.json
-    (which is basically acting as a stand-in for a database - which would be major overkill)"""
+    """multiprocess safe read/write access to component_state.sqlite
+
+    There is one row per component and every state change is a single row-level upsert inside
+    its own transaction (WAL mode allows readers to proceed concurrently with a writer). Any
+    legacy component_state.json file is imported automatically the first time it is found.
+
+    Instantiation is cheap - the connection, a snapshot of the rows and the plugin registry are
+    cached for the lifetime of the process and are only refreshed when they change on disk."""
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS components (
+            id TEXT PRIMARY KEY,
+            pid INTEGER,
+            component_type TEXT NOT NULL,
+            location TEXT,
+            status_endpoint TEXT,
+            component_state TEXT,
+            metadata TEXT,
+            logging_path TEXT,
+            last_updated TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_components_component_type "
+            "ON components (component_type)",
+        "CREATE INDEX IF NOT EXISTS idx_components_component_state "
+            "ON components (component_state)",
+        # append-only lifecycle journal (see 'append_event' and 'compact_journal')
+        """CREATE TABLE IF NOT EXISTS component_events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            component_id TEXT NOT NULL,
+            component_type TEXT NOT NULL,
+            event TEXT NOT NULL,
+            component_state TEXT,
+            pid INTEGER,
+            exit_code INTEGER,
+            timestamp TEXT NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_component_events_component_id "
+            "ON component_events (component_id, seq)",
+        """CREATE TABLE IF NOT EXISTS journal_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )""",
+        # ports allocated to components (see 'lease_ports' and 'release_ports')
+        """CREATE TABLE IF NOT EXISTS port_leases (
+            port INTEGER PRIMARY KEY,
+            component_id TEXT NOT NULL,
+            component_type TEXT NOT NULL,
+            purpose TEXT NOT NULL,
+            leased_at TEXT NOT NULL,
+            UNIQUE (component_id, purpose)
+        )""",
+    ]
+    COLUMNS = ("id", "pid", "component_type", "location", "status_endpoint", "component_state",
+        "metadata", "logging_path", "last_updated")
+    PORT_LEASE_COLUMNS = ("port", "component_id", "component_type", "purpose", "leased_at")
+    EVENT_COLUMNS = ("seq", "component_id", "component_type", "event", "component_state", "pid",
+        "exit_code", "timestamp")
 
     def __init__(self) -> None:
         self.config = Config()
-        self.file_name = "component_state.json"
+        self.file_name = "component_state.sqlite"
+        self.legacy_file_name = "component_state.json"
         assert self.config.SDK_HOME_DIR is not None
-        self.lock_path = self.config.SDK_HOME_DIR / "component_state.json.lock"
-        self.file_lock = FileLock(str(self.lock_path), timeout=5)  # pylint: disable=abstract-class-instantiated
         self.component_state_path = self.config.SDK_HOME_DIR / self.file_name
-        if not self.component_state_path.exists():
-            open(self.component_state_path, 'w').close()
+        self.legacy_component_state_path = self.config.SDK_HOME_DIR / self.legacy_file_name
+        self.cache = self.get_store_cache()
+        self.db = self.cache.db
+        self.lock = self.cache.lock
+        self.plugin_registry = PluginRegistry(self.config)
         self.component_map = self.get_component_map()
 
-    def get_status(self, component_type: Optional[str]=None,
-            component_id: Optional[str]=None) -> Dict[str, ComponentTypedDict]:
-        filelock_logger = logging.getLogger("filelock")
-        filelock_logger.setLevel(logging.WARNING)
-
-        with self.file_lock:
-            if self.component_state_path.exists():
-                with open(self.component_state_path, "r") as f:
+    def get_store_cache(self) -> _StoreCache:
+        """The cached connection is discarded if the database file has been deleted or replaced
+        (e.g. the SDK_HOME_DIR was wiped) since it was opened."""
+        with _store_caches_lock:
+            cache = _store_caches.get(self.component_state_path)
+            try:
+                stat = os.stat(self.component_state_path)
+                file_identity: Optional[Tuple[int, int]] = (stat.st_dev, stat.st_ino)
+            except FileNotFoundError:
+                file_identity = None
+
+            if cache is not None and cache.file_identity == file_identity:
+                return cache
+
+            if cache is not None:
+                cache.db.close()
+            db = self.open_database()
+            stat = os.stat(self.component_state_path)
+            cache = _StoreCache(db, (stat.st_dev, stat.st_ino))
+            _store_caches[self.component_state_path] = cache
+            self.cache, self.db, self.lock = cache, cache.db, cache.lock
+            self.migrate_legacy_json_file()
+            return cache
+
+    def open_database(self) -> sqlite3.Connection:
+        # isolation_level=None -> transactions are managed explicitly (see 'write_transaction')
+        db = sqlite3.connect(str(self.component_state_path), timeout=5,
+            isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        for statement in self.SCHEMA:
+            db.execute(statement)
+        return db
+
+    def write_transaction(self) -> "_WriteTransaction":
+        return _WriteTransaction(self.cache)
+
+    def migrate_legacy_json_file(self) -> None:
+        """component_state.json was used prior to the sqlite database. Rows that already exist in
+        the database take precedence over the contents of the legacy file."""
+        if not self.legacy_component_state_path.exists():
+            return
+
+        with self.write_transaction():
+            try:
+                with open(self.legacy_component_state_path, "r") as f:
                     data = f.read()
-                    component_state: Dict[str, ComponentTypedDict]
-                    if data:
-                        component_state = json.loads(data)
-                    else:
-                        component_state = {}
-
-                if component_type and component_id:
-                    raise ValueError("Cannot handle both 'component_type' and 'component_id'. "
-                        "Please choose one or the other.")
-
-                if component_type:
-                    filtered_result: Dict[str, ComponentTypedDict] = {}
-                    # Only save / modify the relevant component types
-                    for key, val in component_state.items():
-                        if val['component_type'] == component_type:
-                            filtered_result[key] = val
-
-                    return filtered_result
-
-                if component_id:
-                    result = component_state.get(component_id)
-                    if result:
-                        return {component_id: result}
-                    raise ValueError(f"Component id: '{component_id}' not found in store.")
-
-                return component_state
-            else:
-                return {}
+            except FileNotFoundError:
+                return  # another process migrated it first
+
+            component_state: Dict[str, ComponentTypedDict] = json.loads(data) if data else {}
+            for component_dict in component_state.values():
+                self.db.execute(f"INSERT OR IGNORE INTO components ({', '.join(self.COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                    self._to_row(component_dict))
+            # the inserts bypass the snapshot (and do not change this connection's data_version)
+            self.cache.snapshot = None
+
+            os.replace(self.legacy_component_state_path,
+                self.legacy_component_state_path.with_suffix(".json.migrated"))
+            logger.debug(f"migrated {len(component_state)} components from "
+                f"{self.legacy_component_state_path} to {self.component_state_path}")
+
+    def _to_row(self, component_dict: ComponentTypedDict) -> Tuple[Any, ...]:
+        metadata = component_dict.get('metadata')
+        return (
+            component_dict['id'],
+            component_dict.get('pid'),
+            component_dict['component_type'],
+            _to_optional_text(component_dict.get('location')),
+            component_dict.get('status_endpoint'),
+            component_dict.get('component_state'),
+            json.dumps(metadata) if metadata is not None else None,
+            _to_optional_text(component_dict.get('logging_path')),
+            component_dict.get('last_updated'),
+        )
 
-    def update_status_file(self, new_component_info: Component) -> None:
-        """updates to the *file* (component.json) - does *not* update the server"""
+    def _from_row(self, row: Tuple[Any, ...]) -> ComponentTypedDict:
+        (id, pid, component_type, location, status_endpoint, component_state, metadata,
+            logging_path, last_updated) = row
+        return ComponentTypedDict(
+            id=id,
+            pid=pid,
+            component_type=component_type,
+            location=location,
+            status_endpoint=status_endpoint,
+            component_state=component_state,
+            metadata=json.loads(metadata) if metadata is not None else None,
+            # rows written by earlier versions can contain the text 'None'
+            logging_path=_to_optional_text(logging_path),
+            last_updated=last_updated
+        )
 
-        component_state = {}
-        with self.file_lock:
-            if self.component_state_path.exists():
-                with open(self.component_state_path, "r") as f:
-                    data = f.read()
-                    if data:
-                        component_state = json.loads(data)
-                    else:
-                        component_state = {}
-        assert isinstance(component_state, dict)
-        component_state[new_component_info.id] = new_component_info.to_dict()
-
-        with open(self.component_state_path, "w") as f:
-            f.write(json.dumps(component_state, indent=4))
-            f.flush()
+    def read_snapshot(self) -> Dict[str, ComponentTypedDict]:
+        """must be called with self.lock held. 'PRAGMA data_version' only changes when a different
+        connection commits so this is a cheap check that avoids re-reading every row."""
+        data_version = self.db.execute("PRAGMA data_version").fetchone()[0]
+        if self.cache.snapshot is None or data_version != self.cache.data_version:
+            rows = self.db.execute(f"SELECT {', '.join(self.COLUMNS)} FROM components "
+                f"ORDER BY rowid").fetchall()
+            snapshot: Dict[str, ComponentTypedDict] = {}
+            for row in rows:
+                component_dict = self._from_row(row)
+                snapshot[component_dict['id']] = component_dict
+            self.cache.snapshot = snapshot
+            self.cache.data_version = data_version
+        return self.cache.snapshot
+
+    def _event_from_row(self, row: Tuple[Any, ...]) -> ComponentEventTypedDict:
+        seq, component_id, component_type, event, component_state, pid, exit_code, timestamp = row
+        return ComponentEventTypedDict(
+            seq=seq,
+            component_id=component_id,
+            component_type=component_type,
+            event=event,
+            component_state=component_state,
+            pid=pid,
+            exit_code=exit_code,
+            timestamp=timestamp
+        )
+
+    def get_status(self, component_type: Optional[str]=None,
+            component_id: Optional[str]=None) -> Dict[str, ComponentTypedDict]:
+        if component_type and component_id:
+            raise ValueError("Cannot handle both 'component_type' and 'component_id'. "
+                "Please choose one or the other.")
+
+        with self.lock:
+            snapshot = self.read_snapshot()
+            if component_type:
+                return {id: _copy_component_dict(component_dict)
+                    for id, component_dict in snapshot.items()
+                    if component_dict['component_type'] == component_type}
+
+            if component_id:
+                result = snapshot.get(component_id)
+                if result:
+                    return {component_id: _copy_component_dict(result)}
+                raise ValueError(f"Component id: '{component_id}' not found in store.")
+
+            return {id: _copy_component_dict(component_dict)
+                for id, component_dict in snapshot.items()}
+
+    def update_status_file(self, new_component_info: Component, event: Optional[str]=None,
+            exit_code: Optional[int]=None, keep_port_leases: bool=False) -> None:
+        """upserts the row for this component in the database - does *not* update the server
+
+        The state transition is also appended to the lifecycle journal in the same transaction
+        ('event' defaults to the one that corresponds to the new component_state). The ports of a
+        stopped or failed component are released unless it is about to be restarted."""
+        assignments = ", ".join(f"{column}=excluded.{column}" for column in self.COLUMNS[1:])
+        component_dict = new_component_info.to_dict()
+        if event is None:
+            event = ComponentEvent.from_component_state(new_component_info.component_state)
+
+        with self.write_transaction():
+            # bring the snapshot up to date with other processes' writes *before* applying ours
+            # because our own commit does not change 'data_version'
+            snapshot = self.read_snapshot()
+            # metadata recorded for a running process (e.g. 'time_to_ready' - see:
+            # update_metadata) is kept until the component is started as a new process
+            existing = snapshot.get(new_component_info.id)
+            if existing and existing['metadata'] and existing['pid'] is not None \
+                    and existing['pid'] == component_dict['pid']:
+                component_dict['metadata'] = cast(ComponentMetadata,
+                    {**existing['metadata'], **(component_dict['metadata'] or {})})
+            row = self._to_row(component_dict)
+            self.db.execute(f"INSERT INTO components ({', '.join(self.COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(self.COLUMNS))}) "
+                f"ON CONFLICT(id) DO UPDATE SET {assignments}", row)
+            snapshot[new_component_info.id] = self._from_row(row)
+            if not keep_port_leases and new_component_info.component_state in {
+                    ComponentState.STOPPED, ComponentState.FAILED}:
+                self._release_ports(new_component_info.id)
+            if event is not None:
+                self._append_event(new_component_info.id, new_component_info.component_type,
+                    event, new_component_info.component_state, new_component_info.pid, exit_code)
         logger.debug(f"updated status: {new_component_info}")
 
+    def update_metadata(self, component_id: str, metadata: ComponentMetadata) -> bool:
+        """merges 'metadata' into the metadata of an existing component. Returns False if there is
+        no such component."""
+        with self.write_transaction():
+            snapshot = self.read_snapshot()
+            component_dict = snapshot.get(component_id)
+            if component_dict is None:
+                return False
+            merged_metadata = cast(ComponentMetadata,
+                {**(component_dict['metadata'] or {}), **metadata})
+            self.db.execute("UPDATE components SET metadata=? WHERE id=?",
+                (json.dumps(merged_metadata), component_id))
+            component_dict['metadata'] = merged_metadata
+        return True
+
+    # ----- PORT LEASES ----- #
+
+    def get_port_leases(self) -> Dict[int, PortLeaseTypedDict]:
+        with self.lock:
+            rows = self.db.execute(f"SELECT {', '.join(self.PORT_LEASE_COLUMNS)} "
+                f"FROM port_leases ORDER BY port").fetchall()
+        return {row[0]: PortLeaseTypedDict(port=row[0], component_id=row[1],
+            component_type=row[2], purpose=row[3], leased_at=row[4]) for row in rows}
+
+    def lease_ports(self, component_id: str, component_type: str,
+            candidate_ports: Dict[str, Iterable[int]],
+            is_port_available: Callable[[int], bool]) -> Dict[str, int]:
+        """Each purpose (e.g. 'rpcport') is leased the first of its candidate ports that is not
+        leased to another component (or for another purpose) and for which 'is_port_available'
+        returns True. A port that is already leased to the component for the same purpose is
+        kept if it is still available (e.g. it was leased up front by 'lease_ports_batch').
+
+        This happens in a single write transaction so that components that are started
+        concurrently (even by different processes) cannot be allocated the same port. Raises
+        ValueError if a purpose runs out of candidate ports."""
+        return self.lease_ports_batch(component_type, {component_id: candidate_ports},
+            is_port_available)[component_id]
+
+    def lease_ports_batch(self, component_type: str,
+            candidate_ports: Dict[str, Dict[str, Iterable[int]]],
+            is_port_available: Callable[[int], bool]) -> Dict[str, Dict[str, int]]:
+        """The same as 'lease_ports' for several components in one write transaction
+        {component_id: {purpose: candidate ports}} -> {component_id: {purpose: port}}"""
+        leased_ports: Dict[str, Dict[str, int]] = {}
+        with self.write_transaction():
+            rows = self.db.execute("SELECT port, component_id, purpose FROM port_leases")\
+                .fetchall()
+            for component_id, component_candidate_ports in candidate_ports.items():
+                leased_ports[component_id] = self._lease_ports(component_id, component_type,
+                    component_candidate_ports, is_port_available, rows)
+                rows.extend((port, component_id, purpose)
+                    for purpose, port in leased_ports[component_id].items())
+        for component_id, component_leased_ports in leased_ports.items():
+            logger.debug(f"leased ports: {component_leased_ports} to: {component_id}")
+        return leased_ports
+
+    def _lease_ports(self, component_id: str, component_type: str,
+            candidate_ports: Dict[str, Iterable[int]], is_port_available: Callable[[int], bool],
+            rows: List[Tuple[int, str, str]]) -> Dict[str, int]:
+        """must be called inside of a write transaction ('rows' are the current leases)"""
+        taken_ports = {port for port, lease_component_id, purpose in rows
+            if lease_component_id != component_id or purpose not in candidate_ports}
+        previous_ports = {purpose: port for port, lease_component_id, purpose in rows
+            if lease_component_id == component_id}
+        leased_ports: Dict[str, int] = {}
+        for purpose, candidates in candidate_ports.items():
+            previous_port = previous_ports.get(purpose)
+            if previous_port is not None and previous_port not in taken_ports and \
+                    is_port_available(previous_port):
+                port = previous_port
+            else:
+                for port in candidates:
+                    if port not in taken_ports and is_port_available(port):
+                        break
+                else:
+                    raise ValueError(f"no port is available for: {component_id} ({purpose})")
+            taken_ports.add(port)
+            leased_ports[purpose] = port
+
+        leased_at = get_str_datetime()
+        self.db.executemany("DELETE FROM port_leases WHERE component_id=? AND purpose=?",
+            [(component_id, purpose) for purpose in leased_ports])
+        self.db.executemany(f"INSERT INTO port_leases "
+            f"({', '.join(self.PORT_LEASE_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+            [(port, component_id, component_type, purpose, leased_at)
+                for purpose, port in leased_ports.items()])
+        return leased_ports
+
+    def release_ports(self, component_id: str) -> int:
+        with self.write_transaction():
+            return self._release_ports(component_id)
+
+    def _release_ports(self, component_id: str) -> int:
+        """must be called inside of a write transaction"""
+        cursor = self.db.execute("DELETE FROM port_leases WHERE component_id=?", (component_id,))
+        return cursor.rowcount
+
+    # ----- LIFECYCLE JOURNAL ----- #
+
+    def append_event(self, component_id: str, component_type: str, event: str,
+            pid: Optional[int]=None, exit_code: Optional[int]=None) -> int:
+        """for events that do not change the persisted component state (e.g. 'starting' before
+        there is a pid or 'ready' once the component is serving requests)"""
+        with self.write_transaction():
+            component_dict = self.read_snapshot().get(component_id)
+            component_state = component_dict['component_state'] if component_dict else None
+            return self._append_event(component_id, component_type, event, component_state, pid,
+                exit_code)
+
+    def _append_event(self, component_id: str, component_type: str, event: str,
+            component_state: Optional[str], pid: Optional[int], exit_code: Optional[int]) -> int:
+        """must be called inside of a write transaction"""
+        cursor = self.db.execute("INSERT INTO component_events (component_id, component_type, "
+            "event, component_state, pid, exit_code, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (component_id, component_type, event, component_state, pid, exit_code,
+                get_str_datetime()))
+        seq = cast(int, cursor.lastrowid)
+        if seq % JOURNAL_COMPACTION_INTERVAL == 0:
+            self._compact_journal(JOURNAL_EVENTS_PER_COMPONENT)
+        return seq
+
+    def get_events(self, since_seq: int=0, component_id: Optional[str]=None,
+            limit: Optional[int]=None) -> List[ComponentEventTypedDict]:
+        """returns journal events with a sequence number greater than 'since_seq' (oldest first).
+        Consumers tailing the journal should resync from 'get_status' if 'since_seq' is older than
+        'get_compacted_seq' because the events in between may have been discarded."""
+        query = f"SELECT {', '.join(self.EVENT_COLUMNS)} FROM component_events WHERE seq>?"
+        params: List[Any] = [since_seq]
+        if component_id:
+            query += " AND component_id=?"
+            params.append(component_id)
+        query += " ORDER BY seq"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self.lock:
+            rows = self.db.execute(query, params).fetchall()
+        return [self._event_from_row(row) for row in rows]
+
+    def get_history(self, component_id: str) -> List[ComponentEventTypedDict]:
+        return self.get_events(component_id=component_id)
+
+    def get_latest_seq(self) -> int:
+        with self.lock:
+            row = self.db.execute("SELECT MAX(seq) FROM component_events").fetchone()
+        return row[0] or 0
+
+    def get_compacted_seq(self) -> int:
+        with self.lock:
+            row = self.db.execute("SELECT value FROM journal_meta WHERE key='compacted_seq'") \
+                .fetchone()
+        return row[0] if row else 0
+
+    def compact_journal(self, events_per_component: int=JOURNAL_EVENTS_PER_COMPONENT) -> int:
+        with self.write_transaction():
+            return self._compact_journal(events_per_component)
+
+    def _compact_journal(self, events_per_component: int) -> int:
+        """must be called inside of a write transaction. The 'components' table is the snapshot
+        that the discarded events are folded into. Returns the number of events removed."""
+        compacted_seq = self.db.execute("SELECT MAX(seq) FROM component_events WHERE seq IN ("
+            "SELECT seq FROM (SELECT seq, ROW_NUMBER() OVER (PARTITION BY component_id "
+            "ORDER BY seq DESC) AS position FROM component_events) WHERE position>?)",
+            (events_per_component,)).fetchone()[0]
+        if compacted_seq is None:
+            return 0
+
+        cursor = self.db.execute("DELETE FROM component_events WHERE seq IN ("
+            "SELECT seq FROM (SELECT seq, ROW_NUMBER() OVER (PARTITION BY component_id "
+            "ORDER BY seq DESC) AS position FROM component_events) WHERE position>?)",
+            (events_per_component,))
+        self.db.execute("INSERT INTO journal_meta (key, value) VALUES ('compacted_seq', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value=MAX(value, excluded.value)", (compacted_seq,))
+        logger.debug(f"compacted {cursor.rowcount} journal events (up to seq={compacted_seq})")
+        return cursor.rowcount
+
     def component_status_data_by_id(self, component_id: str) -> Optional[ComponentTypedDict]:
-        component_state = self.get_status()
-        component_info = component_state.get(component_id)
+        with self.lock:
+            component_info = self.read_snapshot().get(component_id)
         if component_info:
-            return ComponentTypedDict(
-                id=component_info['id'],
-                pid=component_info['pid'],
-                component_type=component_info['component_type'],
-                location=component_info['location'],
-                status_endpoint=component_info['status_endpoint'],
-                component_state=component_info['component_state'],
-                metadata=component_info['metadata'],
-                logging_path=component_info['logging_path'],
-                last_updated=component_info['last_updated']
-            )
+            return _copy_component_dict(component_info)
 
         logger.error("component id not found")
         return None
 
     def get_component_map(self) -> Dict[str, Path]:
-        assert self.config.BUILTIN_COMPONENTS_DIR is not None
-        assert self.config.USER_PLUGINS_DIR is not None
-        assert self.config.LOCAL_PLUGINS_DIR is not None
-
-        component_map = {}  # component_name: <component_dir>
-        ignored = {'__init__.py', '__pycache__', '.idea', '.vscode', '_postgres', '_common'}
-
-        # Layer 1
-        builtin_components_list = [
-            component_type for component_type
-            in os.listdir(self.config.BUILTIN_COMPONENTS_DIR)
-            if component_type not in ignored
-        ]
-        for component_type in builtin_components_list:
-            component_map[component_type] = self.config.BUILTIN_COMPONENTS_DIR
-
-        # Layer 2 - overrides builtins (if there is a name clash)
-        user_plugins_list = [
-            component_type for component_type
-            in os.listdir(self.config.USER_PLUGINS_DIR)
-            if component_type not in ignored
-        ]
-        for component_type in user_plugins_list:
-            component_map[component_type] = self.config.USER_PLUGINS_DIR
-
-        # Layer 3 - overrides both builtin & user_plugins_list (if there is a name clash)
-        if self.config.LOCAL_PLUGINS_DIR.exists():
-            local_components_list = [
-                component_type for component_type
-                in os.listdir(self.config.LOCAL_PLUGINS_DIR)
-                if component_type not in ignored
-            ]
-            for component_type in local_components_list:
-                component_map[component_type] = self.config.LOCAL_PLUGINS_DIR
-
-        return component_map
+        """The plugin registry is cached (both in-process and on disk) and is only rebuilt when
+        one of the three plugin locations has been modified."""
+        return self.plugin_registry.get_component_map()
 
     def import_plugin_module(self, component_name: str) -> AbstractModuleType:
         plugin_dir = self.component_map.get(component_name)
@@ -6,7 +6,7 @@ from argparse import Namespace
 from pathlib import Path
 from typing import List, Optional, Dict, Any
 
-from electrumsv_sdk.constants import NameSpace
+from electrumsv_sdk.constants import NameSpace, RestartPolicy, DEFAULT_MAX_RESTARTS
 from electrumsv_sdk.sdk_types import SelectedComponent
 
 MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -27,6 +27,27 @@ class ParsedArgs(Namespace):
     component_id: str = ""
     cli_extension_args: Dict[str, Any] = {}
     sdk_home_dir: str = ""
+    history: str = ""
+    action: str = ""
+    restart: str = ""
+    max_restarts: int = 0
+    interval: float = 0.0
+    count: int = 0
+    export: str = ""
+    follow: bool = False
+    since: str = ""
+    level: str = ""
+    type: str = ""
+    until: str = ""
+    logger: str = ""
+    pattern: str = ""
+    counts: bool = False
+    limit: int = 0
+    cgroup: bool = False
+    cpus: str = ""
+    cpu_layout: str = ""
+    supervisor_autostart: str = ""
+    force: bool = False
 
 
 class CLIInputs(object):
@@ -52,7 +73,28 @@ class CLIInputs(object):
             component_id: str = "",
             cli_extension_args: Optional[Dict[str, Any]] = None,
             sdk_home_dir: str = "",
-
+            history_id: str = "",
+            supervisor_action: str = "",
+            restart_policy: str = RestartPolicy.NEVER,
+            max_restarts: int = DEFAULT_MAX_RESTARTS,
+            sample_interval: float = 1.0,
+            sample_count: int = 0,
+            export_path: str = "",
+            follow_flag: bool = False,
+            log_since: str = "",
+            log_level: str = "",
+            logs_action: str = "show",
+            log_until: str = "",
+            log_logger: str = "",
+            log_pattern: str = "",
+            counts_flag: bool = False,
+            log_limit: int = 0,
+            cgroup_flag: bool = False,
+            cpus: str = "",
+            cpu_layout: str = "",
+            instance_count: int = 1,
+            supervisor_autostart: str = "",
+            force_flag: bool = False,
     ):
         # ------------------ CLI INPUT VALUES ------------------ #
         self.namespace = namespace
@@ -69,6 +111,28 @@ class CLIInputs(object):
         self.component_id = component_id
         self.cli_extension_args = cli_extension_args if cli_extension_args else {}
         self.sdk_home_dir = sdk_home_dir
+        self.history_id = history_id
+        self.supervisor_action = supervisor_action
+        self.restart_policy = restart_policy
+        self.max_restarts = max_restarts
+        self.sample_interval = sample_interval
+        self.sample_count = sample_count
+        self.export_path = export_path
+        self.follow_flag = follow_flag
+        self.log_since = log_since
+        self.log_level = log_level
+        self.logs_action = logs_action
+        self.log_until = log_until
+        self.log_logger = log_logger
+        self.log_pattern = log_pattern
+        self.counts_flag = counts_flag
+        self.log_limit = log_limit
+        self.cgroup_flag = cgroup_flag
+        self.cpus = cpus
+        self.cpu_layout = cpu_layout
+        self.instance_count = instance_count
+        self.supervisor_autostart = supervisor_autostart
+        self.force_flag = force_flag
 
 
 class Config:
@@ -142,6 +206,9 @@ class Config:
         if sdk_home_dir:
             config['sdk_home_dir'] = sdk_home_dir
 
+        if cli_inputs.supervisor_autostart:
+            config['supervisor_autostart'] = cli_inputs.supervisor_autostart == "on"
+
         config['is_first_run'] = False
         self.write_to_config_json(config)
 
@@ -165,6 +232,11 @@ class Config:
             if last_dir == current_dir:
                 raise FileNotFoundError("SDK_HOME_DIR not found")
 
+    def is_supervisor_autostart_enabled(self) -> bool:
+        """whether the supervisor daemon is started on demand by the first background component
+        (see: supervisor_client.spawn_supervised_child). Off unless enabled in config.json."""
+        return bool(self.read_config_json().get('supervisor_autostart', False))
+
     def is_portable_mode(self):
         portable_mode = int(os.environ.get("SDK_PORTABLE_MODE", 0))
         if portable_mode == 1:
@@ -26,6 +26,9 @@ class NameSpace:
     NODE = "node"
     STATUS = 'status'
     CONFIG = 'config'
+    SUPERVISOR = 'supervisor'
+    TOP = 'top'
+    LOGS = 'logs'
 
 
 class ComponentOptions:
@@ -60,6 +63,40 @@ class ComponentState(str):
         else:
             raise ValueError(f"ComponentState {component_state_str}, not recognised")
 
+
+class ComponentEvent(str):
+    """Lifecycle events that are appended to the component_events journal. Unlike ComponentState
+    these are never overwritten so they provide the full history of each component."""
+    STARTING = "starting"
+    RUNNING = "running"
+    READY = "ready"
+    STOPPING = "stopping"  # a stop was requested via the SDK (i.e. the exit is expected)
+    STOPPED = "stopped"
+    FAILED = "failed"
+    RESTARTING = "restarting"  # scheduled to be restarted by the supervisor
+
+    @classmethod
+    def from_component_state(cls, component_state: Optional[str]) -> Optional[str]:
+        if component_state == ComponentState.RUNNING:
+            return cls.RUNNING
+        elif component_state == ComponentState.STOPPED:
+            return cls.STOPPED
+        elif component_state == ComponentState.FAILED:
+            return cls.FAILED
+        return None
+
+
+class RestartPolicy(str):
+    """Applies to background components (which are supervised by the supervisor daemon)"""
+    NEVER = "never"
+    ON_FAILURE = "on-failure"  # non-zero exit code
+    ALWAYS = "always"  # any exit that was not requested via the SDK
+
+
+RESTART_POLICIES = [RestartPolicy.NEVER, RestartPolicy.ON_FAILURE, RestartPolicy.ALWAYS]
+DEFAULT_MAX_RESTARTS = 5
+
+
 SUCCESS_EXITCODE = 0
 SIGINT_EXITCODE = 130  # (2 + 128)
 SIGKILL_EXITCODE = 137  # (9 + 128)
@@ -1,18 +1,38 @@
+import concurrent.futures
+import copy
+import json
+import os
 import pprint
 import logging
+import re
 import signal
 import sys
+import threading
+import time
 import typing
-from typing import List, Optional
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set
 
-from .constants import NameSpace
+from .cgroups import read_cgroup_stats
+from .constants import ComponentEvent, NameSpace
 from .config import CLIInputs
 from .components import ComponentStore, ComponentTypedDict
-from .sdk_types import SelectedComponent
-from .utils import cast_str_int_args_to_int, call_any_node_rpc
+from .plugin_tools import PluginTools
+from .readiness import CallableProbe, HttpProbe, ReadinessProbe
+from .resource_monitor import ResourceMonitor, run_top_view
+from .sdk_types import AbstractPlugin, SelectedComponent
+from .supervisor_client import get_supervisor_status, is_supervisor_supported, \
+    start_supervisor, stop_supervisor
+from .node_rpc import NodeRPCError, RPCCall, get_node_rpc_client
+from .utils import cast_str_int_args_to_int, call_any_node_rpc, parse_rpc_call
 
 logger = logging.getLogger("runners")
 
+# how long 'start all' waits for a component to be ready before starting its dependants anyway
+READY_TIMEOUT = float(os.environ.get("SDK_READY_TIMEOUT", 60))
+# how many instances 'start --count' starts at a time
+BATCH_PARALLELISM = int(os.environ.get("SDK_BATCH_PARALLELISM", 4))
+
 if typing.TYPE_CHECKING:
     from .app_state import AppState
 
@@ -32,6 +52,44 @@ class Controller:
         self.component_store = ComponentStore()
         self.component_info: Optional[ComponentTypedDict] = None
 
+    def run(self, cli_inputs: CLIInputs) -> None:
+        """Call relevant entrypoint (for both the cli and the supervisor daemon)"""
+        if cli_inputs.namespace == NameSpace.INSTALL:
+            # -> install() entrypoint of plugin
+            self.install(cli_inputs)
+
+        if cli_inputs.namespace == NameSpace.START:
+            # -> start() -> status_check() entrypoint of plugin
+            self.start(cli_inputs)
+
+        if cli_inputs.namespace == NameSpace.STOP:
+            # -> stop() entrypoint of plugin
+            self.stop(cli_inputs)
+
+        if cli_inputs.namespace == NameSpace.RESET:
+            # -> reset() entrypoint of plugin
+            self.reset(cli_inputs)
+
+        # Special built-in execution pathway (not part of plugin system)
+        if cli_inputs.namespace == NameSpace.NODE:
+            self.node(cli_inputs)
+
+        # Http 'GET' request to status_monitor (which itself is a plugin component of the SDK)
+        if cli_inputs.namespace == NameSpace.STATUS:
+            self.status(cli_inputs)
+
+        # Management of the (optional) long-lived supervisor daemon
+        if cli_inputs.namespace == NameSpace.SUPERVISOR:
+            self.supervisor(cli_inputs)
+
+        # Resource usage of the running components (sampled in-process - it is not forwarded)
+        if cli_inputs.namespace == NameSpace.TOP:
+            self.top(cli_inputs)
+
+        # Interleaved logs of the components (streamed in-process - it is not forwarded)
+        if cli_inputs.namespace == NameSpace.LOGS:
+            self.logs(cli_inputs)
+
     def get_relevant_components(self, selected_component: SelectedComponent) \
             -> List[ComponentTypedDict]:
         relevant_components = []
@@ -57,6 +115,10 @@ class Controller:
                 self.install(new_cli_inputs)
 
     def start(self, cli_inputs: CLIInputs) -> None:
+        if cli_inputs.instance_count > 1:
+            self.start_batch(cli_inputs)
+            return
+
         if cli_inputs.component_id or cli_inputs.selected_component:
             logger.info(f"Starting {cli_inputs.selected_component or cli_inputs.component_id} ...")
             component_module = self.component_store.instantiate_plugin(cli_inputs)
@@ -64,12 +126,174 @@ class Controller:
 
         # no args implies start all (default component ids only - e.g. node1, simple_indexer1 etc.)
         if not cli_inputs.component_id and not cli_inputs.selected_component:
-            for component in self.component_store.component_map:
+            self.start_all(cli_inputs)
+
+    def start_all(self, cli_inputs: CLIInputs) -> None:
+        """Each component is started in its own thread as soon as all of its dependencies (see:
+        manifest.json) are ready. Bringing up the full stack therefore takes as long as the
+        longest dependency chain rather than the sum of all start up times."""
+        plugin_registry = self.component_store.plugin_registry
+        component_types = list(self.component_store.component_map)
+        try:
+            dependency_graph = plugin_registry.get_dependency_graph(component_types)
+        except ValueError as e:
+            logger.error(str(e))
+            sys.exit(1)
+        has_dependants = {dependency for dependencies in dependency_graph.values()
+            for dependency in dependencies}
+        done_events = {component_type: threading.Event() for component_type in component_types}
+        failed_components: Set[str] = set()
+        component_ids: Dict[str, str] = {}
+
+        def start_component(component_type: str) -> None:
+            try:
+                for dependency in dependency_graph[component_type]:
+                    done_events[dependency].wait()
+                    if dependency in failed_components:
+                        logger.error(f"Not starting {component_type} because its dependency: "
+                            f"{dependency} failed to start")
+                        failed_components.add(component_type)
+                        return
+
+                logger.info(f"Starting {component_type} ...")
                 new_cli_inputs = CLIInputs(
-                    selected_component=component,
-                    background_flag=cli_inputs.background_flag
+                    namespace=NameSpace.START,
+                    selected_component=component_type,
+                    background_flag=cli_inputs.background_flag,
+                    cli_extension_args=plugin_registry.get_cli_extension_defaults(
+                        component_type, NameSpace.START),
+                    restart_policy=cli_inputs.restart_policy,
+                    max_restarts=cli_inputs.max_restarts,
+                    cgroup_flag=cli_inputs.cgroup_flag,
+                    cpus=cli_inputs.cpus,
+                    cpu_layout=cli_inputs.cpu_layout,
                 )
-                self.start(new_cli_inputs)
+                start_seq = self.component_store.get_latest_seq()
+                component_module = self.component_store.instantiate_plugin(new_cli_inputs)
+                component_module.start()
+                if component_module.id:
+                    component_ids[component_type] = component_module.id
+
+                # dependants are gated on readiness - otherwise there is no need to wait
+                if component_type in has_dependants and \
+                        not self.wait_until_ready(component_type, component_module, start_seq):
+                    failed_components.add(component_type)
+            except SystemExit:
+                # the plugin has already logged the reason
+                failed_components.add(component_type)
+            except Exception:
+                logger.exception(f"Unexpected exception starting {component_type}")
+                failed_components.add(component_type)
+            finally:
+                done_events[component_type].set()
+
+        t0 = time.time()
+        threads = [threading.Thread(target=start_component, args=(component_type,),
+            name=f"start-{component_type}", daemon=True) for component_type in component_types]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if failed_components:
+            logger.error(f"Failed to start: {sorted(failed_components)}")
+        logger.info(f"Started all components in {time.time() - t0:.1f} seconds")
+
+        # shows which components dominate the start up time
+        times_to_ready: Dict[str, float] = {}
+        components_state = self.component_store.get_status()
+        for component_id in component_ids.values():
+            component_dict = components_state.get(component_id)
+            metadata = component_dict['metadata'] if component_dict else None
+            if metadata and 'time_to_ready' in metadata:
+                times_to_ready[component_id] = metadata['time_to_ready']
+        if times_to_ready:
+            logger.info("Time to ready: " + ", ".join(f"{component_id}={seconds:.1f}s"
+                for component_id, seconds in sorted(times_to_ready.items(),
+                    key=lambda item: item[1], reverse=True)))
+
+    def start_batch(self, cli_inputs: CLIInputs) -> None:
+        """Starts 'instance_count' new instances of one component type (e.g. for multi-node
+        propagation tests). The ids, data directories and ports of all instances are allocated
+        up front in one pass, then the instances are started concurrently (at most
+        BATCH_PARALLELISM at a time). Returns once every instance is ready."""
+        component_type = cli_inputs.selected_component
+        count = cli_inputs.instance_count
+        plugin_tools = PluginTools(self.component_store.instantiate_plugin(cli_inputs), cli_inputs)
+        component_ids = [id for _datadir, id in plugin_tools.allocate_datadirs_and_ids(count)]
+        default_ports = self.component_store.plugin_registry.get_default_ports(component_type)
+        if default_ports:  # otherwise each instance allocates its own ports when it starts
+            plugin_tools.allocate_ports_batch(default_ports, component_ids)
+
+        def start_instance(component_id: str) -> bool:
+            instance_cli_inputs = copy.copy(cli_inputs)
+            instance_cli_inputs.component_id = component_id
+            instance_cli_inputs.new_flag = False  # the data directory was allocated above
+            instance_cli_inputs.instance_count = 1
+            try:
+                logger.info(f"Starting {component_id} ...")
+                start_seq = self.component_store.get_latest_seq()
+                component_module = self.component_store.instantiate_plugin(instance_cli_inputs)
+                component_module.start()
+                return self.wait_until_ready(component_type, component_module, start_seq,
+                    strict=True)
+            except SystemExit:
+                # the plugin has already logged the reason
+                return False
+            except Exception:
+                logger.exception(f"Unexpected exception starting {component_id}")
+                return False
+
+        t0 = time.time()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(count, BATCH_PARALLELISM),
+                thread_name_prefix=f"start-{component_type}") as executor:
+            results = dict(zip(component_ids, executor.map(start_instance, component_ids)))
+
+        failed_ids = [component_id for component_id, is_ready in results.items() if not is_ready]
+        if failed_ids:
+            logger.error(f"Failed to start: {failed_ids}")
+            sys.exit(1)
+        logger.info(f"Started {count} instances of {component_type} ({', '.join(component_ids)}) "
+            f"in {time.time() - t0:.1f} seconds")
+
+    def wait_until_ready(self, component_type: str, component_module: AbstractPlugin,
+            start_seq: int, strict: bool=False) -> bool:
+        """Ready means a 'ready' event was journaled since 'start_seq' (plugins that probe their
+        own readiness have already waited for it) or the status endpoint responds (or the
+        component is merely running if it has no status endpoint). Returns False if the
+        component failed. On timeout a warning is logged and its dependants are started anyway
+        (unless 'strict' in which case it counts as a failure)."""
+        component_id = component_module.id
+        if not component_id:
+            logger.error(f"{component_type} did not start")
+            return False
+
+        def has_event(event: str) -> bool:
+            return any(event_dict['event'] == event for event_dict in
+                self.component_store.get_events(since_seq=start_seq, component_id=component_id))
+
+        if has_event(ComponentEvent.READY):
+            return True
+
+        plugin_tools: Optional[PluginTools] = getattr(component_module, 'plugin_tools', None)
+        if not plugin_tools:
+            return not has_event(ComponentEvent.FAILED)
+
+        if plugin_tools.status_endpoint:
+            probe: ReadinessProbe = HttpProbe(plugin_tools.status_endpoint)
+        else:
+            probe = CallableProbe(lambda: has_event(ComponentEvent.RUNNING), name="running")
+        if plugin_tools.wait_until_ready([probe], deadline=READY_TIMEOUT):
+            return True
+        if has_event(ComponentEvent.FAILED):
+            return False
+        if strict:
+            logger.error(f"{component_id} was not ready after {READY_TIMEOUT} seconds")
+            return False
+
+        logger.warning(f"{component_id} was not ready after {READY_TIMEOUT} seconds - starting "
+            f"its dependants anyway")
+        return True
 
     def stop(self, cli_inputs: CLIInputs) -> None:
         """stop all (no args) does not only stop default component ids but all component ids of
@@ -86,6 +310,7 @@ class Controller:
                 for component_dict in relevant_components:
                     component_name = component_dict.get("component_type", "")
                     new_cli_inputs = CLIInputs(
+                        namespace=NameSpace.STOP,
                         selected_component=component_name,
                         background_flag=cli_inputs.background_flag,
                     )
@@ -96,6 +321,7 @@ class Controller:
         if not cli_inputs.component_id and not cli_inputs.selected_component:
             for component in sorted(self.component_store.component_map.keys(), reverse=True):
                 new_cli_inputs = CLIInputs(
+                    namespace=NameSpace.STOP,
                     selected_component=component,
                     background_flag=cli_inputs.background_flag,
                 )
@@ -113,6 +339,8 @@ class Controller:
                 new_cli_inputs = CLIInputs(
                     selected_component=component,
                     background_flag=cli_inputs.background_flag,
+                    cli_extension_args=self.component_store.plugin_registry
+                        .get_cli_extension_defaults(component, NameSpace.RESET),
                 )
                 self.reset(new_cli_inputs)
             logger.info(f"reset: all")
@@ -131,6 +359,10 @@ class Controller:
         else:
             component_id = parsed_node_options.id
 
+        if parsed_node_options.batch:
+            self.node_batch(parsed_node_options.batch, component_id)
+            return
+
         if len(rpc_args) < 1:
             logger.error("RPC method not indicated. Requires at least one argument")
             exit(1)
@@ -139,7 +371,170 @@ class Controller:
         if result:
             logger.info(result["result"])
 
+    def node_batch(self, source: str, component_id: str) -> None:
+        """Streams the calls from 'source' (a file or '-' for stdin) to the node in batches and
+        the responses (one json line per call) to stdout in the order of the calls"""
+        def read_calls(lines: Iterable[str]) -> Iterator[RPCCall]:
+            for line_number, line in enumerate(lines, start=1):
+                try:
+                    call = parse_rpc_call(line)
+                except ValueError as e:
+                    logger.error(f"{source}: line {line_number}: invalid rpc call: {e}")
+                    sys.exit(1)
+                if call is not None:
+                    yield call
+
+        try:
+            f = sys.stdin if source == "-" else open(source, "r")
+        except OSError as e:
+            logger.error(f"failed to open {source}: {e}")
+            sys.exit(1)
+        try:
+            client = get_node_rpc_client(component_id)
+            for response in client.call_batch(read_calls(f)):
+                sys.stdout.write(json.dumps(response) + "\n")
+            sys.stdout.flush()
+        except NodeRPCError as e:
+            logger.error(str(e))
+            sys.exit(1)
+        except BrokenPipeError:
+            # e.g. piped into 'head' - stdout is redirected so that flushing it on exit succeeds
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
     def status(self, cli_inputs: CLIInputs) -> None:
+        if cli_inputs.history_id:
+            history = self.component_store.get_history(cli_inputs.history_id)
+            pprint.pprint(history, indent=4)
+            return
+
         status = self.component_store.get_status(cli_inputs.selected_component,
             cli_inputs.component_id)
-        pprint.pprint(status, indent=4)
+        # the cpu and memory usage of the components that were started with --cgroup
+        output: Dict[str, Dict[str, object]] = {}
+        for component_id, component_dict in status.items():
+            output[component_id] = dict(component_dict)
+            cgroup_path = (component_dict['metadata'] or {}).get('cgroup')
+            if cgroup_path:
+                output[component_id]['cgroup_stats'] = read_cgroup_stats(Path(cgroup_path))
+        pprint.pprint(output, indent=4)
+
+    def supervisor(self, cli_inputs: CLIInputs) -> None:
+        if not is_supervisor_supported():
+            logger.error("the supervisor is only supported on linux and macos")
+            sys.exit(1)
+
+        if cli_inputs.supervisor_action == "start":
+            if not start_supervisor():
+                sys.exit(1)
+
+        elif cli_inputs.supervisor_action == "stop":
+            if not stop_supervisor(force=cli_inputs.force_flag):
+                sys.exit(1)
+
+        elif cli_inputs.supervisor_action == "status":
+            status = get_supervisor_status()
+            if status is None:
+                logger.info("supervisor is not running")
+            else:
+                pprint.pprint(status, indent=4)
+
+    def top(self, cli_inputs: CLIInputs) -> None:
+        if cli_inputs.sample_interval <= 0:
+            logger.error("--interval must be greater than zero")
+            sys.exit(1)
+
+        monitor = ResourceMonitor(interval=cli_inputs.sample_interval,
+            component_id=cli_inputs.component_id)
+        try:
+            run_top_view(monitor, count=cli_inputs.sample_count or None)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if cli_inputs.export_path:
+                monitor.export_json(cli_inputs.export_path)
+                logger.info(f"exported {sum(len(series) for series in monitor.series.values())} "
+                    f"samples to: {cli_inputs.export_path}")
+
+    def logs(self, cli_inputs: CLIInputs) -> None:
+        if cli_inputs.logs_action == "search":
+            self.search_logs(cli_inputs)
+            return
+
+        # only imported for this command (see: contrib/check_import_time.py)
+        from .log_streaming import LogStreamer, find_log_sources, parse_level_name, parse_since
+
+        try:
+            since = parse_since(cli_inputs.log_since) if cli_inputs.log_since else None
+            min_level = parse_level_name(cli_inputs.log_level) if cli_inputs.log_level else None
+        except ValueError as e:
+            logger.error(str(e))
+            sys.exit(1)
+
+        logs_dir = self.app_state.config.LOGS_DIR
+        assert logs_dir is not None  # typing bug
+        component_ids = set(filter(None, cli_inputs.component_id.split(","))) or None
+        component_types = set(filter(None, cli_inputs.selected_component.split(","))) or None
+        sources = find_log_sources(logs_dir, component_ids, component_types)
+        if not sources and not cli_inputs.follow_flag:
+            logger.info(f"no component logs found in: {logs_dir}")
+            return
+
+        colour = sys.stdout.isatty()
+        if colour and sys.platform == 'win32':
+            import colorama
+            colorama.init()
+        streamer = LogStreamer(sources, min_level=min_level, colour=colour, logs_dir=logs_dir,
+            component_ids=component_ids, component_types=component_types)
+        try:
+            streamer.show_backlog(since)
+            if cli_inputs.follow_flag:
+                streamer.follow()
+        except KeyboardInterrupt:
+            pass
+
+    def search_logs(self, cli_inputs: CLIInputs) -> None:
+        # only imported for this command (see: contrib/check_import_time.py)
+        from .log_index import INDEX_FILENAME, LogIndex, format_counts, format_records
+        from .log_streaming import parse_level_name, parse_since
+
+        if cli_inputs.follow_flag:
+            logger.error("--follow cannot be used with 'logs search'")
+            sys.exit(1)
+        try:
+            since = parse_since(cli_inputs.log_since) if cli_inputs.log_since else None
+            until = parse_since(cli_inputs.log_until) if cli_inputs.log_until else None
+            min_level = parse_level_name(cli_inputs.log_level or "error")
+            pattern = re.compile(cli_inputs.log_pattern) if cli_inputs.log_pattern else None
+        except (ValueError, re.error) as e:
+            logger.error(str(e))
+            sys.exit(1)
+
+        config = self.app_state.config
+        assert config.LOGS_DIR is not None and config.SDK_HOME_DIR is not None  # typing bug
+        log_index = LogIndex(config.LOGS_DIR, config.SDK_HOME_DIR / INDEX_FILENAME)
+        try:
+            t0 = time.time()
+            bytes_read = log_index.update()
+            logger.debug(f"indexed {bytes_read} bytes of logs in {time.time() - t0:.3f} seconds")
+
+            component_ids = set(filter(None, cli_inputs.component_id.split(","))) or None
+            component_types = set(filter(None, cli_inputs.selected_component.split(","))) or None
+            if cli_inputs.counts_flag:
+                files = log_index.get_files(since, until, component_ids, component_types)
+                print(format_counts(log_index.get_counts(files)))
+                return
+
+            records = log_index.search(since, until, min_level, component_ids, component_types,
+                cli_inputs.log_logger or None, pattern)
+            for line in format_records(records, cli_inputs.log_limit or None):
+                print(line)
+        except KeyboardInterrupt:
+            pass
+        except BrokenPipeError:
+            # e.g. piped into 'head' - stdout is redirected so that flushing it on exit succeeds
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        finally:
+            log_index.close()
@@ -0,0 +1,150 @@
+"""
+CPU affinity for components (see: `start --cpus=<list>` and `start --cpu-layout=auto`).
+
+A component's process tree is pinned to a set of cpus so that its threads do not migrate across
+cores (which makes latency measurements noisy). The affinity of the spawning thread is set to the
+cpu set for the duration of the spawn - it is inherited by the spawned process and everything
+that it spawns in turn, so there is no window in which the component runs unpinned. On linux the
+affinity set via sched_setaffinity(0, ...) is per-thread so other threads (e.g. other components
+that are being started concurrently) are unaffected.
+
+With the 'auto' layout each component gets the least used cpus out of those available to the
+SDK, taking the cpus of the other running components (from their metadata) into account and
+preferring cpus whose hyperthread siblings are unused too. The number of cpus a component type
+needs can be declared with "cpu_affinity" in the plugin's manifest.json (e.g. {"cores": 2}),
+which can also pin it to a fixed set (e.g. {"cpus": "2-3"}).
+"""
+import contextlib
+import logging
+import os
+from pathlib import Path
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Set, TypedDict
+
+logger = logging.getLogger("cpu-affinity")
+
+CPU_LAYOUT_AUTO = "auto"
+CPU_LAYOUT_MANUAL = "manual"
+CPU_LAYOUTS = [CPU_LAYOUT_AUTO]
+
+CPU_TOPOLOGY_DIR = Path("/sys/devices/system/cpu")
+
+# cpus chosen by this process for components that have not been recorded as running yet (e.g.
+# while start_all starts several components concurrently) {component_id: cpus}
+_reserved_cpus: Dict[str, List[int]] = {}
+_reserved_cpus_lock = threading.Lock()
+
+
+class CpuAffinityTypedDict(TypedDict, total=False):
+    cpus: str  # a fixed cpu list e.g. "0-3,6"
+    cores: int  # the number of cpus for the 'auto' layout (default: 1)
+
+
+def is_cpu_affinity_supported() -> bool:
+    return hasattr(os, "sched_setaffinity")
+
+
+def get_available_cpus() -> List[int]:
+    return sorted(os.sched_getaffinity(0))
+
+
+def parse_cpu_list(value: str) -> List[int]:
+    """e.g. '0-3,6' -> [0, 1, 2, 3, 6] (the format of taskset -c and /sys/devices/system/cpu)"""
+    cpus: Set[int] = set()
+    try:
+        for part in filter(None, (part.strip() for part in value.split(","))):
+            if "-" in part:
+                first, last = part.split("-", 1)
+                if int(first) > int(last):
+                    raise ValueError
+                cpus.update(range(int(first), int(last) + 1))
+            else:
+                cpus.add(int(part))
+    except ValueError:
+        raise ValueError(f"invalid cpu list: '{value}' (expected e.g. '0-3,6')") from None
+    if not cpus or min(cpus) < 0:
+        raise ValueError(f"invalid cpu list: '{value}' (expected e.g. '0-3,6')")
+    return sorted(cpus)
+
+
+def format_cpu_list(cpus: Iterable[int]) -> str:
+    """e.g. [0, 1, 2, 3, 6] -> '0-3,6'"""
+    ranges: List[List[int]] = []
+    for cpu in sorted(set(cpus)):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+def validate_cpus(cpus: List[int]) -> List[int]:
+    available = get_available_cpus()
+    unavailable = [cpu for cpu in cpus if cpu not in available]
+    if unavailable:
+        raise ValueError(f"cpus {format_cpu_list(unavailable)} are not available (available: "
+            f"{format_cpu_list(available)})")
+    return cpus
+
+
+def get_thread_siblings(cpu: int) -> List[int]:
+    """the hyperthreads that share a physical core with 'cpu' (including itself)"""
+    try:
+        with open(CPU_TOPOLOGY_DIR / f"cpu{cpu}" / "topology" / "thread_siblings_list") as f:
+            return parse_cpu_list(f.read().strip())
+    except (OSError, ValueError):
+        return [cpu]
+
+
+def choose_cpus(cores: int, used_cpus: Iterable[Iterable[int]],
+        available: Optional[List[int]]=None) -> List[int]:
+    """the 'cores' least used of the available cpus (the cpus of each running component count as
+    used once and a busy hyperthread sibling counts as half a use)"""
+    available = available if available is not None else get_available_cpus()
+    usage: Dict[int, int] = {cpu: 0 for cpu in available}
+    for cpus in used_cpus:
+        for cpu in cpus:
+            if cpu in usage:
+                usage[cpu] += 1
+    siblings = {cpu: [sibling for sibling in get_thread_siblings(cpu)
+        if sibling != cpu and sibling in usage] for cpu in available}
+
+    chosen: List[int] = []
+    for _ in range(min(cores, len(available))):
+        def rank(cpu: int) -> float:
+            sibling_usage = sum(usage[sibling] + (sibling in chosen) for sibling in siblings[cpu])
+            return usage[cpu] * 2 + sibling_usage
+        cpu = min((cpu for cpu in available if cpu not in chosen),
+            key=lambda cpu: (rank(cpu), cpu))
+        chosen.append(cpu)
+    return sorted(chosen)
+
+
+def reserve_cpus(component_id: str, cores: int, running_cpus: Dict[str, List[int]]) -> List[int]:
+    """chooses the cpus for a component with the 'auto' layout. 'running_cpus' are those of the
+    other components that are running {component_id: cpus}"""
+    with _reserved_cpus_lock:
+        used = {**running_cpus, **_reserved_cpus}
+        used.pop(component_id, None)  # it is being restarted
+        cpus = choose_cpus(cores, used.values())
+        _reserved_cpus[component_id] = cpus
+        return cpus
+
+
+def release_cpus(component_id: str) -> None:
+    with _reserved_cpus_lock:
+        _reserved_cpus.pop(component_id, None)
+
+
+@contextlib.contextmanager
+def pinned_to(cpus: Optional[List[int]]) -> Iterator[None]:
+    """processes spawned by the calling thread within this context inherit the affinity"""
+    if not cpus or not is_cpu_affinity_supported():
+        yield
+        return
+    saved_cpus = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, cpus)
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(0, saved_cpus)
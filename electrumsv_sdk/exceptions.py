@@ -1,2 +1,13 @@
+from typing import List
+
+
 class UnsupportedPlatform(Exception):
     pass
+
+
+class CommandFailedError(Exception):
+    """a command that was executed by the supervisor daemon on behalf of `commands` failed"""
+
+    def __init__(self, arguments: List[str], exit_code: int) -> None:
+        super().__init__(f"'{' '.join(arguments[1:])}' failed with exit code {exit_code}")
+        self.exit_code = exit_code
@@ -0,0 +1,420 @@
+"""
+Index of the logs in LOGS_DIR (see: `electrumsv-sdk logs search`).
+
+The index is kept in log_index.sqlite in the SDK home directory and is brought up to date
+incrementally before every search - only the lines that were appended since the previous search
+are read (rotated and compressed segments are indexed once, see: log_rotation.py). For each file
+it records:
+
+- the time range of its lines
+- a checkpoint (timestamp and byte offset) every CHECKPOINT_INTERVAL bytes
+- the byte offset of every line at or above INDEXED_LEVEL (i.e. warnings and errors)
+- the number of lines per level and logger name
+
+A search for warnings or errors in a time window only reads the matching lines (seeking directly
+to their offsets) of the files whose time range overlaps the window. A search for lower levels
+scans each of these files from the last checkpoint before the window until the end of the window.
+
+A record is a line that starts with a timestamp along with the lines that follow it without one
+(e.g. a traceback). Both the logs of the components (LOGS_DIR/<type>/<id>/) and the logfiles
+directly in LOGS_DIR/<name>/ (e.g. logs/sdk/sdk.log and logs/supervisor/supervisor.log) are
+indexed.
+"""
+import gzip
+import heapq
+import io
+import logging
+import os
+from pathlib import Path
+import re
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Pattern, Set, Tuple, TypedDict
+
+from .log_streaming import LEVEL_REGEX, LEVELS, TIMESTAMP_REGEX, get_log_files, parse_timestamp
+
+logger = logging.getLogger("log-index")
+
+INDEX_FILENAME = "log_index.sqlite"
+CHECKPOINT_INTERVAL = 64 * 1024
+INDEXED_LEVEL = logging.WARNING
+# only the start of a line is parsed for its timestamp, level and logger name
+HEADER_SIZE = 200
+MAX_RECORD_LINES = 200
+
+# the first word after the level e.g. "2022-05-12 10:00:00 ERROR    supervisor     message" or
+# "2022-05-12 10:00:00,123 ERROR [app_state] message"
+LOGGER_NAME_REGEX = re.compile(r"\s+\[?([A-Za-z_][\w.\-]*)\]?:?(?:\s|$)")
+
+
+class LogFileTypedDict(TypedDict):
+    path: str
+    component_type: str
+    component_id: str
+    first_timestamp: Optional[float]
+    last_timestamp: Optional[float]
+
+
+class LogRecordTypedDict(TypedDict):
+    timestamp: float
+    level: int  # logging.NOTSET if the line has no level
+    logger_name: str
+    component_type: str
+    component_id: str
+    path: str
+    offset: int
+    lines: List[str]
+
+
+class LogCountTypedDict(TypedDict):
+    component_id: str
+    level: int
+    logger_name: str
+    count: int
+
+
+class HeaderParser:
+    """Consecutive lines are usually logged within the same second so the timestamp of the
+    previous line (without its fraction of a second) is reused - parsing the date and time is
+    most of the cost of indexing a line."""
+
+    def __init__(self) -> None:
+        self.last_key = ""
+        self.last_timestamp = 0.0
+
+    def parse(self, raw_line: bytes) -> Optional[Tuple[float, int, str]]:
+        """(timestamp, level, logger name) or None if the line does not start a new record"""
+        text = raw_line[:HEADER_SIZE].decode('utf-8', errors='replace')
+        match = TIMESTAMP_REGEX.search(text, 0, 64)
+        if match is None:
+            return None
+        key = text[match.start():match.end(6)] + (match.group(8) or "")
+        if key != self.last_key:
+            timestamp = parse_timestamp(key)
+            if timestamp is None:
+                return None
+            self.last_key, self.last_timestamp = key, timestamp
+        fraction = match.group(7)
+        timestamp = self.last_timestamp + (int(fraction) / 10 ** len(fraction) if fraction
+            else 0.0)
+
+        level_match = LEVEL_REGEX.search(text, match.end(), 160)
+        if level_match is None:
+            return timestamp, logging.NOTSET, ""
+        logger_match = LOGGER_NAME_REGEX.match(text, level_match.end())
+        return timestamp, LEVELS[level_match.group(1)], \
+            logger_match.group(1) if logger_match else ""
+
+
+def open_log_file(path: Path) -> io.BufferedIOBase:
+    """the offsets of compressed segments are offsets into the decompressed data"""
+    if path.name.endswith(".gz"):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def decode_line(raw_line: bytes) -> str:
+    return raw_line.rstrip(b"\r\n").decode('utf-8', errors='replace')
+
+
+class LogIndex:
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS log_files (
+            path TEXT PRIMARY KEY,
+            component_type TEXT NOT NULL,
+            component_id TEXT NOT NULL,
+            inode INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            indexed_offset INTEGER NOT NULL,
+            next_checkpoint INTEGER NOT NULL,
+            first_timestamp REAL,
+            last_timestamp REAL
+        )""",
+        """CREATE TABLE IF NOT EXISTS log_checkpoints (
+            path TEXT NOT NULL,
+            timestamp REAL NOT NULL,
+            offset INTEGER NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_log_checkpoints_path ON log_checkpoints (path, offset)",
+        # the lines at or above INDEXED_LEVEL
+        """CREATE TABLE IF NOT EXISTS log_entries (
+            path TEXT NOT NULL,
+            timestamp REAL NOT NULL,
+            level INTEGER NOT NULL,
+            logger_name TEXT NOT NULL,
+            offset INTEGER NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_log_entries_path ON log_entries (path, offset)",
+        """CREATE TABLE IF NOT EXISTS log_counts (
+            path TEXT NOT NULL,
+            level INTEGER NOT NULL,
+            logger_name TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (path, level, logger_name)
+        )""",
+    ]
+    TABLES = ("log_files", "log_checkpoints", "log_entries", "log_counts")
+
+    def __init__(self, logs_dir: Path, index_path: Path) -> None:
+        self.logs_dir = logs_dir
+        self.index_path = index_path
+        self.db = sqlite3.connect(str(index_path), timeout=5)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        for statement in self.SCHEMA:
+            self.db.execute(statement)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def find_log_files(self) -> List[Tuple[Path, str, str]]:
+        """(path, component_type, component_id) of every logfile in LOGS_DIR"""
+        log_files: List[Tuple[Path, str, str]] = []
+        try:
+            type_directories = sorted(path for path in self.logs_dir.iterdir() if path.is_dir())
+        except FileNotFoundError:
+            return []
+        for type_directory in type_directories:
+            name = type_directory.name
+            # e.g. logs/sdk/sdk.log
+            log_files.extend((path, name, name) for path in get_log_files(type_directory))
+            for id_directory in sorted(path for path in type_directory.iterdir()
+                    if path.is_dir()):
+                log_files.extend((path, name, id_directory.name)
+                    for path in get_log_files(id_directory))
+        return log_files
+
+    def update(self) -> int:
+        """indexes everything that was written since the previous update and forgets the files
+        that no longer exist. Returns the number of bytes that were read."""
+        known: Dict[str, Tuple[int, int, int]] = {path: (inode, size, indexed_offset)
+            for path, inode, size, indexed_offset
+            in self.db.execute("SELECT path, inode, size, indexed_offset FROM log_files")}
+        bytes_read = 0
+        seen: Set[str] = set()
+        for path, component_type, component_id in self.find_log_files():
+            key = str(path)
+            seen.add(key)
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            start = 0
+            if key in known:
+                inode, size, indexed_offset = known[key]
+                if inode == stat.st_ino and size == stat.st_size:
+                    continue  # unchanged
+                if inode == stat.st_ino and stat.st_size > size and \
+                        not path.name.endswith(".gz"):
+                    start = indexed_offset  # appended to
+                else:
+                    self.remove(key)  # replaced (e.g. rotated) or truncated
+            bytes_read += self.index_file(path, component_type, component_id, stat, start)
+
+        for key in set(known) - seen:
+            self.remove(key)
+        return bytes_read
+
+    def remove(self, key: str) -> None:
+        with self.db:
+            for table in self.TABLES:
+                self.db.execute(f"DELETE FROM {table} WHERE path=?", (key,))
+
+    def index_file(self, path: Path, component_type: str, component_id: str,
+            stat: os.stat_result, start: int) -> int:
+        key = str(path)
+        first_timestamp: Optional[float] = None
+        last_timestamp: Optional[float] = None
+        next_checkpoint = 0
+        if start:
+            first_timestamp, last_timestamp, next_checkpoint = self.db.execute(
+                "SELECT first_timestamp, last_timestamp, next_checkpoint FROM log_files "
+                "WHERE path=?", (key,)).fetchone()
+
+        checkpoints: List[Tuple[str, float, int]] = []
+        entries: List[Tuple[str, float, int, str, int]] = []
+        counts: Dict[Tuple[int, str], int] = {}
+        offset = start
+        header_parser = HeaderParser()
+        try:
+            with open_log_file(path) as f:
+                f.seek(start)
+                for raw_line in iter(f.readline, b""):
+                    if not raw_line.endswith(b"\n"):
+                        break  # it is still being written (it is indexed by the next update)
+                    line_offset = offset
+                    offset += len(raw_line)
+                    header = header_parser.parse(raw_line)
+                    if header is None:
+                        continue
+                    timestamp, level, logger_name = header
+                    if first_timestamp is None:
+                        first_timestamp = timestamp
+                    last_timestamp = max(last_timestamp or timestamp, timestamp)
+                    counts[(level, logger_name)] = counts.get((level, logger_name), 0) + 1
+                    if line_offset >= next_checkpoint:
+                        checkpoints.append((key, timestamp, line_offset))
+                        next_checkpoint = line_offset + CHECKPOINT_INTERVAL
+                    if level >= INDEXED_LEVEL:
+                        entries.append((key, timestamp, level, logger_name, line_offset))
+        except (OSError, EOFError) as e:
+            # e.g. removed by the retention policy or a segment that is still being compressed
+            logger.debug(f"failed to index {path}: {e}")
+            return 0
+
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO log_files (path, component_type, "
+                "component_id, inode, size, indexed_offset, next_checkpoint, first_timestamp, "
+                "last_timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (key, component_type,
+                component_id, stat.st_ino, stat.st_size, offset, next_checkpoint,
+                first_timestamp, last_timestamp))
+            self.db.executemany("INSERT INTO log_checkpoints (path, timestamp, offset) "
+                "VALUES (?, ?, ?)", checkpoints)
+            self.db.executemany("INSERT INTO log_entries (path, timestamp, level, logger_name, "
+                "offset) VALUES (?, ?, ?, ?, ?)", entries)
+            self.db.executemany("INSERT INTO log_counts (path, level, logger_name, count) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT (path, level, logger_name) "
+                "DO UPDATE SET count=count + excluded.count",
+                [(key, level, logger_name, count)
+                    for (level, logger_name), count in counts.items()])
+        return offset - start
+
+    def get_files(self, since: Optional[float]=None, until: Optional[float]=None,
+            component_ids: Optional[Set[str]]=None,
+            component_types: Optional[Set[str]]=None) -> List[LogFileTypedDict]:
+        """the indexed files with lines in the time window"""
+        files: List[LogFileTypedDict] = []
+        for row in self.db.execute("SELECT path, component_type, component_id, first_timestamp, "
+                "last_timestamp FROM log_files WHERE first_timestamp IS NOT NULL "
+                "AND last_timestamp >= ? AND first_timestamp <= ? ORDER BY first_timestamp",
+                (since if since is not None else float("-inf"),
+                until if until is not None else float("inf"))):
+            log_file = LogFileTypedDict(path=row[0], component_type=row[1], component_id=row[2],
+                first_timestamp=row[3], last_timestamp=row[4])
+            if component_ids and log_file['component_id'] not in component_ids:
+                continue
+            if component_types and log_file['component_type'] not in component_types:
+                continue
+            files.append(log_file)
+        return files
+
+    def get_counts(self, files: List[LogFileTypedDict]) -> List[LogCountTypedDict]:
+        """lines per component id, level and logger name (of the whole of each file)"""
+        totals: Dict[Tuple[str, int, str], int] = {}
+        for log_file in files:
+            for level, logger_name, count in self.db.execute("SELECT level, logger_name, count "
+                    "FROM log_counts WHERE path=?", (log_file['path'],)):
+                key = (log_file['component_id'], level, logger_name)
+                totals[key] = totals.get(key, 0) + count
+        return [LogCountTypedDict(component_id=component_id, level=level,
+            logger_name=logger_name, count=count) for (component_id, level, logger_name), count
+            in sorted(totals.items(), key=lambda item: (item[0][0], -item[0][1], -item[1]))]
+
+    def search(self, since: Optional[float]=None, until: Optional[float]=None,
+            min_level: int=logging.ERROR, component_ids: Optional[Set[str]]=None,
+            component_types: Optional[Set[str]]=None, logger_name: Optional[str]=None,
+            pattern: Optional[Pattern[str]]=None) -> Iterator[LogRecordTypedDict]:
+        """the matching records of all of the files in timestamp order ('pattern' is matched
+        against every line of a record)"""
+        files = self.get_files(since, until, component_ids, component_types)
+        if min_level >= INDEXED_LEVEL:
+            iterators = [self._search_entries(log_file, since, until, min_level, logger_name)
+                for log_file in files]
+        else:
+            iterators = [self._scan_file(log_file, since, until) for log_file in files]
+
+        for record in heapq.merge(*iterators, key=lambda record: record['timestamp']):
+            if record['level'] < min_level:
+                continue
+            if logger_name is not None and record['logger_name'] != logger_name:
+                continue
+            if pattern is not None and not any(pattern.search(line) for line in record['lines']):
+                continue
+            yield record
+
+    def _search_entries(self, log_file: LogFileTypedDict, since: Optional[float],
+            until: Optional[float], min_level: int, logger_name: Optional[str]) \
+            -> Iterator[LogRecordTypedDict]:
+        query = "SELECT offset FROM log_entries WHERE path=? AND level>=? AND timestamp>=? " \
+            "AND timestamp<=?"
+        params: List[object] = [log_file['path'], min_level,
+            since if since is not None else float("-inf"),
+            until if until is not None else float("inf")]
+        if logger_name is not None:
+            query += " AND logger_name=?"
+            params.append(logger_name)
+        # in file order so that compressed files are only ever read forwards
+        offsets = [row[0] for row in self.db.execute(query + " ORDER BY offset", params)]
+        if not offsets:
+            return
+        try:
+            with open_log_file(Path(log_file['path'])) as f:
+                for offset in offsets:
+                    f.seek(offset)
+                    for record in self._read_records(f, log_file, offset):
+                        yield record
+                        break
+        except (OSError, EOFError) as e:
+            logger.debug(f"failed to read {log_file['path']}: {e}")
+
+    def _scan_file(self, log_file: LogFileTypedDict, since: Optional[float],
+            until: Optional[float]) -> Iterator[LogRecordTypedDict]:
+        start = 0
+        if since is not None:
+            row = self.db.execute("SELECT MAX(offset) FROM log_checkpoints WHERE path=? "
+                "AND timestamp<?", (log_file['path'], since)).fetchone()
+            start = row[0] if row[0] is not None else 0
+        try:
+            with open_log_file(Path(log_file['path'])) as f:
+                f.seek(start)
+                for record in self._read_records(f, log_file, start):
+                    if until is not None and record['timestamp'] > until:
+                        break
+                    if since is None or record['timestamp'] >= since:
+                        yield record
+        except (OSError, EOFError) as e:
+            logger.debug(f"failed to read {log_file['path']}: {e}")
+
+    def _read_records(self, f: io.BufferedIOBase, log_file: LogFileTypedDict, offset: int) \
+            -> Iterator[LogRecordTypedDict]:
+        """the records from 'offset' onwards (lines before the first timestamp are skipped)"""
+        record: Optional[LogRecordTypedDict] = None
+        header_parser = HeaderParser()
+        for raw_line in iter(f.readline, b""):
+            if not raw_line.endswith(b"\n"):
+                break
+            line_offset = offset
+            offset += len(raw_line)
+            header = header_parser.parse(raw_line)
+            if header is None:
+                if record is not None and len(record['lines']) < MAX_RECORD_LINES:
+                    record['lines'].append(decode_line(raw_line))
+                continue
+            if record is not None:
+                yield record
+            timestamp, level, logger_name = header
+            record = LogRecordTypedDict(timestamp=timestamp, level=level,
+                logger_name=logger_name, component_type=log_file['component_type'],
+                component_id=log_file['component_id'], path=log_file['path'],
+                offset=line_offset, lines=[decode_line(raw_line)])
+        if record is not None:
+            yield record
+
+
+def format_records(records: Iterator[LogRecordTypedDict], limit: Optional[int]=None) \
+        -> Iterator[str]:
+    """'<component id> | <line>' for every line of the records"""
+    for index, record in enumerate(records):
+        if limit is not None and index >= limit:
+            break
+        for line in record['lines']:
+            yield f"{record['component_id']:<16} | {line}"
+
+
+def format_counts(counts: List[LogCountTypedDict]) -> str:
+    lines = [f"{'ID':<24}{'LEVEL':<10}{'LOGGER':<32}{'COUNT':>10}"]
+    for count in counts:
+        level_name = logging.getLevelName(count['level']) if count['level'] else "-"
+        lines.append(f"{count['component_id']:<24}{level_name:<10}"
+            f"{count['logger_name'] or '-':<32}{count['count']:>10}")
+    return os.linesep.join(lines)
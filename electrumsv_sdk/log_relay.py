@@ -0,0 +1,86 @@
+"""
+Keeps writing the output of background components to their logfiles once the supervisor has
+stopped (see: SupervisorServer.hand_over_output).
+
+The supervisor reads the output of each background component from a pipe. If the read end of
+the pipe were simply closed when the supervisor stops, the next write of the component would
+fail with EPIPE (or kill it with SIGPIPE). Instead the supervisor passes the read ends to this
+detached process which drains them (with the same log rotation) until every component - and any
+process that inherited its output - has exited.
+
+Usage (by the supervisor only):
+    python3 -m electrumsv_sdk.log_relay '[{"fd": 5, "logfile": "...", "policy": {...}}, ...]'
+"""
+import concurrent.futures
+import json
+import logging
+import os
+from pathlib import Path
+import selectors
+import sys
+from typing import List, TypedDict
+
+from .constants import LOG_LEVEL
+from .log_rotation import LogRotationPolicyTypedDict, RotatingLogWriter
+
+logger = logging.getLogger("log-relay")
+
+LOG_FORMAT = '%(asctime)s %(levelname)-8s %(name)-24s %(message)s'
+LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+OUTPUT_READ_SIZE = 65536
+
+
+class RelayedOutputTypedDict(TypedDict):
+    component_id: str
+    fd: int  # the read end of the component's stdout pipe (inherited from the supervisor)
+    logfile: str
+    policy: LogRotationPolicyTypedDict
+
+
+def relay_output(outputs: List[RelayedOutputTypedDict]) -> None:
+    """returns once every pipe is closed by the processes that write to it"""
+    selector = selectors.DefaultSelector()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1,
+            thread_name_prefix="log-compression") as executor:
+        for output in outputs:
+            os.set_blocking(output['fd'], False)
+            log_writer = RotatingLogWriter(Path(output['logfile']), output['policy'], executor,
+                append=True)
+            selector.register(output['fd'], selectors.EVENT_READ, (output, log_writer))
+
+        while selector.get_map():
+            for key, _events in selector.select():
+                output, log_writer = key.data
+                try:
+                    data = os.read(output['fd'], OUTPUT_READ_SIZE)
+                except BlockingIOError:
+                    continue
+                except OSError as e:
+                    logger.error(f"failed to read the output of {output['component_id']}: {e}")
+                    data = b""
+                if data:
+                    try:
+                        log_writer.write(data)
+                    except OSError as e:
+                        logger.error(f"failed to write the logfile of "
+                            f"{output['component_id']}: {e}")
+                    continue
+                selector.unregister(output['fd'])
+                os.close(output['fd'])
+                log_writer.close()
+                logger.debug(f"the output of {output['component_id']} was closed")
+    selector.close()
+
+
+def main() -> None:
+    logging.basicConfig(format=LOG_FORMAT, level=LOG_LEVEL, datefmt=LOG_DATE_FORMAT)
+    outputs: List[RelayedOutputTypedDict] = json.loads(sys.argv[1])
+    logger.info(f"relaying the output of: {sorted(output['component_id'] for output in outputs)} "
+        f"(pid: {os.getpid()})")
+    relay_output(outputs)
+    logger.info("log relay stopped")
+
+
+if __name__ == "__main__":
+    main()
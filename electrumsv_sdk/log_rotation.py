@@ -0,0 +1,205 @@
+"""
+Size and time based rotation of the logs of background components (see: supervisor.py).
+
+The supervisor reads the output of each background component from a pipe (on its event loop) and
+writes it to the component's logfile via a RotatingLogWriter. Once the logfile exceeds 'max_bytes'
+or is older than 'rotate_interval' seconds it is renamed to a numbered segment (e.g.
+'17_10_2026_9_30_0.3.log') and a new logfile is opened under the original name. Renaming is the
+only work done on the event loop - the segment is compressed with gzip and the retention policy
+is applied in a worker thread so that the component's stdout pipe keeps being drained.
+
+The retention policy is applied per component log directory (LOGS_DIR/<type>/<id>/): only the
+newest 'keep_files' files (logfiles of previous runs and rotated segments) are kept and anything
+older than 'retention_days' is removed. The logfile that is being written to is never removed.
+
+The defaults can be overridden per component type with a "log_rotation" object in the plugin's
+manifest.json (see: plugin_registry.py).
+"""
+import concurrent.futures
+import gzip
+import logging
+import os
+from pathlib import Path
+import re
+import shutil
+import time
+from typing import Callable, Iterable, Optional, TypedDict
+
+logger = logging.getLogger("log-rotation")
+
+
+class LogRotationPolicyTypedDict(TypedDict, total=False):
+    max_bytes: int  # 0 disables size based rotation
+    rotate_interval: float  # seconds (0 disables time based rotation)
+    compress: bool
+    keep_files: int  # per component id (0 keeps all)
+    retention_days: float  # 0 keeps files of any age
+
+
+DEFAULT_LOG_ROTATION_POLICY = LogRotationPolicyTypedDict(
+    max_bytes=50 * 1024 * 1024,
+    rotate_interval=24 * 3600,
+    compress=True,
+    keep_files=20,
+    retention_days=7,
+)
+
+SEGMENT_REGEX_TEMPLATE = r"^{stem}\.(\d+){suffix}(?:\.gz)?$"
+# the logfiles of the components are named after the time that they were started with
+# underscores (see: PluginTools.get_logfile_path) so a numbered name is always a segment
+ANY_SEGMENT_REGEX = re.compile(r"\.\d+\.[^.]+(?:\.gz)?$")
+
+
+def get_log_rotation_policy(overrides: Optional[LogRotationPolicyTypedDict]=None) \
+        -> LogRotationPolicyTypedDict:
+    policy = LogRotationPolicyTypedDict(**DEFAULT_LOG_ROTATION_POLICY)
+    if overrides:
+        policy.update(overrides)
+    return policy
+
+
+def is_rotated_segment(path: Path) -> bool:
+    return ANY_SEGMENT_REGEX.search(path.name) is not None
+
+
+def compress_segment(segment_path: Path) -> Optional[Path]:
+    """gzips the segment (keeping its mtime so that the logs still sort chronologically)"""
+    compressed_path = segment_path.with_name(segment_path.name + ".gz")
+    temp_path = segment_path.with_name(segment_path.name + ".gz.tmp")
+    try:
+        stat = segment_path.stat()
+        with open(segment_path, 'rb') as f_in, gzip.open(temp_path, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        os.utime(temp_path, (stat.st_atime, stat.st_mtime))
+        os.replace(temp_path, compressed_path)
+        os.remove(segment_path)
+    except OSError as e:
+        logger.error(f"failed to compress {segment_path}: {e}")
+        if temp_path.exists():
+            temp_path.unlink()
+        return None
+    return compressed_path
+
+
+def apply_retention(directory: Path, policy: LogRotationPolicyTypedDict,
+        active_paths: Iterable[Path]=()) -> int:
+    """removes the oldest logs in 'directory' - returns the number of files removed"""
+    keep_files = policy.get('keep_files', 0)
+    retention_days = policy.get('retention_days', 0)
+    active = {Path(path) for path in active_paths}
+    try:
+        entries = [(path, path.stat().st_mtime) for path in directory.iterdir()
+            if path.is_file() and not path.name.endswith(".tmp")]
+    except FileNotFoundError:
+        return 0
+    entries.sort(key=lambda entry: entry[1], reverse=True)  # newest first
+
+    cutoff = time.time() - retention_days * 86400 if retention_days else None
+    removed = 0
+    for index, (path, mtime) in enumerate(entries):
+        if path in active:
+            continue
+        if (keep_files and index >= keep_files) or (cutoff is not None and mtime < cutoff):
+            try:
+                path.unlink()
+                removed += 1
+            except OSError as e:
+                logger.error(f"failed to remove {path}: {e}")
+    if removed:
+        logger.debug(f"removed {removed} old log files from: {directory}")
+    return removed
+
+
+class RotatingLogWriter:
+    """Must only be used from one thread (the supervisor's event loop). 'executor' runs the
+    compression and retention - without one they run inline."""
+
+    def __init__(self, path: Path, policy: LogRotationPolicyTypedDict,
+            executor: Optional[concurrent.futures.Executor]=None, append: bool=False) -> None:
+        self.path = path
+        self.policy = policy
+        self.executor = executor
+        self.file = open(path, 'ab' if append else 'wb')
+        self.size = self.file.tell()
+        self.opened_at = time.time()
+        self.segment_regex = re.compile(SEGMENT_REGEX_TEMPLATE.format(stem=re.escape(path.stem),
+            suffix=re.escape(path.suffix)))
+        self.segment_number = self._get_last_segment_number()
+        self.closed = False
+
+    def _get_last_segment_number(self) -> int:
+        numbers = [int(match.group(1)) for match in
+            (self.segment_regex.match(path.name) for path in self.path.parent.iterdir())
+            if match]
+        return max(numbers, default=0)
+
+    def should_rotate(self, num_bytes: int) -> bool:
+        if self.size == 0:
+            return False
+        max_bytes = self.policy.get('max_bytes', 0)
+        rotate_interval = self.policy.get('rotate_interval', 0)
+        return bool(max_bytes and self.size + num_bytes > max_bytes) or \
+            bool(rotate_interval and time.time() - self.opened_at >= rotate_interval)
+
+    def write(self, data: bytes) -> None:
+        """A segment always ends with a complete line (unless a line has no end) so it can
+        exceed 'max_bytes' by the remainder of the line that it ends with. 'data' can span
+        several segments (e.g. the output of a burst of logging)."""
+        if self.closed or not data:
+            return
+        max_bytes = self.policy.get('max_bytes', 0)
+        while self.should_rotate(len(data)):
+            # the last line that fits or else the end of the current line
+            end = data.rfind(b"\n", 0, max(max_bytes - self.size, 0)) if max_bytes else -1
+            if end == -1:
+                end = data.find(b"\n")
+            if end != -1:
+                self._write(data[:end + 1])
+                data = data[end + 1:]
+            self.rotate()
+            if max_bytes and len(data) > max_bytes:
+                end = data.rfind(b"\n", 0, max_bytes)
+                if end == -1:
+                    end = data.find(b"\n")
+                if end != -1 and end + 1 < len(data):
+                    self._write(data[:end + 1])
+                    data = data[end + 1:]
+        self._write(data)
+
+    def _write(self, data: bytes) -> None:
+        self.file.write(data)
+        # flushed immediately so that the logs can be followed (see: log_streaming.py)
+        self.file.flush()
+        self.size += len(data)
+
+    def rotate(self) -> Path:
+        self.file.close()
+        self.segment_number += 1
+        segment_path = self.path.with_name(
+            f"{self.path.stem}.{self.segment_number}{self.path.suffix}")
+        os.replace(self.path, segment_path)
+        self.file = open(self.path, 'wb')
+        self.size = 0
+        self.opened_at = time.time()
+        logger.debug(f"rotated {self.path} to {segment_path.name}")
+        self._submit(self._process_segment, segment_path)
+        return segment_path
+
+    def _process_segment(self, segment_path: Path) -> None:
+        if self.policy.get('compress', False):
+            compress_segment(segment_path)
+        apply_retention(self.path.parent, self.policy, active_paths=[self.path])
+
+    def _submit(self, function: Callable[[Path], None], *args: Path) -> None:
+        if self.executor is None:
+            function(*args)
+            return
+        try:
+            self.executor.submit(function, *args)
+        except RuntimeError:
+            function(*args)  # the executor was shut down
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.file.close()
@@ -0,0 +1,521 @@
+"""
+Streams the logs of many components at once (see: `electrumsv-sdk logs`).
+
+Each component logs to a new timestamped file in LOGS_DIR/<component_type>/<component_id>/ every
+time that it is started. A LogSource follows the latest file of one component (switching to a new
+file as soon as the component is restarted) and keeps track of its read offset so that only the
+appended bytes are ever read.
+
+On linux the log directories are watched with inotify (via ctypes) so the process sleeps in
+select() until a component actually writes something - i.e. it uses no cpu while the components
+are idle. Elsewhere the directories are polled instead (like `tail -f`).
+
+Lines are interleaved by their timestamp and prefixed with the component id. Lines without a
+timestamp or level (e.g. the lines of a traceback) inherit them from the preceding line.
+"""
+import ctypes
+import ctypes.util
+import datetime
+import gzip
+import heapq
+import io
+import logging
+import os
+from pathlib import Path
+import re
+import select
+import struct
+import sys
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, TextIO, \
+    Tuple, TypedDict, Union
+
+from .log_rotation import is_rotated_segment
+
+logger = logging.getLogger("log-streaming")
+
+POLL_INTERVAL = 0.3
+
+# e.g. "2022-05-12 10:00:00,123", "2022-05-12T10:00:00Z" or "2022-05-12T10:00:00.123456+00:00"
+TIMESTAMP_REGEX = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:[.,](\d{1,6}))?(Z|[+-]\d{2}:?\d{2})?")
+LEVEL_REGEX = re.compile(r"\b(DEBUG|INFO|WARNING|WARN|ERROR|CRITICAL|FATAL)\b")
+LEVELS = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "WARNING": logging.WARNING,
+    "WARN": logging.WARNING, "ERROR": logging.ERROR, "CRITICAL": logging.CRITICAL,
+    "FATAL": logging.CRITICAL}
+
+SINCE_REGEX = re.compile(r"^(\d+(?:\.\d+)?)([smhd])$")
+SINCE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# ANSI colours that are cycled through for the component id prefixes
+PREFIX_COLOURS = ["\033[36m", "\033[33m", "\033[32m", "\033[35m", "\033[34m", "\033[91m",
+    "\033[96m", "\033[93m"]
+RESET_COLOUR = "\033[0m"
+
+
+class LogLineTypedDict(TypedDict):
+    timestamp: float
+    level: Optional[int]
+    component_id: str
+    text: str
+
+
+def parse_timestamp(text: str) -> Optional[float]:
+    match = TIMESTAMP_REGEX.search(text, 0, 64)
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, fraction, tz = match.groups()
+    microsecond = int(fraction.ljust(6, "0")) if fraction else 0
+    tzinfo: Optional[datetime.tzinfo] = None
+    if tz == "Z":
+        tzinfo = datetime.timezone.utc
+    elif tz:
+        sign = -1 if tz[0] == "-" else 1
+        tz_hours, tz_minutes = int(tz[1:3]), int(tz[-2:])
+        tzinfo = datetime.timezone(sign * datetime.timedelta(hours=tz_hours, minutes=tz_minutes))
+    try:
+        # naive timestamps are in local time
+        return datetime.datetime(int(year), int(month), int(day), int(hour), int(minute),
+            int(second), microsecond, tzinfo=tzinfo).timestamp()
+    except ValueError:
+        return None
+
+
+def parse_level(text: str) -> Optional[int]:
+    match = LEVEL_REGEX.search(text, 0, 160)
+    return LEVELS[match.group(1)] if match else None
+
+
+def parse_since(value: str, now: Optional[float]=None) -> float:
+    """a duration relative to now (e.g. '90s', '15m', '2h', '1d') or an iso timestamp (e.g.
+    '2022-05-12 10:00' in local time)"""
+    now = now if now is not None else time.time()
+    match = SINCE_REGEX.match(value.strip())
+    if match:
+        return now - float(match.group(1)) * SINCE_UNITS[match.group(2)]
+    try:
+        return datetime.datetime.fromisoformat(value.strip()).timestamp()
+    except ValueError:
+        raise ValueError(f"invalid --since value: '{value}' (expected e.g. '15m', '2h', '1d' or "
+            f"'2022-05-12 10:00:00')") from None
+
+
+def parse_level_name(value: str) -> int:
+    level = LEVELS.get(value.strip().upper())
+    if level is None:
+        raise ValueError(f"invalid --level value: '{value}' (expected one of: "
+            f"{', '.join(sorted(set(LEVELS) - {'WARN', 'FATAL'}))})")
+    return level
+
+
+def get_log_files(directory: Path) -> List[Path]:
+    """oldest first (the filenames are not zero-padded so they do not sort lexicographically).
+    Rotated segments are included (see: log_rotation.py) but not their temporary files."""
+    try:
+        paths = [path for path in directory.iterdir() if path.is_file()
+            and not path.name.endswith(".tmp")]
+    except FileNotFoundError:
+        return []
+    return sorted(paths, key=lambda path: path.stat().st_mtime)
+
+
+class LogSource:
+    """the logs of a single component - follows the latest log file in 'directory' (or only
+    'logfile' if given). Files are read in binary mode so that the offsets are byte offsets."""
+
+    def __init__(self, component_id: str, directory: Path, logfile: Optional[Path]=None) -> None:
+        self.component_id = component_id
+        self.directory = directory
+        self.pinned_logfile = logfile
+        self.path: Optional[Path] = None
+        self.offset = 0
+        self.inode: Optional[int] = None  # detects that 'path' was rotated (see: log_rotation.py)
+        self.partial_line = b""
+        self.last_timestamp = 0.0
+        self.last_level: Optional[int] = None
+
+    def __repr__(self) -> str:
+        return f"LogSource({self.component_id}, {self.path or self.directory})"
+
+    def get_latest_file(self) -> Optional[Path]:
+        if self.pinned_logfile is not None:
+            return self.pinned_logfile
+        # rotated segments are never written to again
+        log_files = [path for path in get_log_files(self.directory)
+            if not is_rotated_segment(path)]
+        return log_files[-1] if log_files else None
+
+    def parse_line(self, raw_line: bytes) -> LogLineTypedDict:
+        text = raw_line.rstrip(b"\r").decode('utf-8', errors='replace')
+        timestamp = parse_timestamp(text)
+        if timestamp is not None:
+            self.last_timestamp = timestamp
+            self.last_level = parse_level(text)
+        elif text.strip():
+            level = parse_level(text)
+            if level is not None:
+                self.last_level = level
+        return LogLineTypedDict(timestamp=self.last_timestamp, level=self.last_level,
+            component_id=self.component_id, text=text)
+
+    def _iter_file(self, path: Path, since: Optional[float]) -> Iterator[LogLineTypedDict]:
+        try:
+            f: io.BufferedIOBase = gzip.open(path, 'rb') if path.name.endswith(".gz") \
+                else open(path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            self.partial_line = b""
+            for raw_line in iter(f.readline, b""):
+                if not raw_line.endswith(b"\n"):
+                    self.partial_line = raw_line  # it is still being written
+                    break
+                line = self.parse_line(raw_line[:-1])
+                if since is None or line['timestamp'] >= since:
+                    yield line
+            if not path.name.endswith(".gz"):
+                self.path = path
+                self.offset = f.tell()
+                self.inode = os.fstat(f.fileno()).st_ino
+
+    def iter_backlog(self, since: Optional[float]=None) -> Iterator[LogLineTypedDict]:
+        """the lines that were logged before following starts (all the lines of the latest file
+        or, with 'since', of every file that was written to since then)"""
+        if self.pinned_logfile is not None:
+            log_files = [self.pinned_logfile]
+        elif since is None:
+            log_files = get_log_files(self.directory)[-1:]
+        else:
+            log_files = [path for path in get_log_files(self.directory)
+                if path.stat().st_mtime >= since]
+        for path in log_files:
+            yield from self._iter_file(path, since)
+
+    def seek_to_end(self) -> None:
+        """skips the existing lines of the latest file"""
+        self.path = self.get_latest_file()
+        self.partial_line = b""
+        self.offset = 0
+        self.inode = None
+        if self.path is not None:
+            try:
+                stat = self.path.stat()
+            except FileNotFoundError:
+                return
+            self.offset = stat.st_size
+            self.inode = stat.st_ino
+
+    def _read_rotated_remainder(self) -> bytes:
+        """the rest of the file that was renamed to a numbered segment - which is the newest
+        segment if it has already been compressed (the compression keeps the mtime)"""
+        segments = [path for path in get_log_files(self.directory) if is_rotated_segment(path)]
+        if not segments:
+            return b""
+        path = segments[-1]
+        try:
+            if path.name.endswith(".gz"):
+                f: io.BufferedIOBase = gzip.open(path, 'rb')
+            elif path.stat().st_ino == self.inode:
+                f = open(path, 'rb')
+            else:
+                return b""
+            with f:
+                f.seek(self.offset)
+                return f.read()
+        except (OSError, EOFError):
+            return b""  # removed by the retention policy
+
+    def _read_appended(self) -> List[LogLineTypedDict]:
+        assert self.path is not None
+        try:
+            with open(self.path, 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                remainder = b""
+                if self.inode is not None and inode != self.inode:
+                    remainder = self._read_rotated_remainder()
+                    self.offset = 0
+                self.inode = inode
+                size = f.seek(0, os.SEEK_END)
+                if size < self.offset:
+                    # truncated (e.g. the logfile was reopened in 'w' mode)
+                    self.offset = 0
+                    self.partial_line = b""
+                f.seek(self.offset)
+                data = self.partial_line + remainder + f.read()
+                self.offset = f.tell()
+        except FileNotFoundError:
+            return []
+
+        raw_lines = data.split(b"\n")
+        self.partial_line = raw_lines.pop()
+        return [self.parse_line(raw_line) for raw_line in raw_lines]
+
+    def read_new_lines(self) -> List[LogLineTypedDict]:
+        """everything that was appended since the previous read. If the component was restarted
+        (i.e. there is a newer log file) the rest of the old file is read before switching"""
+        lines: List[LogLineTypedDict] = []
+        if self.path is not None:
+            lines.extend(self._read_appended())
+        latest_file = self.get_latest_file()
+        if latest_file is not None and latest_file != self.path:
+            self.path = latest_file
+            self.offset = 0
+            self.inode = None
+            self.partial_line = b""
+            lines.extend(self._read_appended())
+        return lines
+
+
+class PollingWatcher:
+    """fallback for platforms without inotify"""
+
+    def __init__(self, interval: float=POLL_INTERVAL) -> None:
+        self.interval = interval
+        self.directories: Set[Path] = set()
+        self.stats: Dict[Path, Tuple[int, ...]] = {}
+
+    def add_watch(self, directory: Path) -> None:
+        self.directories.add(directory)
+        self.stats[directory] = self._stat(directory)
+
+    def _stat(self, directory: Path) -> Tuple[int, ...]:
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            return ()
+        stats: List[int] = []
+        for entry in entries:
+            stat = entry.stat()
+            stats.extend((hash(entry.name), stat.st_size, stat.st_mtime_ns))
+        return tuple(sorted(stats))
+
+    def wait(self, timeout: Optional[float]=None) -> Set[Path]:
+        """returns the directories in which something changed"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            time.sleep(self.interval if deadline is None
+                else max(min(self.interval, deadline - time.monotonic()), 0))
+            changed = set()
+            for directory in self.directories:
+                stat = self._stat(directory)
+                if stat != self.stats[directory]:
+                    self.stats[directory] = stat
+                    changed.add(directory)
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self) -> None:
+        self.directories.clear()
+
+
+class InotifyWatcher:
+    """linux only - directory watches report the writes to (and creation of) every file in them"""
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE_SELF = 0x00000400
+    IN_IGNORED = 0x00008000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+    EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+    def __init__(self) -> None:
+        libc_name = ctypes.util.find_library("c")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd: int = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1 failed: {os.strerror(errno)}")
+        self.directories: Dict[int, Path] = {}
+
+    def add_watch(self, directory: Path) -> None:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_add_watch failed for {directory}: "
+                f"{os.strerror(errno)}")
+        self.directories[wd] = directory
+
+    def wait(self, timeout: Optional[float]=None) -> Set[Path]:
+        """blocks until something is written (or 'timeout' seconds have passed) and returns the
+        directories in which something changed"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed: Set[Path] = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, name_length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size + name_length
+                directory = self.directories.get(wd)
+                if directory is None:
+                    continue
+                changed.add(directory)
+                if mask & self.IN_IGNORED:
+                    del self.directories[wd]  # the directory was deleted
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def make_watcher() -> Union[InotifyWatcher, PollingWatcher]:
+    if sys.platform == 'linux':
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError) as e:
+            # e.g. the inotify instance limit was reached or libc could not be loaded
+            logger.debug(f"falling back to polling for log changes: {e}")
+    return PollingWatcher()
+
+
+class LogStreamer:
+    """Interleaves the lines of several LogSources by timestamp. If 'logs_dir' is given then the
+    log directories of components that are started while following are picked up too."""
+
+    def __init__(self, sources: Iterable[LogSource], min_level: Optional[int]=None,
+            colour: bool=False, write: Optional[Callable[[str], None]]=None,
+            logs_dir: Optional[Path]=None, component_ids: Optional[Set[str]]=None,
+            component_types: Optional[Set[str]]=None) -> None:
+        self.sources: List[LogSource] = []
+        self.min_level = min_level
+        self.colour = colour
+        self.write = write if write is not None else self._write_stdout
+        self.logs_dir = logs_dir
+        self.component_ids = component_ids
+        self.component_types = component_types
+        self.prefix_width = max((len(source.component_id) for source in sources), default=0)
+        self.prefixes: Dict[str, str] = {}
+        for source in sources:
+            self.add_source(source)
+
+    def _write_stdout(self, text: str) -> None:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    def add_source(self, source: LogSource) -> None:
+        self.sources.append(source)
+        self.prefix_width = max(self.prefix_width, len(source.component_id))
+        prefix = f"{source.component_id:<{self.prefix_width}} | "
+        if self.colour:
+            colour = PREFIX_COLOURS[(len(self.sources) - 1) % len(PREFIX_COLOURS)]
+            prefix = colour + prefix + RESET_COLOUR
+        self.prefixes[source.component_id] = prefix
+
+    def is_visible(self, line: LogLineTypedDict) -> bool:
+        if self.min_level is None:
+            return True
+        return line['level'] is not None and line['level'] >= self.min_level
+
+    def emit(self, lines: Iterable[LogLineTypedDict]) -> None:
+        output = [self.prefixes[line['component_id']] + line['text'] + "\n"
+            for line in lines if self.is_visible(line)]
+        if output:
+            self.write("".join(output))
+
+    def show_backlog(self, since: Optional[float]=None) -> None:
+        # each file is already in timestamp order so a lazy k-way merge is enough
+        self.emit(heapq.merge(*[source.iter_backlog(since) for source in self.sources],
+            key=lambda line: line['timestamp']))
+
+    def get_parent_directories(self) -> Set[Path]:
+        """the directories in which new component log directories can appear"""
+        if self.logs_dir is None:
+            return set()
+        directories = {self.logs_dir}
+        for source in find_log_sources(self.logs_dir, self.component_ids, self.component_types):
+            directories.add(source.directory.parent)
+        if self.component_types:
+            directories.update(self.logs_dir / component_type
+                for component_type in self.component_types
+                if (self.logs_dir / component_type).is_dir())
+        else:
+            directories.update(path for path in self.logs_dir.iterdir() if path.is_dir())
+        return directories
+
+    def follow(self) -> None:
+        """runs until interrupted (Ctrl + C)"""
+        watcher = make_watcher()
+        sources_by_directory: Dict[Path, LogSource] = {}
+        parent_directories: Set[Path] = set()
+
+        def watch_new_directories() -> List[LogSource]:
+            for directory in self.get_parent_directories() - parent_directories:
+                watcher.add_watch(directory)
+                parent_directories.add(directory)
+            new_sources = []
+            if self.logs_dir is not None:
+                for source in find_log_sources(self.logs_dir, self.component_ids,
+                        self.component_types):
+                    if source.directory not in sources_by_directory:
+                        self.add_source(source)
+                        new_sources.append(source)
+            for source in new_sources:
+                watcher.add_watch(source.directory)
+                sources_by_directory[source.directory] = source
+            return new_sources
+
+        try:
+            for source in self.sources:
+                if source.path is None:
+                    source.seek_to_end()  # e.g. none of its lines were logged since --since
+                watcher.add_watch(source.directory)
+                sources_by_directory[source.directory] = source
+            watch_new_directories()
+
+            while True:
+                changed = watcher.wait()
+                lines: List[LogLineTypedDict] = []
+                if changed & parent_directories:
+                    for source in watch_new_directories():
+                        lines.extend(source.read_new_lines())
+                for directory in changed:
+                    changed_source = sources_by_directory.get(directory)
+                    if changed_source is not None:
+                        lines.extend(changed_source.read_new_lines())
+                lines.sort(key=lambda line: line['timestamp'])
+                self.emit(lines)
+        finally:
+            watcher.close()
+
+
+def find_log_sources(logs_dir: Path, component_ids: Optional[Set[str]]=None,
+        component_types: Optional[Set[str]]=None) -> List[LogSource]:
+    """every LOGS_DIR/<component_type>/<component_id>/ directory (optionally filtered)"""
+    sources = []
+    try:
+        type_directories = sorted(path for path in logs_dir.iterdir() if path.is_dir())
+    except FileNotFoundError:
+        return []
+    for type_directory in type_directories:
+        if component_types and type_directory.name not in component_types:
+            continue
+        for id_directory in sorted(path for path in type_directory.iterdir() if path.is_dir()):
+            if component_ids and id_directory.name not in component_ids:
+                continue
+            sources.append(LogSource(id_directory.name, id_directory))
+    return sources
+
+
+def follow_file(logfile: Path, output: TextIO=sys.stdout) -> None:
+    """prints the lines of a single logfile as they are written (e.g. for inline components) -
+    like 'tail -f' but starting at the end of the file rather than at its last lines"""
+    source = LogSource(logfile.parent.name, logfile.parent, logfile)
+
+    def write(text: str) -> None:
+        output.write(text)
+        output.flush()
+
+    streamer = LogStreamer([source], write=write)
+    streamer.prefixes[source.component_id] = ""  # not interleaved with any other component
+    source.seek_to_end()
+    streamer.follow()
@@ -0,0 +1,304 @@
+"""
+A pooled keep-alive JSON-RPC client for the node components (see: call_any_node_rpc).
+
+There is one client per node id (per process - see: get_node_rpc_client). The endpoint of the
+node is resolved from the component store (or BITCOIN_NODE_HOST / BITCOIN_NODE_PORT) on the first
+call and then cached and every call is made over the same keep-alive http session. Liveness is
+only checked lazily: if a call fails to connect the endpoint is resolved again (the node may have
+been restarted on another port) and the call is retried once before giving up.
+
+AsyncNodeRPCClient is the asyncio equivalent (using aiohttp) for callers that issue many
+concurrent calls from one event loop (e.g. a flood of 'sendrawtransaction').
+"""
+import itertools
+import logging
+import os
+import threading
+import typing
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .components import ComponentStore
+
+if typing.TYPE_CHECKING:
+    import asyncio
+    import aiohttp
+    import requests
+
+logger = logging.getLogger("node-rpc")
+
+DEFAULT_RPCHOST = "127.0.0.1"
+DEFAULT_RPCPORT = 18332
+RPCUSER = "rpcuser"
+RPCPASSWORD = "rpcpassword"
+# generous because e.g. 'submitblock' of a large block can take a while
+RPC_TIMEOUT = float(os.environ.get("SDK_NODE_RPC_TIMEOUT", 300))
+POOL_SIZE = 16  # keep-alive connections per node (for callers with several threads)
+# the number of calls per json-rpc batch request (larger batches are split up)
+BATCH_SIZE = int(os.environ.get("SDK_NODE_RPC_BATCH_SIZE", 500))
+# the maximum number of calls that an AsyncNodeRPCClient has in flight (the others wait)
+ASYNC_MAX_CONCURRENCY = 100
+
+NODE_NOT_RUNNING_MESSAGE = "bitcoin node must be running to respond to rpc methods. try: " \
+    "electrumsv-sdk start node"
+
+RPCCall = Tuple[str, Sequence[Any]]  # (method, args)
+
+_clients: Dict[str, "NodeRPCClient"] = {}
+_clients_lock = threading.Lock()
+
+
+class NodeRPCError(Exception):
+    pass
+
+
+def resolve_node_endpoint(node_id: str) -> Optional[Tuple[str, int]]:
+    """(host, port) - None if the node component does not exist"""
+    rpchost = os.getenv("BITCOIN_NODE_HOST")
+    rpcport = int(os.getenv("BITCOIN_NODE_PORT", "0"))
+    if rpchost and rpcport:
+        return rpchost, rpcport
+
+    component_dict = ComponentStore().component_status_data_by_id(node_id)
+    if component_dict is None:
+        logger.error(f"node component: '{node_id}' not found")
+        return None
+
+    metadata = component_dict["metadata"]
+    if not metadata:
+        logger.error(f"could not locate metadata for node instance: {node_id}, "
+            f"using default of {DEFAULT_RPCPORT}")
+        return DEFAULT_RPCHOST, DEFAULT_RPCPORT
+    return DEFAULT_RPCHOST, int(metadata.get("rpcport", DEFAULT_RPCPORT))
+
+
+def make_request(request_ids: Iterator[int], method: str, *args: Any) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "method": method, "params": list(args), "id": next(request_ids)}
+
+
+def get_batch_responses(node_id: str, batch: List[Dict[str, Any]], responses: Any) \
+        -> List[Dict[str, Any]]:
+    """the response of each request of the batch in order"""
+    if not isinstance(responses, list):
+        # e.g. the batch was rejected as a whole
+        raise NodeRPCError(f"the batch request to {node_id} failed: {responses}")
+
+    # the responses of a batch are not necessarily in the order of the requests
+    responses_by_id = {response.get("id"): response for response in responses}
+    return [responses_by_id.get(request["id"], {"result": None,
+        "error": {"code": -32603, "message": "no response"}, "id": request["id"]})
+        for request in batch]
+
+
+class NodeRPCClient:
+    """Can be shared between threads. 'call' returns the decoded json response i.e.
+    {"result": ..., "error": ..., "id": ...} or None if the node component does not exist."""
+
+    def __init__(self, node_id: str='node1', timeout: float=RPC_TIMEOUT) -> None:
+        self.node_id = node_id
+        self.timeout = timeout
+        self._endpoint: Optional[Tuple[str, int]] = None
+        self._session: Optional["requests.Session"] = None
+        self._lock = threading.Lock()
+        self._request_ids = itertools.count(1)
+
+    def resolve_endpoint(self) -> Optional[Tuple[str, int]]:
+        return resolve_node_endpoint(self.node_id)
+
+    def get_endpoint(self) -> Optional[Tuple[str, int]]:
+        with self._lock:
+            if self._endpoint is None:
+                self._endpoint = self.resolve_endpoint()
+            return self._endpoint
+
+    def invalidate_endpoint(self) -> None:
+        with self._lock:
+            self._endpoint = None
+
+    def get_session(self) -> "requests.Session":
+        import requests
+        from requests.adapters import HTTPAdapter
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                session.auth = (RPCUSER, RPCPASSWORD)
+                session.headers.update({"Content-Type": "application/json"})
+                session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE))
+                self._session = session
+            return self._session
+
+    def make_request(self, method: str, *args: Any) -> Dict[str, Any]:
+        return make_request(self._request_ids, method, *args)
+
+    def post(self, payload: Any) -> Optional[Any]:
+        """posts a json-rpc request (or a batch of them) - raises NodeRPCError if the node is not
+        running"""
+        import requests
+        for _attempt in range(2):
+            endpoint = self.get_endpoint()
+            if endpoint is None:
+                return None
+            rpchost, rpcport = endpoint
+            try:
+                response = self.get_session().post(f"http://{rpchost}:{rpcport}", json=payload,
+                    timeout=self.timeout)
+            except requests.exceptions.ConnectionError:
+                # the node was stopped or else restarted (perhaps with another port)
+                logger.debug(f"failed to connect to {self.node_id} at {rpchost}:{rpcport}")
+                self.invalidate_endpoint()
+                continue
+            # the node responds to failed calls with an http error status and a json-rpc error
+            try:
+                return response.json()
+            except ValueError:
+                raise NodeRPCError(f"invalid response from {self.node_id}: http status "
+                    f"{response.status_code}") from None
+        raise NodeRPCError(NODE_NOT_RUNNING_MESSAGE)
+
+    def call(self, method: str, *args: Any) -> Optional[Dict[str, Any]]:
+        return self.post(self.make_request(method, *args))
+
+    def call_batch(self, calls: Iterable[RPCCall], batch_size: int=BATCH_SIZE) \
+            -> Iterator[Dict[str, Any]]:
+        """Yields the response of each call in the order of 'calls'. The calls are consumed
+        lazily and posted as json-rpc batches of 'batch_size' calls so that even an unbounded
+        stream of calls uses constant memory. Yields nothing if the node component does not
+        exist."""
+        calls_iterator = iter(calls)
+        while True:
+            batch = [self.make_request(method, *args)
+                for method, args in itertools.islice(calls_iterator, batch_size)]
+            if not batch:
+                return
+            responses = self.post(batch)
+            if responses is None:
+                return
+            yield from get_batch_responses(self.node_id, batch, responses)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+class AsyncNodeRPCClient:
+    """The asyncio equivalent of NodeRPCClient - it must only be used from one event loop e.g.
+
+        async with AsyncNodeRPCClient("node1") as client:
+            responses = await asyncio.gather(*(client.call("sendrawtransaction", rawtx)
+                for rawtx in rawtxs))
+
+    At most 'max_concurrency' calls are in flight at a time (the others wait for a slot) over a
+    pool of as many keep-alive connections. 'timeout' (per call) raises asyncio.TimeoutError."""
+
+    def __init__(self, node_id: str='node1', timeout: float=RPC_TIMEOUT,
+            max_concurrency: int=ASYNC_MAX_CONCURRENCY) -> None:
+        self.node_id = node_id
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._endpoint: Optional[Tuple[str, int]] = None
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._semaphore: Optional["asyncio.Semaphore"] = None
+        self._request_ids = itertools.count(1)
+
+    async def __aenter__(self) -> "AsyncNodeRPCClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    def resolve_endpoint(self) -> Optional[Tuple[str, int]]:
+        return resolve_node_endpoint(self.node_id)
+
+    def get_endpoint(self) -> Optional[Tuple[str, int]]:
+        if self._endpoint is None:
+            self._endpoint = self.resolve_endpoint()
+        return self._endpoint
+
+    def get_session(self) -> "aiohttp.ClientSession":
+        import asyncio
+        import aiohttp
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                auth=aiohttp.BasicAuth(RPCUSER, RPCPASSWORD))
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    def make_request(self, method: str, *args: Any) -> Dict[str, Any]:
+        return make_request(self._request_ids, method, *args)
+
+    async def post(self, payload: Any, timeout: Optional[float]=None) -> Optional[Any]:
+        """posts a json-rpc request (or a batch of them) - raises NodeRPCError if the node is not
+        running"""
+        import aiohttp
+        session = self.get_session()
+        assert self._semaphore is not None  # typing bug
+        client_timeout = aiohttp.ClientTimeout(total=timeout if timeout else self.timeout)
+        async with self._semaphore:
+            for _attempt in range(2):
+                endpoint = self.get_endpoint()
+                if endpoint is None:
+                    return None
+                rpchost, rpcport = endpoint
+                try:
+                    async with session.post(f"http://{rpchost}:{rpcport}", json=payload,
+                            timeout=client_timeout) as response:
+                        try:
+                            # the node responds to failed calls with an http error status
+                            return await response.json(content_type=None)
+                        except ValueError:
+                            raise NodeRPCError(f"invalid response from {self.node_id}: http "
+                                f"status {response.status}") from None
+                except (aiohttp.ClientConnectorError, aiohttp.ServerDisconnectedError):
+                    # the node was stopped or else restarted (perhaps with another port)
+                    logger.debug(f"failed to connect to {self.node_id} at {rpchost}:{rpcport}")
+                    self._endpoint = None
+            raise NodeRPCError(NODE_NOT_RUNNING_MESSAGE)
+
+    async def call(self, method: str, *args: Any, timeout: Optional[float]=None) \
+            -> Optional[Dict[str, Any]]:
+        return await self.post(self.make_request(method, *args), timeout)
+
+    async def call_batch(self, calls: Iterable[RPCCall], batch_size: int=BATCH_SIZE,
+            timeout: Optional[float]=None) -> List[Dict[str, Any]]:
+        """the response of each call in order - the batches of 'batch_size' calls are posted
+        concurrently ('timeout' applies per batch)"""
+        import asyncio
+        calls_iterator = iter(calls)
+        batches: List[List[Dict[str, Any]]] = []
+        while True:
+            batch = [self.make_request(method, *args)
+                for method, args in itertools.islice(calls_iterator, batch_size)]
+            if not batch:
+                break
+            batches.append(batch)
+
+        all_responses = await asyncio.gather(*(self.post(batch, timeout) for batch in batches))
+        results: List[Dict[str, Any]] = []
+        for batch, responses in zip(batches, all_responses):
+            if responses is None:
+                return []
+            results.extend(get_batch_responses(self.node_id, batch, responses))
+        return results
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def get_node_rpc_client(node_id: str='node1') -> NodeRPCClient:
+    """the cached client of the node (created on first use)"""
+    with _clients_lock:
+        client = _clients.get(node_id)
+        if client is None:
+            client = _clients[node_id] = NodeRPCClient(node_id)
+        return client
+
+
+def close_node_rpc_clients() -> None:
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -0,0 +1,275 @@
+"""
+Each plugin may ship a static 'manifest.json' alongside its python module which declares:
+
+    {
+        "name": "node",
+        "default_ports": {"rpcport": 18332, "p2p_port": 18444, "zmq_port": 28332},
+        "reserved_ports": [18332, 18444],
+        "dependencies": [],
+        "cli_extensions": {
+            "start": [
+                {"flags": ["--regtest"], "action": "store_true", "help": "run on regtest"}
+            ]
+        },
+        "log_rotation": {"max_bytes": 104857600, "keep_files": 10}
+    }
+
+The manifests of all three plugin locations (builtin, user and local) are compiled into
+SDK_HOME_DIR/plugin_registry.json which is only rebuilt when one of the plugin directories or
+manifest files has been modified. This allows cli parsing, validation and port clash checks to
+proceed without importing the (heavy) plugin modules. Plugins without a manifest are still
+supported but the SDK needs to import them to find out the same information.
+"""
+import json
+import logging
+import os
+from pathlib import Path
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple, TypedDict
+
+from .cgroups import ResourceLimitsTypedDict
+from .config import Config
+from .cpu_affinity import CpuAffinityTypedDict
+from .log_rotation import LogRotationPolicyTypedDict, get_log_rotation_policy
+
+logger = logging.getLogger("plugin-registry")
+
+MANIFEST_FILENAME = "manifest.json"
+REGISTRY_FILENAME = "plugin_registry.json"
+REGISTRY_VERSION = 1
+IGNORED_DIRNAMES = {'__init__.py', '__pycache__', '.idea', '.vscode', '_postgres', '_common'}
+
+# json manifests can only refer to types by name
+CLI_OPTION_TYPES = {"str": str, "int": int, "float": float}
+
+
+class CLIOption(TypedDict, total=False):
+    flags: List[str]
+    action: str
+    type: str
+    default: Any
+    help: str
+
+
+class PluginManifest(TypedDict, total=False):
+    name: str
+    default_ports: Dict[str, int]
+    reserved_ports: List[int]
+    dependencies: List[str]
+    cli_extensions: Dict[str, List[CLIOption]]
+    log_rotation: LogRotationPolicyTypedDict  # overrides DEFAULT_LOG_ROTATION_POLICY
+    resource_limits: ResourceLimitsTypedDict  # applied with `start --cgroup` (see: cgroups.py)
+    cpu_affinity: CpuAffinityTypedDict  # see: cpu_affinity.py
+
+
+class PluginEntry(TypedDict):
+    plugin_dir: str
+    manifest: Optional[PluginManifest]
+
+
+RegistryKey = List[Tuple[str, Optional[int]]]
+
+# the most recently loaded registry for this process: (registry_key, {component_name: entry})
+_registry_cache: Dict[Path, Tuple[RegistryKey, Dict[str, PluginEntry]]] = {}
+_registry_cache_lock = threading.Lock()
+
+
+def _mtime_ns(path: Path) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def read_manifest(plugin_path: Path) -> Optional[PluginManifest]:
+    manifest_path = plugin_path / MANIFEST_FILENAME
+    try:
+        with open(manifest_path, "r") as f:
+            manifest: PluginManifest = json.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        logger.error(f"invalid json in plugin manifest: {manifest_path} - it will be ignored")
+        return None
+    return manifest
+
+
+class PluginRegistry:
+    """Cached lookup of every available plugin and its (optional) static manifest. Later plugin
+    locations override earlier ones if there is a name clash (builtin < user < local)."""
+
+    def __init__(self, config: Optional[Config] = None) -> None:
+        self.config = config if config else Config()
+        assert self.config.SDK_HOME_DIR is not None
+        assert self.config.BUILTIN_COMPONENTS_DIR is not None
+        assert self.config.USER_PLUGINS_DIR is not None
+        assert self.config.LOCAL_PLUGINS_DIR is not None
+        self.registry_path = self.config.SDK_HOME_DIR / REGISTRY_FILENAME
+        self.plugin_dirs = [self.config.BUILTIN_COMPONENTS_DIR, self.config.USER_PLUGINS_DIR,
+            self.config.LOCAL_PLUGINS_DIR]
+        self.plugins = self.load()
+
+    def get_registry_key(self) -> RegistryKey:
+        """Adding or removing a plugin changes the mtime of its parent directory. Editing a
+        manifest in place does not - so the mtime of every manifest is part of the key too."""
+        key: RegistryKey = [(str(plugin_dir), _mtime_ns(plugin_dir))
+            for plugin_dir in self.plugin_dirs]
+        return key
+
+    def get_manifests_key(self, plugins: Dict[str, PluginEntry]) -> RegistryKey:
+        return [(str(Path(entry['plugin_dir']) / name / MANIFEST_FILENAME),
+            _mtime_ns(Path(entry['plugin_dir']) / name / MANIFEST_FILENAME))
+            for name, entry in sorted(plugins.items())]
+
+    def load(self) -> Dict[str, PluginEntry]:
+        with _registry_cache_lock:
+            registry_key = self.get_registry_key()
+            cached = _registry_cache.get(self.registry_path)
+            if cached is not None and cached[0] == registry_key + \
+                    self.get_manifests_key(cached[1]):
+                return cached[1]
+
+            plugins = self.read_registry_file(registry_key)
+            if plugins is None:
+                plugins = self.scan()
+                self.write_registry_file(registry_key, plugins)
+
+            _registry_cache[self.registry_path] = \
+                (registry_key + self.get_manifests_key(plugins), plugins)
+            return plugins
+
+    def read_registry_file(self, registry_key: RegistryKey) -> Optional[Dict[str, PluginEntry]]:
+        try:
+            with open(self.registry_path, "r") as f:
+                registry = json.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if registry.get('version') != REGISTRY_VERSION:
+            return None
+
+        plugins: Dict[str, PluginEntry] = registry['plugins']
+        cached_key = [tuple(item) for item in registry['key']]
+        if cached_key != registry_key + self.get_manifests_key(plugins):
+            return None
+        return plugins
+
+    def write_registry_file(self, registry_key: RegistryKey,
+            plugins: Dict[str, PluginEntry]) -> None:
+        registry = {
+            'version': REGISTRY_VERSION,
+            'key': registry_key + self.get_manifests_key(plugins),
+            'plugins': plugins,
+        }
+        # write then rename so that concurrent readers never see a partially written file
+        temp_path = self.registry_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp_path, "w") as f:
+            f.write(json.dumps(registry, indent=4))
+        os.replace(temp_path, self.registry_path)
+        logger.debug(f"rebuilt plugin registry at: {self.registry_path}")
+
+    def scan(self) -> Dict[str, PluginEntry]:
+        plugins: Dict[str, PluginEntry] = {}
+        for plugin_dir in self.plugin_dirs:
+            if not plugin_dir.exists():
+                continue
+
+            for component_type in os.listdir(plugin_dir):
+                if component_type in IGNORED_DIRNAMES:
+                    continue
+                plugins[component_type] = PluginEntry(plugin_dir=str(plugin_dir),
+                    manifest=read_manifest(plugin_dir / component_type))
+        return plugins
+
+    # ----- QUERIES ----- #
+
+    def get_component_map(self) -> Dict[str, Path]:
+        return {name: Path(entry['plugin_dir']) for name, entry in self.plugins.items()}
+
+    def get_manifest(self, component_type: str) -> Optional[PluginManifest]:
+        entry = self.plugins.get(component_type)
+        if entry is None:
+            return None
+        return entry['manifest']
+
+    def get_reserved_ports(self, component_type: str) -> Optional[Set[int]]:
+        """None if the plugin has no manifest (the caller must import the plugin instead)"""
+        manifest = self.get_manifest(component_type)
+        if manifest is None:
+            return None
+        return set(manifest.get('reserved_ports', []))
+
+    def get_default_ports(self, component_type: str) -> Optional[Dict[str, int]]:
+        """None if the plugin has no manifest"""
+        manifest = self.get_manifest(component_type)
+        if manifest is None:
+            return None
+        return dict(manifest.get('default_ports', {}))
+
+    def get_dependencies(self, component_type: str) -> List[str]:
+        manifest = self.get_manifest(component_type)
+        if manifest is None:
+            return []
+        return list(manifest.get('dependencies', []))
+
+    def get_log_rotation_policy(self, component_type: str) -> LogRotationPolicyTypedDict:
+        manifest = self.get_manifest(component_type)
+        return get_log_rotation_policy(manifest.get('log_rotation') if manifest else None)
+
+    def get_resource_limits(self, component_type: str) -> ResourceLimitsTypedDict:
+        manifest = self.get_manifest(component_type)
+        return manifest.get('resource_limits', ResourceLimitsTypedDict()) if manifest \
+            else ResourceLimitsTypedDict()
+
+    def get_cpu_affinity(self, component_type: str) -> CpuAffinityTypedDict:
+        manifest = self.get_manifest(component_type)
+        return manifest.get('cpu_affinity', CpuAffinityTypedDict()) if manifest \
+            else CpuAffinityTypedDict()
+
+    def get_cli_extensions(self, component_type: str, namespace: str) \
+            -> Optional[List[CLIOption]]:
+        """None if the plugin has no manifest (the caller must import the plugin instead)"""
+        manifest = self.get_manifest(component_type)
+        if manifest is None:
+            return None
+        return manifest.get('cli_extensions', {}).get(namespace, [])
+
+    def get_cli_extension_defaults(self, component_type: str, namespace: str) -> Dict[str, Any]:
+        """The values argparse would give the cli extension options if none were set on the
+        command-line. Used where a CLIInputs is constructed directly (e.g. 'start all')."""
+        defaults: Dict[str, Any] = {}
+        for cli_option in self.get_cli_extensions(component_type, namespace) or []:
+            long_flags = [flag for flag in cli_option['flags'] if flag.startswith("--")]
+            dest = (long_flags or cli_option['flags'])[0].lstrip("-").replace("-", "_")
+            if cli_option.get('action') == "store_true":
+                defaults[dest] = cli_option.get('default', False)
+            else:
+                defaults[dest] = cli_option.get('default')
+        return defaults
+
+    def get_dependency_graph(self, component_types: List[str]) -> Dict[str, List[str]]:
+        """{component_type: [dependencies]} restricted to the given component types. Raises
+        ValueError if there is a dependency cycle."""
+        graph = {component_type: [dependency for dependency in
+            self.get_dependencies(component_type) if dependency in component_types]
+            for component_type in component_types}
+
+        # depth-first search for back edges
+        visiting: Set[str] = set()
+        visited: Set[str] = set()
+
+        def visit(component_type: str, path: List[str]) -> None:
+            if component_type in visited:
+                return
+            if component_type in visiting:
+                cycle = path[path.index(component_type):] + [component_type]
+                raise ValueError(f"plugin dependency cycle: {' -> '.join(cycle)}")
+            visiting.add(component_type)
+            for dependency in graph[component_type]:
+                visit(dependency, path + [component_type])
+            visiting.remove(component_type)
+            visited.add(component_type)
+
+        for component_type in graph:
+            visit(component_type, [])
+        return graph
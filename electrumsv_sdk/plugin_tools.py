@@ -4,15 +4,21 @@ import os
 import time
 from pathlib import Path
 import sys
-from typing import Dict, Callable, Tuple, Set, List, Any, Optional
-import requests
-
-from .constants import NETWORKS_LIST
+from typing import Dict, Callable, Iterable, Tuple, Set, List, Any, Optional, Sequence, cast
+
+from .cgroups import get_resource_limits, is_cgroup_v2_supported
+from .constants import NETWORKS_LIST, ComponentEvent, ComponentState, NameSpace
+from .cpu_affinity import CPU_LAYOUT_AUTO, CPU_LAYOUT_MANUAL, format_cpu_list, \
+    is_cpu_affinity_supported, parse_cpu_list, pinned_to, release_cpus, reserve_cpus, \
+    validate_cpus
+from . import readiness
+from .readiness import ReadinessProbe, HttpProbe
 from .sdk_types import AbstractPlugin, SelectedComponent
 from .components import ComponentStore, ComponentTypedDict, ComponentMetadata
 from .utils import port_is_in_use, is_default_component_id, is_remote_repo, checkout_branch, \
     spawn_inline, spawn_new_terminal, spawn_background_supervised, prepend_to_pythonpath
 from .config import CLIInputs, Config
+from .supervisor_client import RestartPolicyTypedDict
 
 
 class PluginTools:
@@ -25,12 +31,62 @@ class PluginTools:
         self.component_store = ComponentStore()
         self.logger = logging.getLogger("plugin-tools")
 
+        # set by spawn_process() - the readiness of the spawned process is measured against these
+        self.spawn_time: Optional[float] = None
+        self.start_seq: Optional[int] = None
+        self.status_endpoint: Optional[str] = None
+
     def allocate_port(self) -> int:
         assert self.plugin.id is not None  # typing bug
         component_port = self.get_component_port(self.plugin.DEFAULT_PORT,
             self.plugin.COMPONENT_NAME, self.plugin.id)
         return component_port
 
+    def allocate_ports(self, default_ports: Dict[str, int],
+            component_name: Optional[str]=None, component_id: Optional[str]=None) \
+            -> Dict[str, int]:
+        """Allocates all ports of a component in one call e.g.
+        {'rpcport': 18332, 'p2p_port': 18444} -> {'rpcport': 18342, 'p2p_port': 18454}
+
+        The default component id gets the default ports (which are reserved for it). Any other
+        component id gets the first of default_port + 10, + 20 ... that is not reserved by a
+        plugin, not leased to another component and not in use. The ports are leased to the
+        component until it is stopped (see: ComponentStore.lease_ports)."""
+        component_name = component_name if component_name else self.plugin.COMPONENT_NAME
+        component_id = component_id if component_id else self.plugin.id
+        assert component_id is not None  # typing bug
+        return self.allocate_ports_batch(default_ports, [component_id],
+            component_name)[component_id]
+
+    def allocate_ports_batch(self, default_ports: Dict[str, int], component_ids: List[str],
+            component_name: Optional[str]=None) -> Dict[str, Dict[str, int]]:
+        """Allocates the ports of several components of the same type in one pass (see:
+        allocate_ports) {component_id: {purpose: port}}"""
+        component_name = component_name if component_name else self.plugin.COMPONENT_NAME
+        if not self.port_clash_check_ok():
+            sys.exit(1)
+
+        reserved_ports = self.get_all_reserved_ports()
+        candidate_ports: Dict[str, Dict[str, Iterable[int]]] = {}
+        for component_id in component_ids:
+            if is_default_component_id(component_name, component_id):
+                for port in default_ports.values():
+                    assert not port_is_in_use(port), \
+                        f"an unknown application is using this port: {port}"
+                candidate_ports[component_id] = {purpose: [port]
+                    for purpose, port in default_ports.items()}
+            else:
+                candidate_ports[component_id] = {purpose: (port for port in
+                    range(default_port + 10, 65536, 10) if port not in reserved_ports)
+                    for purpose, default_port in default_ports.items()}
+
+        try:
+            return self.component_store.lease_ports_batch(component_name, candidate_ports,
+                is_port_available=lambda port: not port_is_in_use(port))
+        except ValueError as e:
+            self.logger.error(str(e))
+            sys.exit(1)
+
     def allocate_datadir_and_id(self) -> Tuple[Path, str]:
         component_datadir, component_id = \
             self.get_component_datadir(self.plugin.COMPONENT_NAME)
@@ -58,6 +114,9 @@ class PluginTools:
         - callable is called with one argument: component_dict with all relevant info about the
         component of interest - if there are many components of a particular type then the
         'callable' will be called multiple times.
+        - the ports leased to the component are released afterwards.
+        - when stopping, a 'stopping' event is journaled first so that the supervisor does not
+        apply the component's restart policy to the exit.
         """
         id = self.cli_inputs.component_id
         components_state = self.component_store.get_status(component_name)
@@ -66,16 +125,26 @@ class PluginTools:
         if id:
             for component_dict in components_state.values():
                 if component_dict.get("id") == id:
+                    self._mark_stopping(component_dict)
                     callable(component_dict)
+                    self.component_store.release_ports(id)
                     self.logger.debug(f"terminated: {id}")
 
         # stop all running components of: <component_type>
         elif component_name:
             for component_dict in components_state.values():
                 if component_dict.get("component_type") == component_name:
+                    self._mark_stopping(component_dict)
                     callable(component_dict)
+                    self.component_store.release_ports(component_dict['id'])
                     self.logger.debug(f"terminated: {component_dict.get('id')}")
 
+    def _mark_stopping(self, component_dict: ComponentTypedDict) -> None:
+        if self.cli_inputs.namespace == NameSpace.STOP:
+            self.component_store.append_event(component_dict['id'],
+                component_dict['component_type'], ComponentEvent.STOPPING,
+                pid=component_dict['pid'])
+
     def get_component_datadir(self, component_name: str) -> Tuple[Path, str]:
         """Used for multi-instance components"""
         assert self.config.DATADIR is not None
@@ -128,95 +197,209 @@ class PluginTools:
         self.logger.debug(f"data dir = {new_dir}")
         return new_dir, id
 
+    def allocate_datadirs_and_ids(self, count: int) -> List[Tuple[Path, str]]:
+        """For batches of new instances (see: start --count) - the same as 'count' calls of
+        get_component_datadir() with --new (but the DATADIR is only walked once)"""
+        assert self.config.DATADIR is not None
+        component_name = self.plugin.COMPONENT_NAME
+        component_dir = self.config.DATADIR.joinpath(component_name)
+        os.makedirs(component_dir, exist_ok=True)
+        existing_ids = set(os.listdir(component_dir))
+
+        allocations: List[Tuple[Path, str]] = []
+        number = 1
+        while len(allocations) < count:
+            id = component_name + str(number)
+            number += 1
+            if id in existing_ids:
+                continue
+            new_dir = component_dir.joinpath(id)
+            try:
+                os.mkdir(new_dir)
+            except FileExistsError:  # claimed by a concurrent 'start --new'
+                continue
+            allocations.append((new_dir, id))
+        self.logger.debug(f"data dirs = {[str(new_dir) for new_dir, _id in allocations]}")
+        return allocations
+
+    def get_all_reserved_ports(self) -> Set[int]:
+        """reserved ports are read from each plugin's manifest. Only plugins without a manifest
+        need to be imported to access RESERVED_PORTS as a class attribute."""
+        reserved_ports: Set[int] = set()
+        for component_name in self.component_store.component_map:
+            plugin_reserved_ports = self.get_reserved_ports(component_name)
+            if plugin_reserved_ports:
+                reserved_ports.update(plugin_reserved_ports)
+        return reserved_ports
+
+    def get_reserved_ports(self, component_name: str) -> Optional[Set[int]]:
+        plugin_reserved_ports = self.component_store.plugin_registry.get_reserved_ports(
+            component_name)
+        if plugin_reserved_ports is not None:
+            return set(plugin_reserved_ports)
+        try:
+            component_module = self.component_store.import_plugin_module(component_name)
+            # avoids instantiation by accessing RESERVED_PORTS as a class attribute
+            return set(component_module.Plugin.RESERVED_PORTS)
+        except AttributeError:
+            self.logger.error(f"plugin: {component_name} does not have a Plugin class "
+                f"with the 'RESERVED_PORTS' class attribute - therefore the port clash "
+                f"check has been skipped")
+            return None
+
     def port_clash_check_ok(self) -> bool:
         reserved_ports: Set[int] = set()
         reserved_ports_list: List[int] = []
         for component_name in self.component_store.component_map:
-            try:
-                component_module = self.component_store.import_plugin_module(component_name)
-                # avoids instantiation by accessing RESERVED_PORTS as a class attribute
-                for port in component_module.Plugin.RESERVED_PORTS:
-                    reserved_ports.add(port)
-                    reserved_ports_list.append(port)
-
-                if len(reserved_ports) != len(reserved_ports_list):
-                    self.logger.exception(
-                        f"There is a conflict of reserved ports for component_module: "
-                        f"{component_module} on ports: {component_module.Plugin.RESERVED_PORTS}. "
-                        f"Please choose default ports for the plugin that do not clash.")
-                    return False
-            except AttributeError:
-                self.logger.error(f"plugin: {component_name} does not have a Plugin class with "
-                    f"the 'RESERVED_PORTS' class attribute - therefore the port clash check has "
-                    f"been skipped")
+            plugin_reserved_ports = self.get_reserved_ports(component_name)
+            if plugin_reserved_ports is None:
+                continue
+
+            for port in plugin_reserved_ports:
+                reserved_ports.add(port)
+                reserved_ports_list.append(port)
+
+            if len(reserved_ports) != len(reserved_ports_list):
+                self.logger.exception(
+                    f"There is a conflict of reserved ports for plugin: {component_name} on "
+                    f"ports: {plugin_reserved_ports}. Please choose default ports for the plugin "
+                    f"that do not clash.")
+                return False
         return True
 
     def get_component_port(self, default_component_port: int, component_name: str,
             component_id: str) -> int:
         """ensure that no other plugin uses any of the default ports as they are strictly
         reserved for the default component ids."""
-        if not self.port_clash_check_ok():
-            return sys.exit(1)
-
-        # reserved ports
-        if is_default_component_id(component_name, component_id):
-            assert not port_is_in_use(default_component_port), \
-                f"an unknown application is using this port: {default_component_port}"
-            return default_component_port
-
-        # a non-default component id -> unreserved + unused ports only
-        port = default_component_port + 10
-        while True:
-            if port_is_in_use(port):
-                port += 10
-            else:
-                break
-        return port
+        purpose = "port"  # the same purpose as in the manifests (see: default_ports)
+        return self.allocate_ports({purpose: default_component_port}, component_name,
+            component_id)[purpose]
 
     def is_component_running_http(self, status_endpoint: str, retries:
             int=6, duration: float=1.0, timeout: float=0.5, http_method: str='get',
             payload: Optional[Dict[Any, Any]]=None, component_name: Optional[str]=None,
             verify_ssl: bool=False) -> bool:
-
+        """kept for user-defined plugins - 'retries * duration' is now only used as the deadline
+        (see: wait_until_ready)"""
         if not component_name and self.plugin.component_info:
             component_name = self.plugin.component_info.component_type
         elif not component_name and not self.plugin.component_info:
             raise Exception(f"Unknown component_name")
 
-        for sleep_time in [duration] * retries:
-            self.logger.debug(f"Polling {component_name}...")
-            try:
-                result = getattr(requests, http_method)(status_endpoint, timeout=timeout,
-                    data=payload, verify=verify_ssl)
-                result.raise_for_status()
-                return True
-            except Exception as e:
-                pass
+        self.logger.debug(f"Polling {component_name}...")
+        probe = HttpProbe(status_endpoint, method=http_method,
+            payload=payload, timeout=timeout,
+            verify_ssl=verify_ssl)
+        if readiness.wait_until_ready([probe], deadline=max(retries * duration, timeout)) is None:
+            return False
+        if self.plugin.id:
+            assert component_name is not None  # typing bug
+            self.component_store.append_event(self.plugin.id, component_name,
+                ComponentEvent.READY)
+        return True
 
-            time.sleep(sleep_time)
-        return False
+    def is_spawned_process_failed(self) -> bool:
+        """the process that was spawned by spawn_process() has already exited with an error"""
+        if self.plugin.id is None or self.start_seq is None:
+            return False
+        return any(event['event'] == ComponentEvent.FAILED for event in
+            self.component_store.get_events(since_seq=self.start_seq,
+                component_id=self.plugin.id))
+
+    def wait_until_ready(self, probes: Sequence[ReadinessProbe],
+            deadline: float=readiness.DEFAULT_DEADLINE) -> bool:
+        """Blocks until all probes succeed for the process spawned by spawn_process(). The time
+        from spawning the process until it was ready is recorded in the component's metadata as
+        'time_to_ready' and a 'ready' event is journaled. Returns early (False) if the process
+        exits with an error in the meantime."""
+        assert self.plugin.id is not None  # typing bug
+        elapsed = readiness.wait_until_ready(probes, deadline,
+            should_abort=self.is_spawned_process_failed)
+        if elapsed is None:
+            if self.is_spawned_process_failed():
+                self.logger.error(f"{self.plugin.id} exited before it was ready")
+            else:
+                self.logger.error(f"{self.plugin.id} was not ready after {deadline} seconds")
+            return False
+
+        time_to_ready = time.time() - self.spawn_time if self.spawn_time else elapsed
+        self.component_store.update_metadata(self.plugin.id,
+            ComponentMetadata(time_to_ready=round(time_to_ready, 3)))
+        self.component_store.append_event(self.plugin.id, self.plugin.COMPONENT_NAME,
+            ComponentEvent.READY)
+        self.logger.info(f"{self.plugin.id} is ready ({time_to_ready:.2f} seconds)")
+        return True
 
     def spawn_process(self, command: str, env_vars: Dict[str, str], id: str, component_name: str,
             src: Optional[Path]=None, logfile: Optional[Path]=None,
             status_endpoint: Optional[str]=None,
-            metadata: Optional[ComponentMetadata]=None) -> None:
-
+            metadata: Optional[ComponentMetadata]=None, cwd: Optional[Path]=None) -> None:
+        """'cwd' is the working directory of the spawned process. Plugins must not os.chdir()
+        because components can be started concurrently (see: Controller.start_all)"""
         if not env_vars:
             env_vars = {}
 
         assert isinstance(command, str)
-        if self.cli_inputs.background_flag:
-            spawn_background_supervised(command, env_vars, id, component_name, src, logfile,
-                status_endpoint, metadata)
-        elif self.cli_inputs.inline_flag:
-            spawn_inline(command, env_vars, id, component_name, src, logfile,
-                status_endpoint, metadata)
-        elif self.cli_inputs.new_terminal_flag:
-            spawn_new_terminal(command, env_vars, id, component_name, src, logfile,
-                status_endpoint, metadata)
-        else:  # default
-            spawn_new_terminal(command, env_vars, id, component_name, src, logfile,
-                status_endpoint, metadata)
+        self.start_seq = self.component_store.append_event(id, component_name,
+            ComponentEvent.STARTING) - 1
+        self.spawn_time = time.time()
+        self.status_endpoint = status_endpoint
+        cpu_affinity, cpu_layout = self.get_cpu_affinity(id, component_name)
+        if cpu_affinity:
+            metadata = cast(ComponentMetadata, {**(metadata or {}),
+                'cpu_affinity': format_cpu_list(cpu_affinity), 'cpu_layout': cpu_layout})
+            self.logger.debug(f"{id} is pinned to cpus: {format_cpu_list(cpu_affinity)} "
+                f"({cpu_layout})")
+        try:
+            if self.cli_inputs.background_flag:
+                restart_policy = RestartPolicyTypedDict(policy=self.cli_inputs.restart_policy,
+                    max_restarts=self.cli_inputs.max_restarts)
+                resource_limits = None
+                if self.cli_inputs.cgroup_flag and is_cgroup_v2_supported():
+                    resource_limits = get_resource_limits(component_name, id,
+                        self.component_store.plugin_registry.get_resource_limits(component_name),
+                        self.config)
+                # the supervisor pins each (re)spawn of the component
+                spawn_background_supervised(command, env_vars, id, component_name, src, logfile,
+                    status_endpoint, metadata, cwd, restart_policy, resource_limits,
+                    cpu_affinity)
+            else:
+                with pinned_to(cpu_affinity):
+                    if self.cli_inputs.inline_flag:
+                        spawn_inline(command, env_vars, id, component_name, src, logfile,
+                            status_endpoint, metadata, cwd)
+                    else:  # new terminal (default)
+                        spawn_new_terminal(command, env_vars, id, component_name, src, logfile,
+                            status_endpoint, metadata, cwd)
+        finally:
+            # the cpus are recorded in the metadata of the component by now
+            release_cpus(id)
+
+    def get_cpu_affinity(self, id: str, component_name: str) -> Tuple[Optional[List[int]], str]:
+        """(cpus, layout) - the cpus of --cpus or of the plugin's manifest or else those chosen
+        by --cpu-layout=auto (None if the component is not pinned)"""
+        if not is_cpu_affinity_supported():
+            return None, ""
+        if self.cli_inputs.cpus:
+            return parse_cpu_list(self.cli_inputs.cpus), CPU_LAYOUT_MANUAL
+
+        manifest_affinity = self.component_store.plugin_registry.get_cpu_affinity(component_name)
+        if manifest_affinity.get('cpus'):
+            try:
+                return validate_cpus(parse_cpu_list(manifest_affinity['cpus'])), \
+                    CPU_LAYOUT_MANUAL
+            except ValueError as e:
+                self.logger.warning(f"ignoring the cpu_affinity of the {component_name} "
+                    f"manifest: {e}")
+
+        if self.cli_inputs.cpu_layout == CPU_LAYOUT_AUTO:
+            running_cpus = {component_id: parse_cpu_list(component_dict['metadata']['cpu_affinity'])
+                for component_id, component_dict in self.component_store.get_status().items()
+                if component_dict['component_state'] == ComponentState.RUNNING
+                and component_dict['metadata'] and component_dict['metadata'].get('cpu_affinity')}
+            return reserve_cpus(id, manifest_affinity.get('cores', 1), running_cpus), \
+                CPU_LAYOUT_AUTO
+        return None, ""
 
     def get_default_id(self, component_name: str) -> str:
         return component_name + str(1)
@@ -0,0 +1,286 @@
+"""
+Readiness probes - a component is 'ready' once it is actually serving requests (which can be
+long after its process was spawned and the component_state was set to 'Running').
+
+Each probe makes a single non-blocking attempt via `check()`. `wait_for_probes` runs all probes
+of a component concurrently and retries each of them with exponential backoff and full jitter
+until they have all succeeded or the deadline has passed. Starting with a very short backoff
+means that a component which comes up quickly is detected almost immediately while one that
+takes a long time is not hammered with requests.
+
+Probe types:
+    HttpProbe       - any http status < 400 (credentials can be given in the url)
+    JsonRpcProbe    - a json-rpc call succeeds (e.g. the node rejects calls while warming up)
+    TcpProbe        - a tcp connection is accepted
+    PostgresProbe   - postgres executes 'SELECT 1'
+    LogLineProbe    - a line matching the pattern is written to the logfile
+    CallableProbe   - any (cheap) synchronous predicate
+
+aiohttp and asyncpg are only imported by the probes that need them (and asyncio only once a probe
+is awaited) so that importing this module does not slow down the cli.
+"""
+import base64
+import concurrent.futures
+import json
+import logging
+from pathlib import Path
+import random
+import re
+import typing
+from typing import Any, Callable, Dict, Iterator, List, Optional, Pattern, Sequence, Union
+
+if typing.TYPE_CHECKING:
+    import asyncio
+
+logger = logging.getLogger("readiness")
+
+DEFAULT_DEADLINE = 60.0
+INITIAL_BACKOFF = 0.05
+MAX_BACKOFF = 0.5
+BACKOFF_MULTIPLIER = 2.0
+
+
+def iter_backoff_delays(initial: float=INITIAL_BACKOFF, maximum: float=MAX_BACKOFF) \
+        -> Iterator[float]:
+    """exponential backoff with 'full jitter' - spreads out the retries of many probes (and many
+    components) rather than having them all fire in lockstep"""
+    backoff = initial
+    while True:
+        yield random.uniform(0, backoff)
+        backoff = min(backoff * BACKOFF_MULTIPLIER, maximum)
+
+
+class ReadinessProbe:
+
+    async def check(self) -> bool:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class HttpProbe(ReadinessProbe):
+
+    def __init__(self, url: str, method: str='GET',
+            payload: Optional[Union[str, bytes, Dict[Any, Any]]]=None,
+            headers: Optional[Dict[str, str]]=None, timeout: float=2.0,
+            verify_ssl: bool=False) -> None:
+        self.url = url
+        self.method = method.upper()
+        self.payload = payload
+        self.headers = headers
+        self.timeout = timeout
+        self.verify_ssl = verify_ssl
+        self.session: Optional[Any] = None  # aiohttp.ClientSession (bound to the event loop)
+
+    def __repr__(self) -> str:
+        return f"HttpProbe({self.method} {self.url})"
+
+    def is_ready(self, status: int, body: bytes) -> bool:
+        return status < 400
+
+    async def check(self) -> bool:
+        import asyncio
+        import aiohttp
+
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        try:
+            async with self.session.request(self.method, self.url, data=self.payload,
+                    headers=self.headers, ssl=None if self.verify_ssl else False) as response:
+                body = await response.read()
+                return self.is_ready(response.status, body)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+            return False
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class JsonRpcProbe(HttpProbe):
+    """the node accepts connections long before it will serve rpc calls (it returns error -28
+    'Loading block index...' while warming up) so only a successful call counts"""
+
+    def __init__(self, url: str, method: str='getblockchaininfo',
+            params: Optional[List[Any]]=None, rpcuser: Optional[str]=None,
+            rpcpassword: Optional[str]=None, timeout: float=2.0) -> None:
+        headers = {'Content-Type': 'application/json'}
+        if rpcuser is not None:
+            credentials = base64.b64encode(f"{rpcuser}:{rpcpassword or ''}".encode('utf-8'))
+            headers['Authorization'] = f"Basic {credentials.decode()}"
+        payload = json.dumps({"jsonrpc": "1.0", "id": "readiness", "method": method,
+            "params": params if params is not None else []})
+        super().__init__(url, method='POST', payload=payload, headers=headers, timeout=timeout)
+        self.rpc_method = method
+
+    def __repr__(self) -> str:
+        return f"JsonRpcProbe({self.rpc_method} {self.url})"
+
+    def is_ready(self, status: int, body: bytes) -> bool:
+        if status >= 400:
+            return False
+        try:
+            return json.loads(body).get('error') is None
+        except ValueError:
+            return False
+
+
+class TcpProbe(ReadinessProbe):
+
+    def __init__(self, host: str, port: int, timeout: float=2.0) -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def __repr__(self) -> str:
+        return f"TcpProbe({self.host}:{self.port})"
+
+    async def check(self) -> bool:
+        import asyncio
+
+        try:
+            _reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout)
+        except (asyncio.TimeoutError, OSError):
+            return False
+        writer.close()
+        return True
+
+
+class PostgresProbe(ReadinessProbe):
+
+    def __init__(self, host: str, port: int, user: str, password: str,
+            database: str='postgres', timeout: float=2.0) -> None:
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.database = database
+        self.timeout = timeout
+
+    def __repr__(self) -> str:
+        return f"PostgresProbe({self.host}:{self.port}/{self.database})"
+
+    async def check(self) -> bool:
+        import asyncio
+        import asyncpg
+
+        try:
+            pg_conn = await asyncpg.connect(host=self.host, port=self.port, user=self.user,
+                password=self.password, database=self.database, timeout=self.timeout)
+        except (asyncio.TimeoutError, OSError, asyncpg.PostgresError,
+                asyncpg.InterfaceError) as e:
+            logger.debug(f"{self!r}: {e}")
+            return False
+        try:
+            return await pg_conn.fetchval("SELECT 1") == 1
+        except asyncpg.PostgresError:
+            return False
+        finally:
+            await pg_conn.close()
+
+
+class LogLineProbe(ReadinessProbe):
+    """only reads what was appended to the logfile since the previous check"""
+
+    def __init__(self, logfile: Union[str, Path], pattern: Union[str, Pattern[str]]) -> None:
+        self.logfile = Path(logfile)
+        self.pattern = re.compile(pattern) if isinstance(pattern, str) else pattern
+        self.offset = 0
+        self.partial_line = ""
+
+    def __repr__(self) -> str:
+        return f"LogLineProbe({self.pattern.pattern!r} in {self.logfile})"
+
+    async def check(self) -> bool:
+        try:
+            with open(self.logfile, 'r', errors='replace') as f:
+                f.seek(self.offset)
+                text = f.read()
+                self.offset = f.tell()
+        except FileNotFoundError:
+            return False
+
+        lines = (self.partial_line + text).split("\n")
+        self.partial_line = lines.pop()
+        return any(self.pattern.search(line) for line in lines)
+
+
+class CallableProbe(ReadinessProbe):
+
+    def __init__(self, predicate: Callable[[], bool], name: str="callable") -> None:
+        self.predicate = predicate
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"CallableProbe({self.name})"
+
+    async def check(self) -> bool:
+        return self.predicate()
+
+
+async def _wait_for_probe(probe: ReadinessProbe, deadline_at: float,
+        should_abort: Optional[Callable[[], bool]], aborted: "asyncio.Event") -> bool:
+    import asyncio
+    loop = asyncio.get_running_loop()
+    for delay in iter_backoff_delays():
+        remaining = deadline_at - loop.time()
+        if remaining <= 0 or aborted.is_set():
+            return False
+        try:
+            # a hanging check must not overrun the deadline
+            if await asyncio.wait_for(probe.check(), remaining):
+                logger.debug(f"{probe!r} succeeded")
+                return True
+        except asyncio.TimeoutError:
+            return False
+
+        if should_abort is not None and should_abort():
+            aborted.set()
+            return False
+        await asyncio.sleep(min(delay, max(deadline_at - loop.time(), 0)))
+    return False  # unreachable
+
+
+async def wait_for_probes(probes: Sequence[ReadinessProbe], deadline: float=DEFAULT_DEADLINE,
+        should_abort: Optional[Callable[[], bool]]=None) -> Optional[float]:
+    """Returns the number of seconds it took for all probes to succeed or None if they did not
+    all succeed within 'deadline' seconds (or 'should_abort' returned True - e.g. the component
+    has already exited)."""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+    aborted = asyncio.Event()
+    try:
+        results = await asyncio.gather(*[_wait_for_probe(probe, started_at + deadline,
+            should_abort, aborted) for probe in probes])
+    finally:
+        await asyncio.gather(*[probe.close() for probe in probes], return_exceptions=True)
+
+    if all(results):
+        return loop.time() - started_at
+    for probe, result in zip(probes, results):
+        if not result:
+            logger.debug(f"{probe!r} did not succeed")
+    return None
+
+
+def wait_until_ready(probes: Sequence[ReadinessProbe], deadline: float=DEFAULT_DEADLINE,
+        should_abort: Optional[Callable[[], bool]]=None) -> Optional[float]:
+    """Blocking version of wait_for_probes() (for plugins which are synchronous). It blocks the
+    calling thread - and so also the event loop if it is called from a coroutine, which must await
+    wait_for_probes() instead."""
+    import asyncio
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(wait_for_probes(probes, deadline, should_abort))
+
+    # asyncio.run() cannot be nested -> the probes run on their own loop in a worker thread (the
+    # caller's event loop is still blocked until they are done)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run,
+            wait_for_probes(probes, deadline, should_abort)).result()
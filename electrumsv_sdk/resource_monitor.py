@@ -0,0 +1,269 @@
+"""
+Resource usage sampling for running components (see: `electrumsv-sdk top`).
+
+Each sample aggregates the cpu%, rss, cumulative i/o bytes, open file descriptors and threads over
+the whole process tree of a component (e.g. the node or a component started via a shell script).
+The samples of each component are kept in a fixed-capacity ring buffer that stores every field
+column-wise as an array of doubles - an hour of samples at one per second is ~250KiB per
+component. The time series can be exported as json for later analysis (e.g. of a load test).
+
+psutil is only imported when sampling (it is not needed to parse the cli).
+"""
+from array import array
+import json
+import logging
+from pathlib import Path
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, TypedDict, Union, cast
+
+from .components import ComponentStore, ComponentTypedDict
+from .constants import ComponentState
+
+logger = logging.getLogger("resource-monitor")
+
+DEFAULT_SAMPLE_INTERVAL = 1.0
+DEFAULT_CAPACITY = 3600  # samples per component
+
+
+class ResourceSampleTypedDict(TypedDict):
+    timestamp: float
+    cpu_percent: float  # summed over the process tree (can exceed 100% on multi-core machines)
+    rss: int  # bytes
+    read_bytes: int  # cumulative
+    write_bytes: int  # cumulative
+    num_fds: int  # file descriptors (handles on windows)
+    num_threads: int
+    num_processes: int
+
+
+SAMPLE_FIELDS = list(ResourceSampleTypedDict.__annotations__)
+FLOAT_FIELDS = {'timestamp', 'cpu_percent'}
+
+
+class ResourceRingBuffer:
+    """fixed-capacity time series - the oldest samples are overwritten once it is full"""
+
+    def __init__(self, capacity: int=DEFAULT_CAPACITY) -> None:
+        assert capacity > 0
+        self.capacity = capacity
+        self.columns: Dict[str, array] = {field: array('d', [0.0]) * capacity
+            for field in SAMPLE_FIELDS}
+        self.start = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, sample: ResourceSampleTypedDict) -> None:
+        index = (self.start + self.size) % self.capacity
+        sample_dict = cast(Dict[str, float], sample)
+        for field in SAMPLE_FIELDS:
+            self.columns[field][index] = sample_dict[field]
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def get(self, position: int) -> ResourceSampleTypedDict:
+        """0 is the oldest sample and -1 is the latest"""
+        if position < 0:
+            position += self.size
+        if not 0 <= position < self.size:
+            raise IndexError(position)
+        index = (self.start + position) % self.capacity
+        return cast(ResourceSampleTypedDict, {field: self.columns[field][index]
+            if field in FLOAT_FIELDS else int(self.columns[field][index])
+            for field in SAMPLE_FIELDS})
+
+    def latest(self) -> Optional[ResourceSampleTypedDict]:
+        return self.get(-1) if self.size else None
+
+    def __iter__(self) -> Iterator[ResourceSampleTypedDict]:
+        for position in range(self.size):
+            yield self.get(position)
+
+
+class ProcessTreeSampler:
+    """psutil only reports a meaningful cpu_percent() for a process that it has seen before so
+    the psutil.Process instances are cached between samples"""
+
+    def __init__(self) -> None:
+        self.processes: Dict[int, Any] = {}  # {pid: psutil.Process}
+
+    def _get_cached(self, process: Any) -> Any:
+        cached = self.processes.get(process.pid)
+        # psutil compares the creation time too (i.e. a recycled pid is a different process)
+        if cached is None or cached != process:
+            self.processes[process.pid] = cached = process
+        return cached
+
+    def sample_tree(self, root_pid: int, seen_pids: Optional[Set[int]]=None) \
+            -> Optional[ResourceSampleTypedDict]:
+        """None if the root process no longer exists"""
+        import psutil
+
+        try:
+            root = self._get_cached(psutil.Process(root_pid))
+            tree = [root] + [self._get_cached(child) for child in root.children(recursive=True)]
+        except psutil.NoSuchProcess:
+            return None
+
+        sample = ResourceSampleTypedDict(timestamp=time.time(), cpu_percent=0.0, rss=0,
+            read_bytes=0, write_bytes=0, num_fds=0, num_threads=0, num_processes=0)
+        for process in tree:
+            try:
+                with process.oneshot():
+                    sample['cpu_percent'] += process.cpu_percent(None)
+                    sample['rss'] += process.memory_info().rss
+                    sample['num_threads'] += process.num_threads()
+                    if sys.platform == 'win32':
+                        sample['num_fds'] += process.num_handles()
+                    else:
+                        sample['num_fds'] += process.num_fds()
+                    # not supported on macos and requires privileges for other users' processes
+                    if hasattr(process, 'io_counters'):
+                        try:
+                            io_counters = process.io_counters()
+                            sample['read_bytes'] += io_counters.read_bytes
+                            sample['write_bytes'] += io_counters.write_bytes
+                        except psutil.AccessDenied:
+                            pass
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue  # exited (or became inaccessible) since the tree was listed
+            sample['num_processes'] += 1
+            if seen_pids is not None:
+                seen_pids.add(process.pid)
+        return sample
+
+    def prune(self, seen_pids: Set[int]) -> None:
+        for pid in set(self.processes) - seen_pids:
+            del self.processes[pid]
+
+
+class ResourceMonitor:
+    """samples all running components (or only 'component_id') every 'interval' seconds"""
+
+    def __init__(self, interval: float=DEFAULT_SAMPLE_INTERVAL, capacity: int=DEFAULT_CAPACITY,
+            component_id: str="") -> None:
+        self.interval = interval
+        self.capacity = capacity
+        self.component_id = component_id
+        self.component_store = ComponentStore()
+        self.sampler = ProcessTreeSampler()
+        self.series: Dict[str, ResourceRingBuffer] = {}
+        self.components: Dict[str, ComponentTypedDict] = {}
+
+    def get_running_components(self) -> Dict[str, ComponentTypedDict]:
+        components = self.component_store.get_status(component_id=self.component_id or None)
+        return {component_id: component_dict for component_id, component_dict
+            in components.items() if component_dict['pid'] is not None
+            and component_dict['component_state'] == ComponentState.RUNNING}
+
+    def sample(self, record: bool=True) -> Dict[str, ResourceSampleTypedDict]:
+        samples: Dict[str, ResourceSampleTypedDict] = {}
+        seen_pids: Set[int] = set()
+        for component_id, component_dict in self.get_running_components().items():
+            assert component_dict['pid'] is not None  # typing bug
+            sample = self.sampler.sample_tree(component_dict['pid'], seen_pids)
+            if sample is None:
+                continue
+            samples[component_id] = sample
+            if record:
+                self.components[component_id] = component_dict
+                if component_id not in self.series:
+                    self.series[component_id] = ResourceRingBuffer(self.capacity)
+                self.series[component_id].append(sample)
+        self.sampler.prune(seen_pids)
+        return samples
+
+    def run(self, count: Optional[int]=None,
+            on_sample: Optional[Callable[[Dict[str, ResourceSampleTypedDict]], None]]=None) \
+            -> None:
+        """samples until 'count' samples were taken (or forever). The first (unrecorded) sample
+        only establishes the baseline for the cpu percentages."""
+        self.sample(record=False)
+        next_sample_at = time.monotonic() + self.interval
+        taken = 0
+        while count is None or taken < count:
+            time.sleep(max(next_sample_at - time.monotonic(), 0))
+            # the schedule does not drift by the time it takes to sample
+            next_sample_at += self.interval
+            samples = self.sample()
+            taken += 1
+            if on_sample is not None:
+                on_sample(samples)
+
+    def get_io_rates(self, component_id: str) -> Optional[Dict[str, float]]:
+        """bytes per second between the two latest samples"""
+        series = self.series.get(component_id)
+        if series is None or len(series) < 2:
+            return None
+        previous, latest = series.get(-2), series.get(-1)
+        elapsed = latest['timestamp'] - previous['timestamp']
+        if elapsed <= 0:
+            return None
+        # the counters go backwards when a process in the tree exits
+        return {
+            'read_bytes': max(latest['read_bytes'] - previous['read_bytes'], 0) / elapsed,
+            'write_bytes': max(latest['write_bytes'] - previous['write_bytes'], 0) / elapsed,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "components": {component_id: {
+                "component_type": self.components[component_id]['component_type'],
+                "pid": self.components[component_id]['pid'],
+                "samples": list(series),
+            } for component_id, series in self.series.items()},
+        }
+
+    def export_json(self, path: Union[str, Path]) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def format_bytes(num_bytes: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if num_bytes < 1024:
+            return f"{num_bytes:.1f}{unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f}TiB"
+
+
+def format_top_table(monitor: ResourceMonitor, samples: Dict[str, ResourceSampleTypedDict]) \
+        -> str:
+    """the latest samples - busiest component first"""
+    header = f"{'ID':<24}{'TYPE':<20}{'PID':>8}{'PROCS':>7}{'CPU%':>8}{'RSS':>11}" \
+        f"{'READ/s':>11}{'WRITE/s':>11}{'FDS':>6}{'THREADS':>9}"
+    lines: List[str] = [header]
+    for component_id, sample in sorted(samples.items(), key=lambda item: -item[1]['cpu_percent']):
+        component_dict = monitor.components[component_id]
+        io_rates = monitor.get_io_rates(component_id)
+        read_rate = format_bytes(io_rates['read_bytes']) if io_rates else "-"
+        write_rate = format_bytes(io_rates['write_bytes']) if io_rates else "-"
+        lines.append(f"{component_id:<24}{component_dict['component_type']:<20}"
+            f"{component_dict['pid']:>8}{sample['num_processes']:>7}"
+            f"{sample['cpu_percent']:>8.1f}{format_bytes(sample['rss']):>11}"
+            f"{read_rate:>11}{write_rate:>11}{sample['num_fds']:>6}{sample['num_threads']:>9}")
+    if not samples:
+        lines.append("no running components")
+    return "\n".join(lines)
+
+
+def run_top_view(monitor: ResourceMonitor, count: Optional[int]=None) -> None:
+    """redraws the table in place if stdout is a terminal (otherwise each table is appended)"""
+    redraw = sys.stdout.isatty()
+    if redraw and sys.platform == 'win32':
+        import colorama
+        colorama.init()
+
+    def on_sample(samples: Dict[str, ResourceSampleTypedDict]) -> None:
+        if redraw:
+            sys.stdout.write("\033[H\033[J")
+        sys.stdout.write(time.strftime("%H:%M:%S") + f" (every {monitor.interval}s)"
+            + "\n" + format_top_table(monitor, samples) + "\n\n")
+        sys.stdout.flush()
+
+    monitor.run(count, on_sample)
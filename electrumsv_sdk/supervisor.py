@@ -0,0 +1,787 @@
+"""
+Optional long-lived supervisor daemon.
+
+Every `electrumsv-sdk` invocation is otherwise a fresh python process which has to re-import the
+SDK, rebuild the Config, reload the plugin registry and reopen the component store. The supervisor
+keeps all of this warm in a single process and listens on a unix domain socket in SDK_HOME_DIR.
+While it is running, the cli forwards start, stop, reset, node and status commands to it
+(see: supervisor_client.py) so there is also a single process that owns the handles of the
+spawned child processes.
+
+While it is running, background components are spawned by the supervisor itself (it is only
+started on demand for this if 'supervisor_autostart' is enabled in config.json) and it records
+their exit codes in the component store as soon as they exit. The children are
+watched via a pidfd on linux or else via SIGCHLD - this replaces one run_background.py wrapper
+process (i.e. a python interpreter) per background component.
+
+The supervisor also enforces the restart policy of each background component (see: RestartPolicy).
+An exit that was not requested via the SDK (there is no 'stopping' event in the journal) is
+followed by a restart with exponential backoff until 'max_restarts' consecutive restarts have
+failed to keep the component running for RESTART_STABLE_PERIOD seconds. The number of restarts
+and the time it took to become ready again are recorded in the component's metadata.
+
+The output of each background component is read from a pipe on the event loop and written to its
+logfile with size and time based rotation (see: log_rotation.py). Rotated segments are compressed
+and old logs are removed in a worker thread so that the pipes are always drained promptly. The
+supervisor refuses to stop while background components are running unless it is forced to (or
+receives SIGTERM) and then hands the pipes over to a log relay process (see: log_relay.py) so that
+the components are not killed by SIGPIPE.
+
+Components that were started with `--cgroup` are placed in their own cgroup v2 slice with the
+configured cpu, memory and i/o limits (see: cgroups.py). The slice is created before the first
+spawn, reused by restarts and removed once the component has exited for good. The status of the
+supervisor includes the cpu and memory usage of every slice.
+
+Protocol: one newline-delimited json request and response per connection:
+
+    {"type": "ping"} -> {"pid": ..., "uptime": ..., "requests_handled": ..., ...}
+    {"type": "shutdown", "force": false} -> {"ok": true} (or {"refused": "..."})
+    {"type": "command", "argv": [...], "cwd": "...", "env": {...}}
+        -> {"stdout": "<line>"} and {"stderr": "<line>"} as the command writes its output, then
+        {"exit_code": 0} (or only {"refused": "..."} if the client has to execute it itself)
+    {"type": "spawn", "component": {...}, "command": "...", "cwd": "...", "env": {...},
+        "restart_policy": {"policy": "on-failure", "max_restarts": 5}} -> {"pid": ...}
+
+Commands are executed one at a time because they temporarily take over the process-wide
+working directory and environment variables of the supervisor. What the threads of a command
+write to stdout / stderr (and the log records of these threads) is streamed back to the client
+line by line while the supervisor's own threads keep writing to the supervisor's log.
+
+The SDK and its plugins read many settings from the environment when a module is first
+imported (e.g. BITCOIN_NETWORK or NODE_PORT) and these modules stay loaded in the supervisor, so
+a command is only executed if the client's environment is the one that the supervisor was
+started with (apart from IGNORED_ENVIRONMENT_VARIABLES). Otherwise it is refused and the client
+executes it itself.
+
+Start it with: `electrumsv-sdk supervisor start`
+"""
+import asyncio
+import concurrent.futures
+import functools
+import io
+import json
+import logging
+import os
+from pathlib import Path
+import signal
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional, TextIO, cast
+
+from .app_state import AppState
+from .cgroups import CgroupError, ComponentCgroup
+from .components import Component, ComponentTypedDict, ComponentStore, ComponentMetadata
+from .config import Config
+from .constants import ComponentEvent, ComponentState, LOG_LEVEL, RestartPolicy
+from .log_relay import RelayedOutputTypedDict
+from .log_rotation import RotatingLogWriter, apply_retention
+from .plugin_registry import PluginRegistry
+from .readiness import HttpProbe, wait_for_probes
+from .supervisor_client import get_socket_path, get_supervisor_status, FORWARDED_NAMESPACES, \
+    SpawnRequestTypedDict
+from . import utils
+
+logger = logging.getLogger("supervisor")
+
+LOG_FORMAT = '%(asctime)s %(levelname)-8s %(name)-24s %(message)s'
+LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# the environment can be large so the default 64KiB line limit of asyncio is not enough
+MAX_REQUEST_SIZE = 16 * 1024 * 1024
+
+OUTPUT_READ_SIZE = 65536
+
+RESTART_INITIAL_BACKOFF = 1.0
+RESTART_MAX_BACKOFF = 60.0
+# a component that stays up for this long is considered to be stable again (i.e. the backoff and
+# the count of consecutive restarts start over)
+RESTART_STABLE_PERIOD = 60.0
+RECOVERY_TIMEOUT = 60.0
+
+COMPRESSION_THREAD_NAME_PREFIX = "log-compression"
+
+# set per shell invocation - they do not affect the SDK (see: SupervisorServer.run_command)
+IGNORED_ENVIRONMENT_VARIABLES = {"_", "PWD", "OLDPWD", "SHLVL"}
+
+
+class ChildWatcher:
+    """Calls 'on_exit(process)' on the event loop as soon as a child process exits (and reaps it).
+    A pidfd (linux >= 5.3) makes each child's exit an event on the loop's selector. Otherwise
+    every SIGCHLD checks the watched processes for one that has exited."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self.processes: Dict[int, subprocess.Popen] = {}
+        self.callbacks: Dict[int, Callable[[subprocess.Popen], None]] = {}
+        self.pidfds: Dict[int, int] = {}
+        self.use_pidfd = hasattr(os, 'pidfd_open')
+        self.sigchld_installed = False
+
+    def watch(self, process: subprocess.Popen,
+            on_exit: Callable[[subprocess.Popen], None]) -> None:
+        """must be called on the event loop thread"""
+        self.processes[process.pid] = process
+        self.callbacks[process.pid] = on_exit
+        if self.use_pidfd:
+            try:
+                pidfd = os.pidfd_open(process.pid)
+            except OSError:
+                # the syscall is not supported by older kernels
+                self.use_pidfd = False
+            else:
+                self.pidfds[process.pid] = pidfd
+                self.loop.add_reader(pidfd, self._on_exit, process.pid)
+                return
+
+        if not self.sigchld_installed:
+            self.loop.add_signal_handler(signal.SIGCHLD, self._on_sigchld)
+            self.sigchld_installed = True
+        # the child may have exited before it was watched
+        self._on_sigchld()
+
+    def _on_sigchld(self) -> None:
+        for pid, process in list(self.processes.items()):
+            if pid not in self.pidfds and process.poll() is not None:
+                self._on_exit(pid)
+
+    def _on_exit(self, pid: int) -> None:
+        pidfd = self.pidfds.pop(pid, None)
+        if pidfd is not None:
+            self.loop.remove_reader(pidfd)
+            os.close(pidfd)
+        process = self.processes.pop(pid)
+        on_exit = self.callbacks.pop(pid)
+        process.wait()  # reaps the child (returns immediately)
+        try:
+            on_exit(process)
+        except Exception:
+            logger.exception(f"exit callback for pid: {pid} failed")
+
+    def close(self) -> None:
+        for pidfd in self.pidfds.values():
+            self.loop.remove_reader(pidfd)
+            os.close(pidfd)
+        self.pidfds.clear()
+        if self.sigchld_installed:
+            self.loop.remove_signal_handler(signal.SIGCHLD)
+            self.sigchld_installed = False
+
+
+class StreamedOutput(io.TextIOBase):
+    """Sends what is written to it to the client of a command a line at a time as
+    {"<key>": line} (see: SupervisorServer.run_command)"""
+
+    def __init__(self, key: str, send: Callable[[Dict[str, Any]], None]) -> None:
+        super().__init__()
+        self.key = key
+        self.send = send
+        self.pending = ""
+        self.lock = threading.Lock()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        with self.lock:
+            lines = (self.pending + text).split("\n")
+            self.pending = lines.pop()
+            for line in lines:
+                self.send({self.key: line + "\n"})
+        return len(text)
+
+    def flush(self) -> None:
+        with self.lock:
+            if self.pending:
+                self.send({self.key: self.pending})
+                self.pending = ""
+
+
+class CommandOutputRouter(io.TextIOBase):
+    """Replaces sys.stdout / sys.stderr of the supervisor. What the threads of the command that is
+    being executed write goes to the command's client (see: SupervisorServer.run_command) and
+    everything else to the supervisor's own stream."""
+
+    def __init__(self, default: TextIO, is_command_thread: Callable[[], bool]) -> None:
+        super().__init__()
+        self.default = default
+        self.is_command_thread = is_command_thread
+        self.target: Optional[StreamedOutput] = None
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        target = self.target
+        if target is not None and self.is_command_thread():
+            return target.write(text)
+        return self.default.write(text)
+
+    def flush(self) -> None:
+        self.default.flush()
+
+
+class SupervisedChild:
+    """a background component spawned by the supervisor along with everything that is needed to
+    restart it"""
+
+    def __init__(self, spawn_request: SpawnRequestTypedDict) -> None:
+        self.component_info = Component.from_dict(
+            cast(ComponentTypedDict, spawn_request['component']))
+        self.logfile = Path(self.component_info.logging_path) \
+            if self.component_info.logging_path is not None else None
+        self.command = spawn_request['command']
+        self.env = spawn_request['env']
+        self.cwd = Path(spawn_request['cwd'])
+        restart_policy = spawn_request.get('restart_policy')
+        self.restart_policy = restart_policy['policy'] if restart_policy else RestartPolicy.NEVER
+        self.max_restarts = restart_policy['max_restarts'] if restart_policy else 0
+        self.resource_limits = spawn_request.get('resource_limits')
+        self.cpu_affinity = spawn_request.get('cpu_affinity')
+        self.cgroup: Optional[ComponentCgroup] = None
+
+        self.process: Optional[subprocess.Popen] = None
+        # reused by restarts (which append to the logfile of the run that they replace)
+        self.log_writer: Optional[RotatingLogWriter] = None
+        self.spawned_at = 0.0
+        self.spawn_seq = 0  # latest journal seq before the current process was spawned
+        self.restart_count = 0
+        self.consecutive_restarts = 0
+
+    @property
+    def id(self) -> str:
+        return self.component_info.id
+
+    def update_state(self, component_state: str, pid: Optional[int]=None,
+            exit_code: Optional[int]=None, keep_port_leases: bool=False) -> None:
+        component_info = Component(self.id, pid, self.component_info.component_type,
+            self.component_info.location, status_endpoint=self.component_info.status_endpoint,
+            component_state=component_state, metadata=self.component_info.metadata,
+            logging_path=self.logfile)
+        ComponentStore().update_status_file(component_info, exit_code=exit_code,
+            keep_port_leases=keep_port_leases)
+
+    def is_stop_requested(self) -> bool:
+        """a 'stopping' event is journaled before the SDK stops a component
+        (see: PluginTools.call_for_component_id_or_type)"""
+        return any(event['event'] == ComponentEvent.STOPPING for event in
+            ComponentStore().get_events(since_seq=self.spawn_seq, component_id=self.id))
+
+    def should_restart(self, returncode: int) -> bool:
+        if self.restart_policy == RestartPolicy.NEVER or self.is_stop_requested():
+            return False
+        if self.restart_policy == RestartPolicy.ON_FAILURE and \
+                utils.get_exit_component_state(returncode) != ComponentState.FAILED:
+            return False
+        if self.consecutive_restarts >= self.max_restarts:
+            logger.error(f"{self.id} exited with: {returncode} - giving up after "
+                f"{self.consecutive_restarts} consecutive restarts")
+            return False
+        return True
+
+    def get_restart_delay(self) -> float:
+        return min(RESTART_INITIAL_BACKOFF * 2 ** self.consecutive_restarts, RESTART_MAX_BACKOFF)
+
+
+class SupervisorServer:
+
+    def __init__(self, config: Optional[Config] = None) -> None:
+        self.config = config if config else Config()
+        self.socket_path: Path = get_socket_path(self.config)
+        self.started_at = time.time()
+        self.requests_handled = 0
+        # forwarded commands are only executed with this environment (see: module docstring)
+        self.environ = dict(os.environ)
+
+        # commands take over process-wide state (cwd, os.environ, stdout) so run one at a time
+        self.command_lock = threading.Lock()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1,
+            thread_name_prefix="supervisor-command")
+        # compresses rotated log segments and applies the retention policies
+        self.compression_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1,
+            thread_name_prefix=COMPRESSION_THREAD_NAME_PREFIX)
+        self.shutdown_event: Optional[asyncio.Event] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+        self.stdout_router: Optional[CommandOutputRouter] = None
+        self.stderr_router: Optional[CommandOutputRouter] = None
+        self.child_watcher: Optional[ChildWatcher] = None
+        # background components that were spawned by the supervisor (including those that are
+        # waiting to be restarted) {component_id: child}. These and the pending restarts are only
+        # accessed on the event loop thread
+        self.children: Dict[str, SupervisedChild] = {}
+        self.pending_restarts: Dict[str, asyncio.Task[None]] = {}
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "socket": str(self.socket_path),
+            "uptime": round(time.time() - self.started_at, 3),
+            "requests_handled": self.requests_handled,
+            "child_processes": {component_id: process.pid for component_id, process
+                in {**utils.spawned_processes, **self.get_child_processes()}.items()
+                if process.returncode is None},
+            "pending_restarts": sorted(self.pending_restarts),
+            "cgroups": {component_id: child.cgroup.get_stats() for component_id, child
+                in self.children.items() if child.cgroup is not None},
+        }
+
+    def get_child_processes(self) -> Dict[str, subprocess.Popen]:
+        return {component_id: child.process for component_id, child in self.children.items()
+            if child.process is not None}
+
+    def get_running_child_ids(self) -> List[str]:
+        return sorted(component_id for component_id, process
+            in self.get_child_processes().items() if process.returncode is None)
+
+    def spawn_child(self, spawn_request: SpawnRequestTypedDict) -> int:
+        """Spawns a background component (from any thread - e.g. the thread of a command). Its
+        exit is recorded in the component store by the child watcher. Returns the pid."""
+        assert self.loop is not None
+        if threading.get_ident() == self.loop_thread_id:
+            return self.spawn_child_on_loop(spawn_request)
+
+        async def spawn() -> int:
+            return self.spawn_child_on_loop(spawn_request)
+        # the children and pending restarts are only ever accessed on the event loop thread
+        return asyncio.run_coroutine_threadsafe(spawn(), self.loop).result()
+
+    def spawn_child_on_loop(self, spawn_request: SpawnRequestTypedDict) -> int:
+        child = SupervisedChild(spawn_request)
+        # the component is being started afresh so a pending restart is obsolete
+        self.cancel_pending_restart(child.id)
+        return self.start_child(child)
+
+    def open_log_writer(self, child: SupervisedChild) -> None:
+        assert child.logfile is not None
+        policy = PluginRegistry(self.config).get_log_rotation_policy(
+            child.component_info.component_type)
+        os.makedirs(child.logfile.parent, exist_ok=True)
+        child.log_writer = RotatingLogWriter(child.logfile, policy, self.compression_executor,
+            append=child.restart_count > 0)
+        # the logs of previous runs count towards the retention policy too
+        self.compression_executor.submit(apply_retention, child.logfile.parent, policy,
+            [child.logfile])
+
+    def create_cgroup(self, child: SupervisedChild) -> None:
+        assert child.resource_limits is not None
+        cgroup = ComponentCgroup(child.id)
+        try:
+            cgroup.create(child.resource_limits)
+        except CgroupError as e:
+            logger.warning(f"{child.id} is started without resource limits: {e}")
+            return
+        child.cgroup = cgroup
+        child.component_info.metadata = cast(ComponentMetadata,
+            {**(child.component_info.metadata or {}), 'cgroup': str(cgroup.path)})
+
+    def start_child(self, child: SupervisedChild) -> int:
+        """called on the event loop thread"""
+        assert self.loop is not None and self.child_watcher is not None
+        child.spawn_seq = ComponentStore().get_latest_seq()
+        if child.resource_limits is not None and child.cgroup is None:
+            self.create_cgroup(child)
+        try:
+            if child.logfile is not None and child.log_writer is None:
+                self.open_log_writer(child)
+            process = utils.popen_background(child.command, child.env, cwd=child.cwd,
+                pipe_output=child.log_writer is not None, cgroup=child.cgroup,
+                cpu_affinity=child.cpu_affinity)
+        except OSError:
+            child.update_state(ComponentState.FAILED)
+            self.remove_cgroup(child)
+            raise
+
+        if process.stdout is not None:
+            self.attach_output(child, process)
+        child.process = process
+        child.spawned_at = time.time()
+        self.children[child.id] = child
+        child.update_state(ComponentState.RUNNING, process.pid)
+        self.child_watcher.watch(process, functools.partial(self.on_child_exit, child))
+        logger.debug(f"spawned {child.id} (pid: {process.pid})")
+        return process.pid
+
+    def attach_output(self, child: SupervisedChild, process: subprocess.Popen) -> None:
+        """copies the output of the child to its logfile as it becomes readable (on the event
+        loop thread). The pipe is read until EOF which can be after the child has exited if it
+        left behind processes that inherited it."""
+        assert self.loop is not None and process.stdout is not None
+        fd = process.stdout.fileno()
+        os.set_blocking(fd, False)
+
+        def on_readable() -> None:
+            assert self.loop is not None and process.stdout is not None
+            try:
+                data = os.read(fd, OUTPUT_READ_SIZE)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                logger.error(f"failed to read the output of {child.id}: {e}")
+                data = b""
+            if data:
+                if child.log_writer is not None:
+                    try:
+                        child.log_writer.write(data)
+                    except OSError as e:
+                        logger.error(f"failed to write the logfile of {child.id}: {e}")
+                return
+            self.loop.remove_reader(fd)
+            process.stdout.close()
+            # the writer is kept open for a restart unless the component is done with it
+            if child.log_writer is not None and self.children.get(child.id) is not child:
+                child.log_writer.close()
+
+        self.loop.add_reader(fd, on_readable)
+
+    def hand_over_output(self) -> None:
+        """Passes the pipes that are still open to a log relay process (see: log_relay.py) that
+        outlives the supervisor - otherwise the children would be killed by SIGPIPE the next time
+        that they write to stdout. Called on the event loop thread when shutting down."""
+        assert self.loop is not None and self.config.LOGS_DIR is not None
+        outputs: List[RelayedOutputTypedDict] = []
+        for child in self.children.values():
+            if child.process is None or child.process.stdout is None \
+                    or child.process.stdout.closed or child.log_writer is None:
+                continue
+            fd = child.process.stdout.fileno()
+            self.loop.remove_reader(fd)
+            # the relay appends to the logfile from here on
+            child.log_writer.close()
+            outputs.append(RelayedOutputTypedDict(component_id=child.id, fd=fd,
+                logfile=str(child.log_writer.path), policy=child.log_writer.policy))
+        if not outputs:
+            return
+
+        log_path = self.config.LOGS_DIR / "supervisor" / "supervisor.log"
+        try:
+            with open(log_path, "a") as logfile_handle:
+                process = subprocess.Popen([sys.executable, "-m", "electrumsv_sdk.log_relay",
+                    json.dumps(outputs)], stdout=logfile_handle, stderr=logfile_handle,
+                    stdin=subprocess.DEVNULL, start_new_session=True,
+                    pass_fds=[output['fd'] for output in outputs])
+        except OSError as e:
+            logger.error(f"failed to start the log relay - the output of the background "
+                f"components can no longer be read: {e}")
+            return
+        logger.info(f"the output of {sorted(output['component_id'] for output in outputs)} is "
+            f"written to their logfiles by the log relay (pid: {process.pid})")
+
+    def remove_child(self, child: SupervisedChild) -> None:
+        """the logfile is closed once the remaining output has been read (see: attach_output)"""
+        if self.children.get(child.id) is child:
+            del self.children[child.id]
+        process = child.process
+        if child.log_writer is not None and (process is None or process.stdout is None
+                or process.stdout.closed):
+            child.log_writer.close()
+        self.remove_cgroup(child)
+
+    def remove_cgroup(self, child: SupervisedChild) -> None:
+        """processes that the component left behind (i.e. that were not stopped with its process
+        group) keep the slice alive - it is then left in place (and reused by the next spawn of
+        the same id)"""
+        if child.cgroup is not None and child.cgroup.remove():
+            child.cgroup = None
+
+    def on_child_exit(self, child: SupervisedChild, process: subprocess.Popen) -> None:
+        """called on the event loop thread"""
+        exited_at = time.time()
+        logger.debug(f"{child.id} exited with: {process.returncode}")
+        if self.children.get(child.id) is not child or child.process is not process:
+            return  # superseded by a newer spawn request for the same component id
+
+        if exited_at - child.spawned_at >= RESTART_STABLE_PERIOD:
+            child.consecutive_restarts = 0
+        restart = child.should_restart(process.returncode)
+        # the ports stay leased to the component until it is restarted
+        child.update_state(utils.get_exit_component_state(process.returncode), process.pid,
+            process.returncode, keep_port_leases=restart)
+        if not restart:
+            self.remove_child(child)
+            return
+
+        task = asyncio.ensure_future(self.restart_child(child, exited_at))
+        self.pending_restarts[child.id] = task
+
+        def on_done(task: asyncio.Task[None]) -> None:
+            if self.pending_restarts.get(child.id) is task:
+                del self.pending_restarts[child.id]
+        task.add_done_callback(on_done)
+
+    def cancel_pending_restart(self, component_id: str) -> None:
+        task = self.pending_restarts.pop(component_id, None)
+        if task is not None:
+            logger.debug(f"cancelled the pending restart of: {component_id}")
+            task.cancel()
+
+    async def restart_child(self, child: SupervisedChild, exited_at: float) -> None:
+        delay = child.get_restart_delay()
+        child.consecutive_restarts += 1
+        child.restart_count += 1
+        logger.info(f"restarting {child.id} in {delay:.1f} seconds (restart policy: "
+            f"{child.restart_policy}, attempt {child.consecutive_restarts} of "
+            f"{child.max_restarts})")
+        ComponentStore().append_event(child.id, child.component_info.component_type,
+            ComponentEvent.RESTARTING)
+        await asyncio.sleep(delay)
+
+        if child.is_stop_requested():
+            logger.info(f"not restarting {child.id} - it was stopped")
+            ComponentStore().release_ports(child.id)
+            self.remove_child(child)
+            return
+
+        # carried over by the 'running' state update (the metadata of the previous process is
+        # discarded because the pid changes)
+        child.component_info.metadata = cast(ComponentMetadata,
+            {**(child.component_info.metadata or {}), 'restart_count': child.restart_count})
+        try:
+            self.start_child(child)
+        except OSError as e:
+            logger.error(f"failed to restart {child.id}: {e}")
+            self.remove_child(child)
+            return
+
+        process = child.process
+        assert process is not None
+        if child.component_info.status_endpoint:
+            elapsed = await wait_for_probes([HttpProbe(child.component_info.status_endpoint)],
+                RECOVERY_TIMEOUT, should_abort=lambda: process.returncode is not None)
+            if elapsed is None:
+                logger.warning(f"{child.id} was restarted but did not become ready within "
+                    f"{RECOVERY_TIMEOUT} seconds")
+                return
+
+        time_to_recover = round(time.time() - exited_at, 3)
+        child.component_info.metadata = cast(ComponentMetadata,
+            {**child.component_info.metadata, 'time_to_recover': time_to_recover})
+        component_store = ComponentStore()
+        component_store.update_metadata(child.id, ComponentMetadata(
+            time_to_recover=time_to_recover))
+        component_store.append_event(child.id, child.component_info.component_type,
+            ComponentEvent.READY, pid=process.pid)
+        logger.info(f"{child.id} recovered in {time_to_recover:.2f} seconds "
+            f"(restarts: {child.restart_count})")
+
+    def get_environment_differences(self, env: Dict[str, str]) -> List[str]:
+        """the names of the variables that differ from the supervisor's environment"""
+        names = (set(env) | set(self.environ)) - IGNORED_ENVIRONMENT_VARIABLES
+        return sorted(name for name in names if env.get(name) != self.environ.get(name))
+
+    def is_supervisor_thread(self, thread_id: Optional[int], thread_name: Optional[str]) -> bool:
+        """the event loop and log compression threads - every other thread that runs while a
+        command is executed belongs to the command (e.g. start_all starts the components on
+        threads of its own)"""
+        return thread_id == self.loop_thread_id or \
+            (thread_name or "").startswith(COMPRESSION_THREAD_NAME_PREFIX)
+
+    def is_command_thread(self) -> bool:
+        return not self.is_supervisor_thread(threading.get_ident(),
+            threading.current_thread().name)
+
+    def run_command(self, argv: List[str], cwd: str, env: Dict[str, str],
+            send: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        """executes the cli command exactly as __main__.main() would but streams the output of
+        the command to the client with 'send' (on the command's threads) and returns the
+        response that completes it"""
+        if len(argv) < 2 or argv[1] not in FORWARDED_NAMESPACES or "--inline" in argv:
+            send({"stderr": f"the supervisor cannot execute: {argv[1:]}\n"})
+            return {"exit_code": 1}
+
+        assert self.stdout_router is not None and self.stderr_router is not None
+        stdout = StreamedOutput("stdout", send)
+        stderr = StreamedOutput("stderr", send)
+        log_handler = logging.StreamHandler(stderr)
+        log_handler.setLevel(LOG_LEVEL)
+        log_handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT))
+        log_handler.addFilter(lambda record: not self.is_supervisor_thread(record.thread,
+            record.threadName))
+
+        with self.command_lock:
+            saved_cwd = os.getcwd()
+            saved_environ = dict(os.environ)
+            root_logger = logging.getLogger()
+            root_logger.addHandler(log_handler)
+            self.stdout_router.target = stdout
+            self.stderr_router.target = stderr
+            exit_code = 0
+            try:
+                os.chdir(cwd)
+                os.environ.clear()
+                os.environ.update(env)
+                try:
+                    app_state = AppState(list(argv))
+                    app_state.handle_first_ever_run()
+                    app_state.controller.run(app_state.cli_inputs)
+                except SystemExit as e:
+                    if e.code is None:
+                        exit_code = 0
+                    elif isinstance(e.code, int):
+                        exit_code = e.code
+                    else:
+                        print(e.code, file=sys.stderr)
+                        exit_code = 1
+                except Exception:
+                    traceback.print_exc()
+                    exit_code = 1
+            finally:
+                self.stdout_router.target = None
+                self.stderr_router.target = None
+                root_logger.removeHandler(log_handler)
+                stdout.flush()
+                stderr.flush()
+                os.environ.clear()
+                os.environ.update(saved_environ)
+                os.chdir(saved_cwd)
+            self.requests_handled += 1
+
+        logger.debug(f"executed: {argv[1:]} (exit code: {exit_code})")
+        return {"exit_code": exit_code}
+
+    def send_message(self, writer: asyncio.StreamWriter, message: Dict[str, Any]) -> None:
+        """called on the event loop thread - the output of a command is dropped if the client has
+        disconnected (the command runs to completion regardless)"""
+        if not writer.is_closing():
+            writer.write(json.dumps(message).encode('utf-8') + b"\n")
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+            writer: asyncio.StreamWriter) -> None:
+        try:
+            line = await reader.readline()
+            if not line:
+                return
+            request = json.loads(line)
+            request_type = request.get("type")
+            if request_type == "ping":
+                response = self.get_status()
+            elif request_type == "shutdown":
+                running_ids = self.get_running_child_ids()
+                if running_ids and not request.get("force", False):
+                    response = {"refused": f"background components are still running: "
+                        f"{running_ids}"}
+                else:
+                    response = {"ok": True}
+                    assert self.shutdown_event is not None
+                    self.shutdown_event.set()
+            elif request_type == "command" and \
+                    self.get_environment_differences(request["env"]):
+                differences = self.get_environment_differences(request["env"])
+                logger.debug(f"refused: {request['argv'][1:]} (the environment differs: "
+                    f"{differences})")
+                response = {"refused": f"the environment differs from the supervisor's: "
+                    f"{differences}"}
+            elif request_type == "command":
+                loop = asyncio.get_running_loop()
+
+                def send(message: Dict[str, Any]) -> None:
+                    loop.call_soon_threadsafe(self.send_message, writer, message)
+                response = await loop.run_in_executor(self.executor, self.run_command,
+                    request["argv"], request["cwd"], request["env"], send)
+                self.watch_spawned_processes()
+            elif request_type == "spawn":
+                try:
+                    response = {"pid": self.spawn_child(request)}
+                except OSError as e:
+                    response = {"error": str(e)}
+            else:
+                response = {"error": f"unknown request type: {request_type}"}
+
+            self.send_message(writer, response)
+            await writer.drain()
+        except (ValueError, KeyError) as e:
+            logger.error(f"invalid request: {e}")
+        except ConnectionError:
+            logger.debug("client disconnected before receiving the response")
+        finally:
+            writer.close()
+
+    def watch_spawned_processes(self) -> None:
+        """reaps the processes that commands have spawned directly (e.g. new terminal windows)
+        so that they do not linger as zombies"""
+        assert self.child_watcher is not None
+        watched_pids = set(self.child_watcher.processes)
+        for component_id, process in list(utils.spawned_processes.items()):
+            if process.pid in watched_pids:
+                continue
+
+            def on_exit(process: subprocess.Popen, component_id: str=component_id) -> None:
+                logger.debug(f"child process of: {component_id} exited with: "
+                    f"{process.returncode}")
+                if utils.spawned_processes.get(component_id) is process:
+                    del utils.spawned_processes[component_id]
+            self.child_watcher.watch(process, on_exit)
+
+    async def serve(self) -> None:
+        if get_supervisor_status(self.socket_path):
+            logger.error(f"a supervisor is already listening on: {self.socket_path}")
+            return
+
+        # a stale socket file is left behind if a previous supervisor was killed
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+        self.shutdown_event = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.child_watcher = ChildWatcher(self.loop)
+        # the output of commands goes to their clients (see: run_command)
+        self.stdout_router = CommandOutputRouter(sys.stdout, self.is_command_thread)
+        self.stderr_router = CommandOutputRouter(sys.stderr, self.is_command_thread)
+        sys.stdout = cast(TextIO, self.stdout_router)
+        sys.stderr = cast(TextIO, self.stderr_router)
+        # commands executed by the supervisor spawn background components in-process
+        utils.supervised_spawn_handler = self.spawn_child
+        server = await asyncio.start_unix_server(self.handle_connection,
+            path=str(self.socket_path), limit=MAX_REQUEST_SIZE)
+        os.chmod(self.socket_path, 0o600)
+        # e.g. on system shutdown - the output of the children is handed over (see: finally)
+        self.loop.add_signal_handler(signal.SIGTERM, self.shutdown_event.set)
+        logger.info(f"supervisor listening on: {self.socket_path} (pid: {os.getpid()})")
+        try:
+            await self.shutdown_event.wait()
+        finally:
+            self.loop.remove_signal_handler(signal.SIGTERM)
+            # a command that is still being executed may need the event loop to spawn children
+            await self.loop.run_in_executor(None, functools.partial(self.executor.shutdown,
+                wait=True))
+            utils.supervised_spawn_handler = None
+            for component_id in list(self.pending_restarts):
+                self.cancel_pending_restart(component_id)
+            running_ids = self.get_running_child_ids()
+            if running_ids:
+                logger.warning(f"background components are still running but their exit will "
+                    f"no longer be recorded: {running_ids}")
+            self.hand_over_output()
+            self.child_watcher.close()
+            for child in self.children.values():
+                if child.process is not None and child.process.stdout is not None \
+                        and not child.process.stdout.closed:
+                    self.loop.remove_reader(child.process.stdout.fileno())
+                    child.process.stdout.close()
+                if child.log_writer is not None:
+                    child.log_writer.close()
+            server.close()
+            await server.wait_closed()
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+            self.compression_executor.shutdown(wait=True)
+            sys.stdout = self.stdout_router.default
+            sys.stderr = self.stderr_router.default
+            logger.info("supervisor stopped")
+
+
+def main() -> None:
+    logging.basicConfig(format=LOG_FORMAT, level=LOG_LEVEL, datefmt=LOG_DATE_FORMAT)
+    logging.getLogger("urllib3").setLevel(logging.WARNING)
+    server = SupervisorServer()
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
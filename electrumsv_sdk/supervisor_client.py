@@ -0,0 +1,260 @@
+"""
+Thin client for the (optional) supervisor daemon - see: supervisor.py
+
+Only the standard library is used here so that forwarding a command to a running supervisor
+costs as little as possible. If no supervisor is running (or on Windows which has no unix domain
+sockets) every function degrades gracefully and the cli executes the command in-process as usual.
+"""
+import json
+import logging
+import os
+from pathlib import Path
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, BinaryIO, Dict, List, Optional, TypedDict
+
+from .cgroups import ResourceLimitsTypedDict
+from .config import Config
+from .constants import NameSpace
+
+logger = logging.getLogger("supervisor-client")
+
+SUPERVISOR_SOCKET_FILENAME = "supervisor.sock"
+
+# 'install' and 'config' are not forwarded (they are rare and can prompt the user)
+FORWARDED_NAMESPACES = {NameSpace.START, NameSpace.STOP, NameSpace.RESET, NameSpace.NODE,
+    NameSpace.STATUS}
+
+SUPERVISOR_STARTUP_TIMEOUT = 10.0
+
+
+class SupervisorUnavailableError(Exception):
+    pass
+
+
+class SpawnResult(str):
+    """see: spawn_supervised_child"""
+    SPAWNED = "spawned"
+    FAILED = "failed"  # the supervisor has recorded the component as failed
+    UNAVAILABLE = "unavailable"  # the caller needs to supervise the component itself
+
+
+class RestartPolicyTypedDict(TypedDict):
+    policy: str  # see: RestartPolicy
+    max_restarts: int  # consecutive restarts before giving up
+
+
+class SpawnRequestTypedDict(TypedDict, total=False):
+    type: str  # "spawn"
+    component: Dict[str, Any]  # see: Component.to_dict()
+    command: str
+    env: Dict[str, str]
+    cwd: str
+    restart_policy: RestartPolicyTypedDict  # optional
+    resource_limits: ResourceLimitsTypedDict  # optional (places the child in a cgroup)
+    cpu_affinity: List[int]  # optional (pins the child to these cpus)
+
+
+def is_supervisor_supported() -> bool:
+    return sys.platform in ('linux', 'darwin')
+
+
+def is_supervisor_disabled() -> bool:
+    """SDK_NO_SUPERVISOR=1 always executes commands in-process (even if a supervisor is
+    running)"""
+    return os.environ.get("SDK_NO_SUPERVISOR", "0") == "1"
+
+
+def get_socket_path(config: Optional[Config] = None) -> Path:
+    config = config if config else Config()
+    assert config.SDK_HOME_DIR is not None
+    return config.SDK_HOME_DIR / SUPERVISOR_SOCKET_FILENAME
+
+
+def connect(socket_path: Optional[Path] = None, timeout: Optional[float] = None) \
+        -> socket.socket:
+    if not is_supervisor_supported():
+        raise SupervisorUnavailableError("the supervisor requires unix domain sockets")
+
+    socket_path = socket_path if socket_path else get_socket_path()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(socket_path))
+    except OSError as e:
+        sock.close()
+        raise SupervisorUnavailableError(f"no supervisor is listening on: {socket_path}") from e
+    return sock
+
+
+def send_message(sock: socket.socket, message: Dict[str, Any]) -> None:
+    sock.sendall(json.dumps(message).encode('utf-8') + b"\n")
+
+
+def read_message(reader: BinaryIO) -> Dict[str, Any]:
+    line = reader.readline()
+    if not line.endswith(b"\n"):
+        raise SupervisorUnavailableError("the supervisor closed the connection without a response")
+    message: Dict[str, Any] = json.loads(line)
+    return message
+
+
+def send_request(request: Dict[str, Any], socket_path: Optional[Path] = None,
+        timeout: Optional[float] = None) -> Dict[str, Any]:
+    """one request per connection - the request and response are newline-delimited json"""
+    with connect(socket_path, timeout) as sock:
+        send_message(sock, request)
+        with sock.makefile('rb') as reader:
+            return read_message(reader)
+
+
+def get_supervisor_status(socket_path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    """None if no supervisor is running"""
+    try:
+        return send_request({"type": "ping"}, socket_path, timeout=2.0)
+    except (SupervisorUnavailableError, OSError):
+        return None
+
+
+def is_forwardable(arguments: List[str]) -> bool:
+    if is_supervisor_disabled() or not is_supervisor_supported():
+        return False
+    if len(arguments) < 2 or arguments[1] not in FORWARDED_NAMESPACES:
+        return False
+    # inline components need to be attached to the caller's terminal and batches of node rpc
+    # calls are streamed from / to the caller's stdin and stdout
+    return "--inline" not in arguments and \
+        not any(argument.startswith("--batch") for argument in arguments)
+
+
+def forward_command(arguments: List[str]) -> Optional[int]:
+    """Executes the command on the supervisor (if one is running) and replays its output as it
+    is written.
+    Returns the exit code or None if the command needs to be executed in-process instead."""
+    if not is_forwardable(arguments):
+        return None
+
+    socket_path = get_socket_path()
+    if not socket_path.exists():
+        return None
+
+    request = {
+        "type": "command",
+        "argv": arguments,
+        "cwd": os.getcwd(),
+        "env": dict(os.environ),
+    }
+    try:
+        sock = connect(socket_path)
+    except SupervisorUnavailableError:
+        logger.debug(f"supervisor is not available - executing in-process")
+        return None
+
+    # once the request is sent the supervisor may have executed the command (e.g. started a new
+    # instance) so it must not be executed in-process as well if anything goes wrong
+    with sock:
+        try:
+            send_message(sock, request)
+            with sock.makefile('rb') as reader:
+                while True:
+                    response = read_message(reader)
+                    if "stdout" in response:
+                        sys.stdout.write(response["stdout"])
+                        sys.stdout.flush()
+                    elif "stderr" in response:
+                        sys.stderr.write(response["stderr"])
+                        sys.stderr.flush()
+                    else:
+                        break
+        except (SupervisorUnavailableError, OSError, ValueError) as e:
+            logger.error(f"lost the connection to the supervisor while it was executing: "
+                f"{arguments[1:]} ({e}) - it may or may not have been executed")
+            return 1
+
+    if "refused" in response:
+        # e.g. the settings that the supervisor read from its environment would not apply
+        logger.debug(f"the supervisor refused the command ({response['refused']}) - executing "
+            f"in-process")
+        return None
+
+    exit_code: int = response.get("exit_code", 1)
+    return exit_code
+
+
+def spawn_supervised_child(spawn_request: SpawnRequestTypedDict) -> str:
+    """Hands a background component over to the supervisor if it is running (or starts it first
+    if 'supervisor_autostart' is enabled in config.json - see: Config). Returns a SpawnResult."""
+    if is_supervisor_disabled() or not is_supervisor_supported():
+        return SpawnResult.UNAVAILABLE
+
+    config = Config()
+    socket_path = get_socket_path(config)
+    if not get_supervisor_status(socket_path):
+        if not config.is_supervisor_autostart_enabled():
+            return SpawnResult.UNAVAILABLE
+        if not start_supervisor(config):
+            return SpawnResult.UNAVAILABLE
+    try:
+        response = send_request(dict(spawn_request), socket_path, timeout=30.0)
+    except (SupervisorUnavailableError, OSError) as e:
+        logger.error(f"failed to hand over {spawn_request['component']['id']} to the "
+            f"supervisor: {e}")
+        return SpawnResult.UNAVAILABLE
+
+    if "error" in response:
+        # the component must not be spawned again by the caller
+        logger.error(f"the supervisor failed to spawn {spawn_request['component']['id']}: "
+            f"{response['error']}")
+        return SpawnResult.FAILED
+    logger.debug(f"the supervisor spawned {spawn_request['component']['id']} "
+        f"(pid: {response['pid']})")
+    return SpawnResult.SPAWNED
+
+
+def start_supervisor(config: Optional[Config] = None) -> Optional[Dict[str, Any]]:
+    """spawns the supervisor as a detached process and waits for it to accept connections"""
+    config = config if config else Config()
+    assert config.LOGS_DIR is not None
+    socket_path = get_socket_path(config)
+    status = get_supervisor_status(socket_path)
+    if status:
+        logger.info(f"supervisor is already running (pid: {status['pid']})")
+        return status
+
+    log_dir = config.LOGS_DIR / "supervisor"
+    os.makedirs(log_dir, exist_ok=True)
+    with open(log_dir / "supervisor.log", "a") as logfile_handle:
+        subprocess.Popen([sys.executable, "-m", "electrumsv_sdk.supervisor"],
+            stdout=logfile_handle, stderr=logfile_handle, stdin=subprocess.DEVNULL,
+            start_new_session=True)
+
+    t0 = time.time()
+    while time.time() - t0 < SUPERVISOR_STARTUP_TIMEOUT:
+        status = get_supervisor_status(socket_path)
+        if status:
+            logger.info(f"supervisor started (pid: {status['pid']}, socket: {socket_path})")
+            return status
+        time.sleep(0.05)
+
+    logger.error(f"supervisor failed to start within {SUPERVISOR_STARTUP_TIMEOUT} seconds - "
+        f"see: {log_dir / 'supervisor.log'}")
+    return None
+
+
+def stop_supervisor(config: Optional[Config] = None, force: bool = False) -> bool:
+    """Returns False if the supervisor refused to stop because background components are still
+    running (unless 'force' - the components are then left running but unsupervised)."""
+    socket_path = get_socket_path(config)
+    try:
+        response = send_request({"type": "shutdown", "force": force}, socket_path, timeout=5.0)
+    except (SupervisorUnavailableError, OSError):
+        logger.info("supervisor is not running")
+        return True
+    if "refused" in response:
+        logger.error(f"the supervisor was not stopped: {response['refused']}. Stop them first or "
+            f"use --force to leave them running unsupervised")
+        return False
+    logger.info("supervisor stopped")
+    return True
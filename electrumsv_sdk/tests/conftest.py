@@ -0,0 +1,21 @@
+from pathlib import Path
+
+import pytest
+
+from electrumsv_sdk.components import ComponentStore
+from electrumsv_sdk.config import get_sdk_datadir
+
+
+@pytest.fixture
+def sdk_home(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """a fresh (non-portable) SDK home directory - see: config.get_sdk_datadir"""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path))
+    monkeypatch.delenv("SDK_PORTABLE_MODE", raising=False)
+    monkeypatch.delenv("SDK_HOME_DIR", raising=False)
+    return get_sdk_datadir()
+
+
+@pytest.fixture
+def store(sdk_home: Path) -> ComponentStore:
+    return ComponentStore()
@@ -0,0 +1,157 @@
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from electrumsv_sdk.block_archive import BlockArchive, BlockArchiveError, BlockArchiveWriter, \
+    INDEX_ENTRY_STRUCT, MAGIC_PREFIX, convert_dat_file, get_block_hash, get_index_path, \
+    hash_to_hex_str, is_block_archive
+
+
+def make_blocks(count: int) -> List[bytes]:
+    # the lengths differ so that misplaced offsets are noticed
+    return [bytes([height]) * (100 + height) for height in range(count)]
+
+
+def write_archive(path: Path, blocks: List[bytes], start_height: int=0) -> None:
+    with BlockArchiveWriter(path) as writer:
+        for height, raw_block in enumerate(blocks, start=start_height):
+            writer.append(height, raw_block)
+
+
+def test_write_and_read(tmp_path: Path) -> None:
+    path = tmp_path / "chain.blocks"
+    blocks = make_blocks(5)
+    write_archive(path, blocks, start_height=10)
+    assert is_block_archive(path)
+
+    with BlockArchive(path) as archive:
+        assert len(archive) == 5
+        assert archive.first_height == 10
+        assert archive.get_block(12) == blocks[2]
+        assert archive.get_block(9) is None
+        assert archive.get_block(15) is None
+
+        block_hash = get_block_hash(blocks[3])
+        assert archive.get_block_by_hash(block_hash) == blocks[3]
+        assert archive.get_block_by_hash(hash_to_hex_str(block_hash)) == blocks[3]
+        assert archive.get_block_by_hash(b"\0" * 32) is None
+
+        assert [(entry.height, raw_block) for entry, raw_block in
+            archive.iter_blocks(from_height=11, to_height=13)] == \
+            [(11, blocks[1]), (12, blocks[2]), (13, blocks[3])]
+
+
+def test_heights_that_are_not_consecutive(tmp_path: Path) -> None:
+    path = tmp_path / "chain.blocks"
+    blocks = make_blocks(3)
+    with BlockArchiveWriter(path) as writer:
+        writer.append(0, blocks[0])
+        writer.append(5, blocks[1])
+        writer.append(2, blocks[2])
+
+    with BlockArchive(path) as archive:
+        assert archive.get_block(5) == blocks[1]
+        assert archive.get_block(2) == blocks[2]
+        assert archive.get_block(1) is None
+
+
+def test_append_to_an_existing_archive(tmp_path: Path) -> None:
+    path = tmp_path / "chain.blocks"
+    blocks = make_blocks(4)
+    write_archive(path, blocks[:2])
+    with BlockArchiveWriter(path) as writer:
+        assert writer.last_height == 1
+        writer.append(2, blocks[2])
+        writer.append(3, blocks[3])
+
+    with BlockArchive(path) as archive:
+        assert [raw_block for _entry, raw_block in archive.iter_blocks()] == blocks
+
+
+def test_an_empty_archive(tmp_path: Path) -> None:
+    path = tmp_path / "chain.blocks"
+    BlockArchiveWriter(path).close()
+    with BlockArchive(path) as archive:
+        assert len(archive) == 0
+        assert archive.get_block(0) is None
+        assert list(archive.iter_blocks()) == []
+
+
+def test_recover_a_partially_appended_block(tmp_path: Path) -> None:
+    path = tmp_path / "chain.blocks"
+    blocks = make_blocks(3)
+    write_archive(path, blocks)
+    data_size = path.stat().st_size
+    index_path = get_index_path(path)
+    index_size = index_path.stat().st_size
+
+    # the block was not completely written before its index entry
+    with open(path, 'ab') as f:
+        f.write(b"\xff" * 50)
+    with open(index_path, 'ab') as f:
+        f.write(INDEX_ENTRY_STRUCT.pack(3, data_size + 8, 1000, b"\0" * 32)[:20])
+
+    # readers ignore the incomplete block
+    with BlockArchive(path) as archive:
+        assert len(archive) == 3
+
+    with BlockArchiveWriter(path) as writer:
+        assert writer.last_height == 2
+        assert path.stat().st_size == data_size
+        assert index_path.stat().st_size == index_size
+        writer.append(3, blocks[0])
+
+    with BlockArchive(path) as archive:
+        assert len(archive) == 4
+        assert archive.get_block(3) == blocks[0]
+        assert archive.get_block(2) == blocks[2]
+
+
+def test_an_unsupported_format_version(tmp_path: Path) -> None:
+    path = tmp_path / "chain.blocks"
+    path.write_bytes(MAGIC_PREFIX + b"\x01")
+    get_index_path(path).write_bytes(b"")
+    assert is_block_archive(path)
+    with pytest.raises(BlockArchiveError):
+        BlockArchive(path)
+    with pytest.raises(BlockArchiveError):
+        BlockArchiveWriter(path)
+
+
+def test_not_a_block_archive(tmp_path: Path) -> None:
+    path = tmp_path / "blocks.dat"
+    path.write_text("00" * 80)
+    assert not is_block_archive(path)
+    assert not is_block_archive(tmp_path / "missing.dat")
+    assert is_block_archive(tmp_path / "missing.blocks")
+    with pytest.raises(BlockArchiveError):
+        BlockArchive(path)
+    with pytest.raises(BlockArchiveError):
+        BlockArchiveWriter(path)
+
+
+def test_convert_dat_file(tmp_path: Path) -> None:
+    dat_path = tmp_path / "chain.dat"
+    blocks = make_blocks(3)
+    dat_path.write_text("\n".join(raw_block.hex() for raw_block in blocks) + "\n\n")
+
+    archive_path = convert_dat_file(dat_path, start_height=100)
+    assert archive_path == tmp_path / "chain.blocks"
+    with BlockArchive(archive_path) as archive:
+        assert [(entry.height, raw_block) for entry, raw_block in archive.iter_blocks()] == \
+            [(100, blocks[0]), (101, blocks[1]), (102, blocks[2])]
+
+    # converting again replaces the archive
+    dat_path.write_text(blocks[0].hex())
+    convert_dat_file(dat_path)
+    with BlockArchive(archive_path) as archive:
+        assert len(archive) == 1
+        assert archive.get_block(0) == blocks[0]
+
+
+def test_convert_dat_file_with_an_invalid_line(tmp_path: Path) -> None:
+    dat_path = tmp_path / "chain.dat"
+    dat_path.write_text(make_blocks(1)[0].hex() + "\nnot hex\n")
+    with pytest.raises(BlockArchiveError, match="line 2"):
+        convert_dat_file(dat_path)
@@ -0,0 +1,34 @@
+from electrumsv_sdk.components import ComponentStore
+from electrumsv_sdk.constants import ComponentEvent, ComponentState
+
+from .test_components import make_component
+
+
+def test_state_transitions_are_journaled(store: ComponentStore) -> None:
+    store.append_event("node1", "node", ComponentEvent.STARTING)
+    store.update_status_file(make_component("node1"))
+    store.update_status_file(make_component("node1", component_state=ComponentState.STOPPED),
+        exit_code=0)
+    events = store.get_history("node1")
+    assert [event["event"] for event in events] == [ComponentEvent.STARTING,
+        ComponentEvent.RUNNING, ComponentEvent.STOPPED]
+    assert events[-1]["exit_code"] == 0
+    assert store.get_latest_seq() == events[-1]["seq"]
+    assert store.get_events(since_seq=events[0]["seq"], limit=1) == [events[1]]
+
+
+def test_compact_journal(store: ComponentStore) -> None:
+    for _ in range(5):
+        store.append_event("node1", "node", ComponentEvent.STARTING)
+    for _ in range(2):
+        store.append_event("node2", "node", ComponentEvent.STARTING)
+    node1_seqs = [event["seq"] for event in store.get_history("node1")]
+
+    assert store.compact_journal(events_per_component=3) == 2
+    assert [event["seq"] for event in store.get_history("node1")] == node1_seqs[2:]
+    assert len(store.get_history("node2")) == 2
+    assert store.get_compacted_seq() == node1_seqs[1]
+
+    # nothing more to discard
+    assert store.compact_journal(events_per_component=3) == 0
+    assert store.get_compacted_seq() == node1_seqs[1]
@@ -0,0 +1,66 @@
+import pytest
+
+from electrumsv_sdk.components import ComponentStore
+from electrumsv_sdk.constants import ComponentState
+
+from .test_components import make_component
+
+
+def test_lease_ports(store: ComponentStore) -> None:
+    leased = store.lease_ports("node1", "node", {"rpcport": range(18332, 18340),
+        "p2p_port": range(18444, 18450)}, lambda port: True)
+    assert leased == {"rpcport": 18332, "p2p_port": 18444}
+
+    # leased ports are skipped for other components
+    leased = store.lease_ports("node2", "node", {"rpcport": range(18332, 18340),
+        "p2p_port": range(18444, 18450)}, lambda port: True)
+    assert leased == {"rpcport": 18333, "p2p_port": 18445}
+
+    # and ports that are in use by something else
+    leased = store.lease_ports("node3", "node", {"rpcport": range(18332, 18340)},
+        lambda port: port != 18334)
+    assert leased == {"rpcport": 18335}
+    assert sorted(store.get_port_leases()) == [18332, 18333, 18335, 18444, 18445]
+
+
+def test_lease_ports_keeps_the_previous_lease(store: ComponentStore) -> None:
+    store.lease_ports("node1", "node", {"rpcport": [18333]}, lambda port: True)
+    leased = store.lease_ports("node1", "node", {"rpcport": range(18332, 18340)},
+        lambda port: True)
+    assert leased == {"rpcport": 18333}
+    assert list(store.get_port_leases()) == [18333]
+
+
+def test_lease_ports_batch(store: ComponentStore) -> None:
+    leased = store.lease_ports_batch("node", {
+        "node1": {"rpcport": range(18332, 18340)},
+        "node2": {"rpcport": range(18332, 18340)},
+    }, lambda port: True)
+    assert leased == {"node1": {"rpcport": 18332}, "node2": {"rpcport": 18333}}
+
+
+def test_lease_ports_raises_if_none_are_available(store: ComponentStore) -> None:
+    store.lease_ports("node1", "node", {"rpcport": [18332]}, lambda port: True)
+    with pytest.raises(ValueError):
+        store.lease_ports("node2", "node", {"rpcport": [18332]}, lambda port: True)
+    assert list(store.get_port_leases().values())[0]["component_id"] == "node1"
+
+
+def test_release_ports(store: ComponentStore) -> None:
+    store.lease_ports("node1", "node", {"rpcport": [18332], "p2p_port": [18444]},
+        lambda port: True)
+    assert store.release_ports("node1") == 2
+    assert store.get_port_leases() == {}
+    assert store.release_ports("node1") == 0
+
+
+def test_ports_are_released_when_the_component_stops(store: ComponentStore) -> None:
+    store.update_status_file(make_component("node1"))
+    store.lease_ports("node1", "node", {"rpcport": [18332]}, lambda port: True)
+
+    store.update_status_file(make_component("node1", component_state=ComponentState.FAILED),
+        keep_port_leases=True)
+    assert list(store.get_port_leases()) == [18332]
+
+    store.update_status_file(make_component("node1", component_state=ComponentState.STOPPED))
+    assert store.get_port_leases() == {}
@@ -0,0 +1,103 @@
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+
+from electrumsv_sdk.components import Component, ComponentStore
+from electrumsv_sdk.config import Config
+from electrumsv_sdk.constants import ComponentState
+
+
+def make_component(component_id: str, pid: int=1000,
+        component_state: str=ComponentState.RUNNING) -> Component:
+    return Component(component_id, pid, "node", "/components/node", "http://127.0.0.1:18332",
+        component_state, metadata={"rpcport": 18332})
+
+
+def test_update_status_file_round_trip(store: ComponentStore) -> None:
+    store.update_status_file(make_component("node1"))
+    component_dict = store.get_status(component_id="node1")["node1"]
+    assert component_dict["pid"] == 1000
+    assert component_dict["component_state"] == ComponentState.RUNNING
+    assert component_dict["metadata"] == {"rpcport": 18332}
+    assert component_dict["logging_path"] is None
+
+    store.update_status_file(make_component("node1", pid=1001))
+    assert store.get_status(component_id="node1")["node1"]["pid"] == 1001
+    assert list(store.get_status(component_type="node")) == ["node1"]
+
+
+def test_get_status_returns_copies(store: ComponentStore) -> None:
+    store.update_status_file(make_component("node1"))
+    component_dict = store.get_status(component_id="node1")["node1"]
+    assert component_dict["metadata"] is not None
+    component_dict["metadata"]["rpcport"] = 1
+    assert store.get_status(component_id="node1")["node1"]["metadata"] == {"rpcport": 18332}
+
+
+def test_get_status_of_unknown_component(store: ComponentStore) -> None:
+    with pytest.raises(ValueError):
+        store.get_status(component_id="node1")
+
+
+def test_update_metadata(store: ComponentStore) -> None:
+    assert not store.update_metadata("node1", {"time_to_ready": 1.5})
+    store.update_status_file(make_component("node1"))
+    assert store.update_metadata("node1", {"time_to_ready": 1.5})
+    assert store.get_status(component_id="node1")["node1"]["metadata"] == \
+        {"rpcport": 18332, "time_to_ready": 1.5}
+
+
+def test_snapshot_is_discarded_if_the_transaction_is_rolled_back(store: ComponentStore) -> None:
+    store.update_status_file(make_component("node1"))
+    with pytest.raises(RuntimeError):
+        with store.write_transaction():
+            store.read_snapshot()["node1"]["pid"] = 9999
+            raise RuntimeError("the write failed")
+    assert store.get_status(component_id="node1")["node1"]["pid"] == 1000
+
+
+def test_writes_of_other_connections_are_seen(store: ComponentStore) -> None:
+    store.update_status_file(make_component("node1"))
+    store.get_status()  # caches the snapshot
+    store.db.execute("UPDATE components SET pid=2000 WHERE id='node1'")
+    other_db = store.open_database()
+    other_db.execute("UPDATE components SET pid=3000 WHERE id='node1'")
+    other_db.close()
+    assert store.get_status(component_id="node1")["node1"]["pid"] == 3000
+
+
+def write_legacy_json_file(sdk_home: Path, components: Dict[str, Any]) -> Path:
+    legacy_path = sdk_home / "component_state.json"
+    sdk_home.mkdir(parents=True, exist_ok=True)
+    legacy_path.write_text(json.dumps(components))
+    return legacy_path
+
+
+def test_migrate_legacy_json_file(sdk_home: Path) -> None:
+    Config()  # creates config.json
+    legacy_path = write_legacy_json_file(sdk_home, {
+        "node1": make_component("node1").to_dict(),
+        "node2": make_component("node2", pid=1002).to_dict(),
+    })
+
+    store = ComponentStore()
+    assert sorted(store.get_status()) == ["node1", "node2"]
+    assert store.get_status(component_id="node2")["node2"]["pid"] == 1002
+    assert not legacy_path.exists()
+    assert legacy_path.with_suffix(".json.migrated").exists()
+
+
+def test_migrate_legacy_json_file_keeps_existing_rows(store: ComponentStore,
+        sdk_home: Path) -> None:
+    store.update_status_file(make_component("node1", pid=2000))
+    write_legacy_json_file(sdk_home, {
+        "node1": make_component("node1", pid=1000).to_dict(),
+        "node2": make_component("node2", pid=1002).to_dict(),
+    })
+
+    store.migrate_legacy_json_file()
+    status = store.get_status()
+    assert status["node1"]["pid"] == 2000
+    assert status["node2"]["pid"] == 1002
@@ -0,0 +1,131 @@
+import gzip
+import logging
+import os
+from pathlib import Path
+import re
+from typing import Iterator, List
+
+import pytest
+
+from electrumsv_sdk.log_index import LogIndex, LogRecordTypedDict, format_records
+from electrumsv_sdk.log_streaming import parse_timestamp
+
+
+@pytest.fixture
+def logs_dir(tmp_path: Path) -> Path:
+    logs_dir = tmp_path / "logs"
+    (logs_dir / "node" / "node1").mkdir(parents=True)
+    (logs_dir / "supervisor").mkdir(parents=True)
+    return logs_dir
+
+
+@pytest.fixture
+def log_index(tmp_path: Path, logs_dir: Path) -> Iterator[LogIndex]:
+    log_index = LogIndex(logs_dir, tmp_path / "log_index.sqlite")
+    yield log_index
+    log_index.close()
+
+
+def append_lines(path: Path, lines: List[str]) -> None:
+    with open(path, 'a') as f:
+        f.write("".join(line + "\n" for line in lines))
+
+
+def get_messages(records: Iterator[LogRecordTypedDict]) -> List[str]:
+    return [record['lines'][0].split(maxsplit=4)[-1] for record in records]
+
+
+def timestamp(text: str) -> float:
+    result = parse_timestamp(text)
+    assert result is not None
+    return result
+
+
+def test_search_for_errors(log_index: LogIndex, logs_dir: Path) -> None:
+    append_lines(logs_dir / "node" / "node1" / "1.log", [
+        "2022-05-12 10:00:00 INFO     node           started",
+        "2022-05-12 10:00:01 ERROR    node           first error",
+        "Traceback (most recent call last):",
+        "ValueError: boom",
+        "2022-05-12 10:00:02 WARNING  node           a warning",
+    ])
+    append_lines(logs_dir / "supervisor" / "supervisor.log", [
+        "2022-05-12 10:00:03 ERROR    supervisor     second error",
+    ])
+    assert log_index.update() > 0
+
+    records = list(log_index.search(min_level=logging.ERROR))
+    assert get_messages(iter(records)) == ["first error", "second error"]
+    assert records[0]['component_id'] == "node1"
+    assert records[0]['logger_name'] == "node"
+    assert records[0]['lines'][1:] == ["Traceback (most recent call last):", "ValueError: boom"]
+    assert records[1]['component_id'] == "supervisor"
+
+    assert get_messages(log_index.search(min_level=logging.WARNING, component_ids={"node1"})) \
+        == ["first error", "a warning"]
+    assert get_messages(log_index.search(min_level=logging.INFO,
+        since=timestamp("2022-05-12 10:00:01"), until=timestamp("2022-05-12 10:00:02"))) == \
+        ["first error", "a warning"]
+    assert get_messages(log_index.search(min_level=logging.NOTSET,
+        pattern=re.compile("boom"))) == ["first error"]
+    assert list(format_records(log_index.search(), limit=1))[0] == \
+        "node1            | 2022-05-12 10:00:01 ERROR    node           first error"
+
+
+def test_update_only_reads_appended_lines(log_index: LogIndex, logs_dir: Path) -> None:
+    path = logs_dir / "node" / "node1" / "1.log"
+    first_lines = ["2022-05-12 10:00:00 ERROR    node           first error"]
+    append_lines(path, first_lines)
+    assert log_index.update() == len(first_lines[0]) + 1
+    assert log_index.update() == 0
+
+    second_lines = ["2022-05-12 10:00:05 ERROR    node           second error"]
+    append_lines(path, second_lines)
+    # a line that is still being written is indexed by the next update
+    with open(path, 'a') as f:
+        f.write("2022-05-12 10:00:06 ERROR    node")
+    assert log_index.update() == len(second_lines[0]) + 1
+    assert get_messages(log_index.search()) == ["first error", "second error"]
+
+    with open(path, 'a') as f:
+        f.write("           third error\n")
+    log_index.update()
+    assert get_messages(log_index.search()) == ["first error", "second error", "third error"]
+
+    [log_file] = log_index.get_files()
+    assert log_file['first_timestamp'] == timestamp("2022-05-12 10:00:00")
+    assert log_file['last_timestamp'] == timestamp("2022-05-12 10:00:06")
+    assert log_index.get_files(since=timestamp("2022-05-12 10:00:07")) == []
+
+
+def test_replaced_and_removed_files(log_index: LogIndex, logs_dir: Path) -> None:
+    path = logs_dir / "node" / "node1" / "1.log"
+    append_lines(path, ["2022-05-12 10:00:00 ERROR    node           first error"])
+    log_index.update()
+
+    # e.g. rotated and compressed
+    with gzip.open(path.with_name("1.log.gz"), 'wb') as f:
+        f.write(path.read_bytes())
+    # (written alongside first so that the new file cannot reuse the inode of the old one)
+    new_path = path.with_name("1.log.new")
+    new_path.write_text("2022-05-12 10:00:05 ERROR    node           second error\n")
+    os.replace(new_path, path)
+    log_index.update()
+    assert get_messages(log_index.search()) == ["first error", "second error"]
+
+    path.with_name("1.log.gz").unlink()
+    log_index.update()
+    assert get_messages(log_index.search()) == ["second error"]
+
+
+def test_get_counts(log_index: LogIndex, logs_dir: Path) -> None:
+    append_lines(logs_dir / "node" / "node1" / "1.log", [
+        "2022-05-12 10:00:00 INFO     node           started",
+        "2022-05-12 10:00:01 ERROR    node           an error",
+        "2022-05-12 10:00:02 ERROR    node           another error",
+        "2022-05-12 10:00:03 INFO     rpc            a call",
+    ])
+    log_index.update()
+    counts = log_index.get_counts(log_index.get_files())
+    assert [(count['level'], count['logger_name'], count['count']) for count in counts] == \
+        [(logging.ERROR, "node", 2), (logging.INFO, "node", 1), (logging.INFO, "rpc", 1)]
@@ -0,0 +1,163 @@
+from pathlib import Path
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+from electrumsv_sdk import utils
+from electrumsv_sdk.block_archive import BlockArchiveWriter
+from electrumsv_sdk.node_rpc import NodeRPCError
+from electrumsv_sdk.utils import get_block_batches, get_export_progress_path, parse_rpc_call, \
+    read_raw_hex_blocks, write_raw_blocks_to_file
+
+
+def make_hex_blocks(sizes: List[int]) -> List[Tuple[int, str]]:
+    return [(height, "00" * size) for height, size in enumerate(sizes)]
+
+
+def get_batch_heights(batches: List[List[Tuple[int, str]]]) -> List[List[int]]:
+    return [[height for height, _raw_hex_block in batch] for batch in batches]
+
+
+def test_get_block_batches_by_count() -> None:
+    blocks = make_hex_blocks([100] * 5)
+    batches = list(get_block_batches(iter(blocks), window=2))
+    assert get_batch_heights(batches) == [[0, 1], [2, 3], [4]]
+    assert [block for batch in batches for block in batch] == blocks
+
+
+def test_get_block_batches_by_size() -> None:
+    blocks = make_hex_blocks([400, 400, 300, 100, 1000, 100])
+    batches = list(get_block_batches(iter(blocks), window=16, window_bytes=1000))
+    # a block that is larger than 'window_bytes' is submitted by itself
+    assert get_batch_heights(batches) == [[0, 1], [2, 3], [4], [5]]
+
+
+def test_get_block_batches_of_nothing() -> None:
+    assert list(get_block_batches(iter([]), window=16)) == []
+
+
+def test_read_raw_hex_blocks_of_a_dat_file(tmp_path: Path) -> None:
+    dat_path = tmp_path / "chain.dat"
+    dat_path.write_text("aa\n\nbb\ncc\ndd\n")
+    assert list(read_raw_hex_blocks(dat_path)) == [(0, "aa"), (1, "bb"), (2, "cc"), (3, "dd")]
+    assert list(read_raw_hex_blocks(dat_path, from_height=11, to_height=12,
+        first_height=10)) == [(11, "bb"), (12, "cc")]
+
+
+def test_read_raw_hex_blocks_of_a_block_archive(tmp_path: Path) -> None:
+    archive_path = tmp_path / "chain.blocks"
+    with BlockArchiveWriter(archive_path) as writer:
+        for height in range(10, 14):
+            writer.append(height, bytes([height]) * 80)
+    assert list(read_raw_hex_blocks(archive_path, from_height=11, to_height=12)) == \
+        [(11, "0b" * 80), (12, "0c" * 80)]
+
+
+@pytest.mark.parametrize("line", ["", "   ", "# a comment", "  # an indented comment"])
+def test_parse_rpc_call_of_blank_lines_and_comments(line: str) -> None:
+    assert parse_rpc_call(line) is None
+
+
+@pytest.mark.parametrize("line,expected", [
+    ("getblockcount", ("getblockcount", [])),
+    ("getblockhash 10", ("getblockhash", [10])),
+    ("  generatetoaddress 1 'an address'  ", ("generatetoaddress", [1, "an address"])),
+    ("getblock 00ff false", ("getblock", ["00ff", False])),
+    ('["getblockhash", 10]', ("getblockhash", [10])),
+    ('["getblockcount"]', ("getblockcount", [])),
+    ('{"method": "getblockhash", "params": [10]}', ("getblockhash", [10])),
+    ('{"method": "getblockcount"}', ("getblockcount", [])),
+])
+def test_parse_rpc_call(line: str, expected: Tuple[str, List[object]]) -> None:
+    assert parse_rpc_call(line) == expected
+
+
+@pytest.mark.parametrize("line", [
+    "getblock 'unterminated",
+    '["getblockhash", 10',
+    "[]",
+    "[10]",
+    '{"params": [10]}',
+    '{"method": "getblockhash", "params": 10}',
+])
+def test_parse_rpc_call_of_invalid_lines(line: str) -> None:
+    with pytest.raises(ValueError):
+        parse_rpc_call(line)
+
+
+class FakeNodeClient:
+    """answers getblockbyheight out of order (the later heights first) and fails at
+    'failing_height' (if given)"""
+
+    def __init__(self, chain_height: int, failing_height: Optional[int]=None) -> None:
+        self.chain_height = chain_height
+        self.failing_height = failing_height
+        self.requested_heights: List[int] = []
+
+    def call(self, method: str, *args: Any) -> Dict[str, Any]:
+        if method == "getinfo":
+            return {"result": {"blocks": self.chain_height}, "error": None}
+        assert method == "getblockbyheight"
+        height = args[0]
+        self.requested_heights.append(height)
+        time.sleep(0.001 * (10 - height % 10))
+        if height == self.failing_height:
+            return {"result": None, "error": {"code": -8, "message": "Block height out of range"}}
+        return {"result": get_hex_block(height), "error": None}
+
+
+def get_hex_block(height: int) -> str:
+    return bytes([height]).hex() * 80
+
+
+@pytest.fixture
+def node_client(monkeypatch: pytest.MonkeyPatch) -> FakeNodeClient:
+    node_client = FakeNodeClient(chain_height=20)
+    monkeypatch.setattr(utils, "get_node_rpc_client", lambda node_id: node_client)
+    return node_client
+
+
+def test_write_raw_blocks_to_a_dat_file(tmp_path: Path, node_client: FakeNodeClient) -> None:
+    dat_path = tmp_path / "chain.dat"
+    write_raw_blocks_to_file(dat_path, "node1", from_height=3, to_height=15, window=4)
+    assert dat_path.read_text().splitlines() == [get_hex_block(height)
+        for height in range(3, 16)]
+    assert not get_export_progress_path(dat_path).exists()
+
+    # the whole chain by default
+    dat_path.unlink()
+    write_raw_blocks_to_file(dat_path, "node1")
+    assert len(dat_path.read_text().splitlines()) == 21
+
+
+def test_resume_writing_raw_blocks_to_a_dat_file(tmp_path: Path,
+        node_client: FakeNodeClient) -> None:
+    dat_path = tmp_path / "chain.dat"
+    node_client.failing_height = 12
+    with pytest.raises(NodeRPCError):
+        write_raw_blocks_to_file(dat_path, "node1", from_height=3, to_height=15, window=4)
+    assert get_export_progress_path(dat_path).exists()
+
+    node_client.failing_height = None
+    node_client.requested_heights.clear()
+    write_raw_blocks_to_file(dat_path, "node1", from_height=3, to_height=15, window=4)
+    assert sorted(node_client.requested_heights) == list(range(12, 16))
+    assert dat_path.read_text().splitlines() == [get_hex_block(height)
+        for height in range(3, 16)]
+    assert not get_export_progress_path(dat_path).exists()
+
+
+def test_write_raw_blocks_to_a_block_archive(tmp_path: Path,
+        node_client: FakeNodeClient) -> None:
+    archive_path = tmp_path / "chain.blocks"
+    node_client.failing_height = 12
+    with pytest.raises(NodeRPCError):
+        write_raw_blocks_to_file(archive_path, "node1", from_height=3, to_height=15, window=4)
+
+    node_client.failing_height = None
+    node_client.requested_heights.clear()
+    write_raw_blocks_to_file(archive_path, "node1", from_height=3, to_height=15, window=4)
+    assert sorted(node_client.requested_heights) == list(range(12, 16))
+    assert list(read_raw_hex_blocks(archive_path)) == [(height, get_hex_block(height))
+        for height in range(3, 16)]
@@ -1,33 +1,65 @@
 import base64
+import collections
+import concurrent.futures
+import errno
+import itertools
 import json
 import logging
 import os
 import shlex
 import signal
+import socket
 import subprocess
 import sys
 import threading
 import time
 from pathlib import Path
-from typing import List, Dict, Optional, Union, Any
-
-import bitcoinx
-import colorama
-import psutil
-import tailer
-from electrumsv_node import electrumsv_node
+from typing import Any, Callable, Deque, Generator, Iterator, List, Dict, Optional, Tuple, \
+    TypedDict, Union, cast
 
 from .app_versions import APP_VERSIONS
+from .block_archive import BlockArchive, BlockArchiveWriter, delete_block_archive, \
+    is_block_archive
+from .cgroups import ComponentCgroup, ResourceLimitsTypedDict
+from .cpu_affinity import pinned_to
 from .components import Component, ComponentStore, ComponentTypedDict, ComponentMetadata
 from .config import Config
+from .node_rpc import NodeRPCError, RPCCall, get_batch_responses, get_node_rpc_client
 from .constants import ComponentState, SUCCESS_EXITCODE, SIGINT_EXITCODE, SIGKILL_EXITCODE, \
-    SIGINT_EXITCODE_LINUX, SIGKILL_EXITCODE_LINUX
+    SIGINT_EXITCODE_LINUX, SIGKILL_EXITCODE_LINUX, RestartPolicy
 from .sdk_types import SubprocessCallResult
+from .supervisor_client import RestartPolicyTypedDict, SpawnRequestTypedDict, SpawnResult, \
+    spawn_supervised_child
 
 
+# NOTE: third-party dependencies (bitcoinx, colorama, electrumsv_node, psutil) are imported
+# inside the functions that use them to keep the cold start time of the cli down
+# (see: contrib/check_import_time.py)
 logger = logging.getLogger("utils")
 MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# handles of the processes spawned by this process {component_id: process}. These only matter for
+# the long-lived supervisor daemon which reaps them when they exit (see: supervisor.py)
+spawned_processes: Dict[str, subprocess.Popen] = {}
+
+# set when running inside of the supervisor daemon - background components are then spawned and
+# watched by the supervisor process itself rather than by a run_background.py wrapper process
+supervised_spawn_handler: Optional[Callable[[SpawnRequestTypedDict], int]] = None
+
+# the number of blocks that write_raw_blocks_to_file requests at a time
+EXPORT_WINDOW = 8
+EXPORT_REPORT_INTERVAL = 5.0  # seconds (the progress is also recorded for resuming)
+# the maximum number of blocks (and of their bytes) per batch of 'submitblock' calls that
+# submit_blocks_from_file sends at a time (a larger block is sent on its own)
+SUBMIT_WINDOW = 16
+SUBMIT_WINDOW_BYTES = 16 * 1024 * 1024
+# the 'submitblock' results (see: BIP22) of blocks that are in the node's block index
+SUBMIT_ACCEPTED_RESULTS = {None, "duplicate", "inconclusive"}
+
+# how long to wait for processes to exit after SIGKILL
+SIGKILL_WAIT_TIMEOUT = 5.0
+ZOMBIE_CHECK_INTERVAL = 0.05
+
 
 def checkout_branch(branch: str) -> None:
     if branch != "":
@@ -35,6 +67,7 @@ def checkout_branch(branch: str) -> None:
 
 
 def topup_wallet() -> None:
+    from electrumsv_node import electrumsv_node
     logger.debug("Topping up wallet...")
     nblocks = 1
     toaddress = "mwv1WZTsrtKf3S9mRQABEeMaNefLbQbKpg"
@@ -89,22 +122,31 @@ def read_sdk_version() -> str:
 
 
 def port_is_in_use(port: int) -> bool:
-    netstat_cmd = "netstat -an"
-    skip_match: str = ""
-    if sys.platform in {'linux', 'darwin'}:
-        netstat_cmd = "netstat -antu"
-    else:
-        skip_match = "TIME_WAIT"
-
-    filter_set = {f'127.0.0.1:{port}', f'0.0.0.0:{port}', f'[::]:{port}', f'[::1]:{port}'}
-    result = subprocess.run(netstat_cmd, shell=True, check=True,
-        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    for line in str(result.stdout).split(r'\r\n'):
-        columns = line.split()
-        if len(columns) > 1 and columns[1] in filter_set:
-            if skip_match and skip_match in columns:
-                continue
+    """Probes by binding (without listening) in-process rather than parsing the output of netstat
+    which costs a subprocess per candidate port. Both the loopback and the wildcard address are
+    tried because on windows binding the wildcard address succeeds even if another socket is
+    bound to 127.0.0.1 on the same port. The IPv6 wildcard address catches IPv6-only listeners
+    (if IPv6 is available)."""
+    addresses = [(socket.AF_INET, '127.0.0.1'), (socket.AF_INET, '0.0.0.0')]
+    if socket.has_ipv6:
+        addresses.append((socket.AF_INET6, '::'))
+    for family, host in addresses:
+        try:
+            sock = socket.socket(family, socket.SOCK_STREAM)
+        except OSError:
+            continue  # e.g. IPv6 is disabled in the kernel
+        try:
+            if sys.platform != 'win32':
+                # ignore connections lingering in TIME_WAIT (on windows this would instead allow
+                # binding to a port that another socket is listening on)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((host, port))
+        except OSError as e:
+            if family == socket.AF_INET6 and e.errno in (errno.EADDRNOTAVAIL, errno.EAFNOSUPPORT):
+                continue  # there is no IPv6 address to bind to
             return True
+        finally:
+            sock.close()
     return False
 
 
@@ -115,6 +157,7 @@ def get_directory_name(component__file__: str) -> str:
 
 
 def get_parent_and_child_pids(parent_pid: int) -> Optional[List[int]]:
+    import psutil
     try:
         pids = []
         parent = psutil.Process(parent_pid)
@@ -150,48 +193,107 @@ def sigint(pid: int, is_new_terminal: bool=False) -> None:
 
 
 def sigkill(parent_pid: int) -> None:
-    """kill process if sigint failed"""
+    """kill process (and all of its children) if sigint failed"""
+    import psutil
     pids = get_parent_and_child_pids(parent_pid)
     if pids:
         for pid in pids:
-            if sys.platform in ('linux', 'darwin'):
-                process = subprocess.Popen(f"/bin/bash -c 'kill -9 {pid}'", shell=True)
-                process.wait()
-            elif sys.platform == 'win32':
-                if psutil.pid_exists(pid):
-                    subprocess.run(f"taskkill.exe /PID {pid} /T /F")
+            try:
+                psutil.Process(pid).kill()
+            except psutil.NoSuchProcess:
+                pass
+
+
+def get_own_process_group(pid: int) -> Optional[int]:
+    """the process group of the component if it was spawned as the leader of its own process
+    group / session (see: popen_background) - the whole group can then be signalled at once"""
+    if sys.platform not in ("linux", "darwin"):
+        return None
+    try:
+        pgid = os.getpgid(pid)
+    except OSError:
+        return None
+    if pgid != pid or pgid == os.getpgrp():
+        return None
+    return pgid
 
 
 def kill_by_pid(parent_pid: Optional[int], graceful_wait_period: float=0.0,
-        is_new_terminal: bool=False) -> None:
-    """kills parent and all children"""
+        is_new_terminal: bool=False) -> Optional[float]:
+    """Kills parent and all children. Waits up to 'graceful_wait_period' seconds for them to exit
+    after SIGINT before escalating to SIGKILL. Returns the number of seconds it took for all of
+    them to exit (None if the process does not exist)."""
+    import psutil
     if not parent_pid:
-        return
-    pid_list = get_parent_and_child_pids(parent_pid=parent_pid)
-    if not pid_list:
-        return
+        return None
+    try:
+        parent = psutil.Process(parent_pid)
+        processes = [parent] + parent.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return None
 
-    for pid in pid_list:
-        sigint(pid, is_new_terminal)
+    def on_terminate(process: psutil.Process) -> None:
+        logger.debug(f"pid: {process.pid} exited with: {process.returncode}")
 
-    if graceful_wait_period:
-        t0 = time.time()
-        while time.time() - t0 < graceful_wait_period:
-            if not any(psutil.pid_exists(pid) for pid in pid_list):
-                return
-            time.sleep(0.2)
+    def is_running(process: psutil.Process) -> bool:
+        # a zombie has exited already and is only waiting for its (new) parent to reap it
+        try:
+            return process.status() != psutil.STATUS_ZOMBIE
+        except psutil.NoSuchProcess:
+            return False
+
+    def wait_for_exit(processes: List[psutil.Process], timeout: float) -> List[psutil.Process]:
+        """returns the processes that are still running. psutil.wait_procs() is event-driven for
+        our own children and otherwise polls with an increasing interval"""
+        deadline = time.time() + timeout
+        alive = processes
+        while True:
+            _gone, alive = psutil.wait_procs(alive, timeout=min(max(deadline - time.time(), 0),
+                ZOMBIE_CHECK_INTERVAL), callback=on_terminate)
+            alive = [process for process in alive if is_running(process)]
+            if not alive or time.time() >= deadline:
+                return alive
+
+    t0 = time.time()
+    process_group = get_own_process_group(parent_pid)
+    if process_group:
+        # also reaches descendants that have been re-parented (i.e. are no longer children)
+        try:
+            os.killpg(process_group, signal.SIGINT)
+        except ProcessLookupError:
+            pass
+    else:
+        for process in processes:
+            sigint(process.pid, is_new_terminal)
 
-    for pid in pid_list:
-        # sometimes we can't be sure which is the parent and which is child
-        # hence check to see if the pid still exists
-        if psutil.pid_exists(pid):
-            sigkill(parent_pid=pid)
+    alive = wait_for_exit(processes, graceful_wait_period)
+    if alive:
+        logger.debug(f"escalating to SIGKILL for pids: {[process.pid for process in alive]}")
+        if process_group:
+            try:
+                os.killpg(process_group, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        for process in alive:
+            try:
+                process.kill()
+            except psutil.NoSuchProcess:
+                pass
+        alive = wait_for_exit(alive, SIGKILL_WAIT_TIMEOUT)
+        if alive:
+            logger.error(f"pids: {[process.pid for process in alive]} did not exit after SIGKILL")
+    return time.time() - t0
 
 
 def kill_process(component_dict: ComponentTypedDict, graceful_wait_period: float=0.0,
         is_new_terminal: bool=False) -> None:
     pid = component_dict['pid']
-    kill_by_pid(pid, graceful_wait_period=graceful_wait_period, is_new_terminal=is_new_terminal)
+    stop_latency = kill_by_pid(pid, graceful_wait_period=graceful_wait_period,
+        is_new_terminal=is_new_terminal)
+    if stop_latency is not None:
+        logger.info(f"stopped {component_dict['id']} in {stop_latency:.2f} seconds")
+        ComponentStore().update_metadata(component_dict['id'],
+            ComponentMetadata(stop_latency=round(stop_latency, 3)))
 
 
 def is_default_component_id(component_name: str, component_id: str) -> bool:
@@ -217,18 +319,18 @@ def is_docker() -> bool:
 
 
 def tail(logfile: Path) -> None:
+    """prints the lines of the logfile as they are written (blocks)"""
+    import colorama
+    from .log_streaming import follow_file
+    # on windows the ANSI colour codes of the component's output are converted
     colorama.init()
-    for line in tailer.follow(open(logfile), delay=0.3):
-        # "https://www.devdungeon.com/content/colorize-terminal-output-python"
-        # If using Windows, init() will cause anything sent to stdout or stderr
-        # will have ANSI color codes converted to the Windows versions. Hooray!
-        # If you are already using an ANSI compliant shell, it won't do anything
-        print(line)
+    follow_file(logfile)
 
 
-def update_status_monitor(pid: int, component_state: Optional[str], id: str,
+def update_status_monitor(pid: Optional[int], component_state: Optional[str], id: str,
         component_name: str, src: Optional[Path]=None, logfile: Optional[Path]=None,
-        status_endpoint: Optional[str]=None, metadata: Optional[ComponentMetadata]=None) -> None:
+        status_endpoint: Optional[str]=None, metadata: Optional[ComponentMetadata]=None,
+        exit_code: Optional[int]=None) -> None:
 
     component_info = Component(id, pid, component_name, str(src),
         status_endpoint=status_endpoint, component_state=component_state,
@@ -236,30 +338,33 @@ def update_status_monitor(pid: int, component_state: Optional[str], id: str,
 
     # can re-instantiate ComponentStore in the child process (it is multiprocess safe)
     component_store = ComponentStore()
-    component_store.update_status_file(component_info)
+    component_store.update_status_file(component_info, exit_code=exit_code)
+
+
+def get_exit_component_state(returncode: int) -> str:
+    # on windows signal.CTRL_C_EVENT gives back SUCCESS_EXITCODE (0)
+    if returncode in {SUCCESS_EXITCODE, SIGINT_EXITCODE, SIGKILL_EXITCODE,
+            SIGINT_EXITCODE_LINUX, SIGKILL_EXITCODE_LINUX}:
+        return ComponentState.STOPPED
+    return ComponentState.FAILED
 
 
 def spawn_inline(command: str, env_vars: Dict[str, str], id: str, component_name: str,
         src: Optional[Path]=None, logfile: Optional[Path]=None, status_endpoint: Optional[str]=None,
-        metadata: Optional[ComponentMetadata]=None) -> None:
+        metadata: Optional[ComponentMetadata]=None, cwd: Optional[Path]=None) -> None:
     """only for running servers with logging requirements - not for simple commands"""
 
     def update_state(process: SubprocessCallResult,
             component_state: Optional[str]) -> None:
         update_status_monitor(pid=process.pid, component_state=component_state, id=id,
             component_name=component_name, src=src, logfile=logfile,
-            status_endpoint=status_endpoint, metadata=metadata)
+            status_endpoint=status_endpoint, metadata=metadata, exit_code=process.returncode)
 
     def on_start(process: SubprocessCallResult) -> None:
         update_state(process, ComponentState.RUNNING)
 
     def on_exit(process: SubprocessCallResult) -> None:
-        # on windows signal.CTRL_C_EVENT gives back SUCCESS_EXITCODE (0)
-        if process.returncode in {SUCCESS_EXITCODE, SIGINT_EXITCODE, SIGKILL_EXITCODE,
-                SIGINT_EXITCODE_LINUX, SIGKILL_EXITCODE_LINUX}:
-            update_state(process, ComponentState.STOPPED)
-        elif process.returncode != SUCCESS_EXITCODE:
-            update_state(process, ComponentState.FAILED)
+        update_state(process, get_exit_component_state(process.returncode))
 
     env = os.environ.copy()
     if not env_vars:
@@ -273,10 +378,10 @@ def spawn_inline(command: str, env_vars: Dict[str, str], id: str, component_name
                 # direct logs to file
                 if sys.platform == 'win32':
                     process = subprocess.Popen(command, stdout=logfile_handle,
-                        stderr=logfile_handle, env=env)
+                        stderr=logfile_handle, env=env, cwd=cwd)
                 elif sys.platform in {'linux', 'darwin'}:
                     process = subprocess.Popen(f"{command}", shell=True, stdout=logfile_handle,
-                        stderr=logfile_handle, env=env)
+                        stderr=logfile_handle, env=env, cwd=cwd)
 
                 # tail logs from file into stdout (blocks in a thread)
                 t = threading.Thread(target=tail, args=(logfile, ), daemon=True)
@@ -289,9 +394,9 @@ def spawn_inline(command: str, env_vars: Dict[str, str], id: str, component_name
                 t.join(0.5)  # allow time for background thread to dump logs
         else:
             if sys.platform == 'win32':
-                process = subprocess.Popen(command, env=env)
+                process = subprocess.Popen(command, env=env, cwd=cwd)
             elif sys.platform in {'linux', 'darwin'}:
-                process = subprocess.Popen(f"{command}", shell=True, env=env)
+                process = subprocess.Popen(f"{command}", shell=True, env=env, cwd=cwd)
 
             on_start(process)
             process.wait()
@@ -305,26 +410,93 @@ def spawn_inline(command: str, env_vars: Dict[str, str], id: str, component_name
 
 def spawn_background_supervised(command: str, env_vars: Dict[str,str], id: str, component_name:
         str, src: Optional[Path]=None, logfile: Optional[Path]=None,
-        status_endpoint: Optional[str]=None, metadata: Optional[ComponentMetadata]=None) -> None:
-    """spawns a child process that can wait for the process to exit and check the returncode"""
-    run_background_script = Path(MODULE_DIR).joinpath("scripts/run_background.py")
+        status_endpoint: Optional[str]=None, metadata: Optional[ComponentMetadata]=None,
+        cwd: Optional[Path]=None, restart_policy: Optional[RestartPolicyTypedDict]=None,
+        resource_limits: Optional[ResourceLimitsTypedDict]=None,
+        cpu_affinity: Optional[List[int]]=None) -> None:
+    """The supervisor daemon (see: supervisor.py) spawns the process and records its exit code
+    (and enforces the restart policy) if it is running or if it is started on demand (see:
+    Config.is_supervisor_autostart_enabled). Otherwise (and on windows or with
+    SDK_NO_SUPERVISOR=1) a run_background.py wrapper process is spawned instead to wait for the
+    process to exit. Exits if the supervisor failed to spawn the process."""
     component_info = Component(id, None, component_name, str(src),
         status_endpoint=status_endpoint, component_state=None,
         metadata=metadata, logging_path=logfile)
-    component_json = json.dumps(component_info.to_dict())
-    os.environ["SCRIPT_COMPONENT_INFO"] = wrap_and_escape_text(component_json)
-    os.environ["SCRIPT_COMMAND"] = wrap_and_escape_text(command)
 
+    # only the child's environment is modified (components may be started concurrently)
     env = os.environ.copy()
     if env_vars:
         env.update(env_vars)
 
+    spawn_request = SpawnRequestTypedDict(type="spawn", component=dict(component_info.to_dict()),
+        command=command, env=env, cwd=str(cwd) if cwd else os.getcwd())
+    if restart_policy is not None:
+        spawn_request['restart_policy'] = restart_policy
+    if resource_limits is not None:
+        spawn_request['resource_limits'] = resource_limits
+    if cpu_affinity:
+        spawn_request['cpu_affinity'] = cpu_affinity
+    if supervised_spawn_handler is not None:
+        supervised_spawn_handler(spawn_request)
+        return
+    spawn_result = spawn_supervised_child(spawn_request)
+    if spawn_result == SpawnResult.FAILED:
+        sys.exit(1)
+    if spawn_result == SpawnResult.SPAWNED:
+        return
+
+    if restart_policy is not None and restart_policy['policy'] != RestartPolicy.NEVER:
+        logger.warning(f"the supervisor is not available - {id} will not be restarted "
+            f"(restart policy: {restart_policy['policy']})")
+    if resource_limits is not None:
+        logger.warning(f"the supervisor is not available - {id} is started without resource "
+            f"limits")
+    run_background_script = Path(MODULE_DIR).joinpath("scripts/run_background.py")
+    component_json = json.dumps(component_info.to_dict())
+    env["SCRIPT_COMPONENT_INFO"] = wrap_and_escape_text(component_json)
+    env["SCRIPT_COMMAND"] = wrap_and_escape_text(command)
+
     if sys.platform == "win32":
         cmd = shlex.split(f"{sys.executable} {run_background_script}", posix=False)
-        subprocess.Popen(cmd, env=env, creationflags=subprocess.DETACHED_PROCESS)
+        process = subprocess.Popen(cmd, env=env, cwd=cwd,
+            creationflags=subprocess.DETACHED_PROCESS)
     else:
         cmd = shlex.split(f"{sys.executable} {run_background_script}", posix=True)
-        subprocess.Popen(cmd, env=env)
+        # inherited by the component that the wrapper spawns
+        with pinned_to(cpu_affinity):
+            process = subprocess.Popen(cmd, env=env, cwd=cwd)
+    spawned_processes[id] = process
+
+
+def popen_background(command: str, env: Dict[str, str], logfile: Optional[Path]=None,
+        cwd: Optional[Path]=None, append_to_logfile: bool=False, pipe_output: bool=False,
+        cgroup: Optional[ComponentCgroup]=None, cpu_affinity: Optional[List[int]]=None) \
+        -> subprocess.Popen:
+    """stdout and stderr are directed to the logfile (if any) or to a pipe (if 'pipe_output') that
+    the caller must drain (see: log_rotation.py). On linux and macos the process leads its own
+    session (and process group) so that it can be stopped as a group (see: kill_by_pid) and does
+    not receive signals meant for the process that spawned it. A restarted component appends to
+    the logfile of the run that it replaces. It is started in 'cgroup' and pinned to the cpus
+    of 'cpu_affinity' (linux only) if given."""
+    kwargs: Dict[str, Any] = {}
+    if sys.platform == "win32":
+        args: Union[str, List[str]] = command
+        kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+    else:
+        args = shlex.split(command, posix=True)
+        if cgroup is not None:
+            args = cgroup.wrap_args(args)
+        kwargs["start_new_session"] = True
+
+    with pinned_to(cpu_affinity):
+        if pipe_output:
+            return subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                stdin=subprocess.DEVNULL, env=env, cwd=cwd, **kwargs)
+        if not logfile:
+            return subprocess.Popen(args, env=env, cwd=cwd, **kwargs)
+        with open(f'{logfile}', 'a' if append_to_logfile else 'w') as logfile_handle:
+            return subprocess.Popen(args, stdout=logfile_handle, stderr=logfile_handle, env=env,
+                cwd=cwd, **kwargs)
 
 
 def spawn_background(command: str, env_vars: Dict[Any, Any], id: str, component_name:
@@ -338,36 +510,15 @@ def spawn_background(command: str, env_vars: Dict[Any, Any], id: str, component_
     def update_state(process: SubprocessCallResult, component_state: str) -> None:
         update_status_monitor(pid=process.pid, component_state=component_state, id=id,
             component_name=component_name, src=src, logfile=logfile,
-            status_endpoint=status_endpoint, metadata=metadata)
+            status_endpoint=status_endpoint, metadata=metadata, exit_code=process.returncode)
 
     def on_start(process: SubprocessCallResult) -> None:
         update_state(process, ComponentState.RUNNING)
 
     def on_exit(process: SubprocessCallResult) -> None:
-        # on windows signal.CTRL_C_EVENT gives back SUCCESS_EXITCODE (0)
-        if process.returncode in {SUCCESS_EXITCODE, SIGINT_EXITCODE, SIGKILL_EXITCODE,
-                SIGINT_EXITCODE_LINUX, SIGKILL_EXITCODE_LINUX}:
-            update_state(process, ComponentState.STOPPED)
-        elif process.returncode != SUCCESS_EXITCODE:
-            update_state(process, ComponentState.FAILED)
-
-    if logfile:
-        with open(f'{logfile}', 'w') as logfile_handle:
-            # direct stdout and stderr to file
-            if sys.platform == "win32":
-                process = subprocess.Popen(command, stdout=logfile_handle, stderr=logfile_handle,
-                    env=env, creationflags=subprocess.CREATE_NO_WINDOW)
-            else:
-                process = subprocess.Popen(shlex.split(command, posix=True), stdout=logfile_handle,
-                    stderr=logfile_handle, env=env)
-    else:
-        # no logging
-        if sys.platform == "win32":
-            process = subprocess.Popen(command, env=env,
-                creationflags=subprocess.CREATE_NO_WINDOW)
-        else:
-            process = subprocess.Popen(shlex.split(command), env=env)
+        update_state(process, get_exit_component_state(process.returncode))
 
+    process = popen_background(command, env, logfile)
     on_start(process)
     process.wait()
     on_exit(process)
@@ -380,12 +531,14 @@ def wrap_and_escape_text(string: str) -> str:
 
 def spawn_new_terminal(command: str, env_vars: Dict[str, str], id: str, component_name:
         str, src: Optional[Path]=None, logfile: Optional[Path]=None,
-        status_endpoint: Optional[str]=None, metadata: Optional[ComponentMetadata]=None) -> None:
+        status_endpoint: Optional[str]=None, metadata: Optional[ComponentMetadata]=None,
+        cwd: Optional[Path]=None) -> None:
     config = Config()
     env_vars.update(os.environ)
 
     def write_env_vars_to_temp_file():
         """encrypted for security in case it is not cleaned up as expected"""
+        import bitcoinx
         env_vars_json = json.dumps(dict(env_vars))
         secret = os.urandom(32)
         key = bitcoinx.PrivateKey(secret)
@@ -418,53 +571,218 @@ def spawn_new_terminal(command: str, env_vars: Dict[str, str], id: str, componen
         title = f"{component_name} v{app_version}"
         split_command = shlex.split(f"xterm -T '{title}' -geometry 200x200 -fa 'Monospace' "
                                     f"-fs 10 -e {command}", posix=True)
-        subprocess.Popen(split_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-            stdin=subprocess.PIPE)
+        spawned_processes[id] = subprocess.Popen(split_command, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, stdin=subprocess.PIPE, cwd=cwd)
 
     elif sys.platform == 'darwin':
+        # new Terminal windows always open in the home directory
+        if cwd:
+            command = f"cd {shlex.quote(str(cwd))} && {command}"
         split_command = ['osascript', '-e',
             f"tell application \"Terminal\" to do script \"{command}\""]
-        subprocess.Popen(split_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-            stdin=subprocess.PIPE)
+        spawned_processes[id] = subprocess.Popen(split_command, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, stdin=subprocess.PIPE)
 
     elif sys.platform == 'win32':
         # NOTE: Window title is set in `run_inline.py` script (whereas for linux we use xterm args)
         split_command = shlex.split(f"cmd /c {command}", posix=False)
-        subprocess.Popen(split_command, creationflags=subprocess.CREATE_NEW_CONSOLE)
+        spawned_processes[id] = subprocess.Popen(split_command, cwd=cwd,
+            creationflags=subprocess.CREATE_NEW_CONSOLE)
 
 
-def write_raw_blocks_to_file(filepath: Union[Path, str], node_id: str,
-        from_height: Optional[int]=None, to_height: Optional[int]=None) -> None:
+class ExportProgressTypedDict(TypedDict):
+    from_height: int
+    to_height: int
+    next_height: int  # the first height that has not been written yet
+    offset: int  # the size of the file once 'next_height - 1' was written
 
+
+class SubmitBlocksResultTypedDict(TypedDict):
+    submitted: int
+    rejected: int
+    num_bytes: int
+    seconds: float
+
+
+class ThroughputMeter:
+    """Logs the progress of a transfer of blocks every 'interval' seconds."""
+
+    def __init__(self, description: str, total_blocks: Optional[int],
+            interval: float=EXPORT_REPORT_INTERVAL) -> None:
+        self.description = description
+        self.total_blocks = total_blocks
+        self.interval = interval
+        self.blocks = 0
+        self.num_bytes = 0
+        self.start_time = self.last_report_time = time.time()
+
+    def get_rates(self) -> str:
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        return f"{self.blocks / elapsed:.1f} blocks/s, " \
+            f"{self.num_bytes / elapsed / 1024 / 1024:.2f} MB/s"
+
+    def update(self, num_bytes: int) -> bool:
+        """True if the progress was logged"""
+        self.blocks += 1
+        self.num_bytes += num_bytes
+        if time.time() - self.last_report_time < self.interval:
+            return False
+        self.last_report_time = time.time()
+        total = f"/{self.total_blocks}" if self.total_blocks is not None else ""
+        logger.info(f"{self.description} {self.blocks}{total} blocks ({self.get_rates()})")
+        return True
+
+    def get_elapsed(self) -> float:
+        return time.time() - self.start_time
+
+    def log_summary(self) -> None:
+        logger.info(f"{self.description} {self.blocks} blocks in "
+            f"{self.get_elapsed():.1f} seconds ({self.get_rates()})")
+
+
+def get_export_progress_path(filepath: Path) -> Path:
+    return filepath.with_name(filepath.name + ".progress")
+
+
+def read_export_progress(progress_path: Path) -> Optional[ExportProgressTypedDict]:
+    try:
+        with open(progress_path, 'r') as f:
+            return cast(ExportProgressTypedDict, json.load(f))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_export_progress(progress_path: Path, progress: ExportProgressTypedDict) -> None:
+    temp_path = progress_path.with_name(progress_path.name + ".tmp")
+    with open(temp_path, 'w') as f:
+        json.dump(progress, f)
+    os.replace(temp_path, progress_path)
+
+
+def fetch_raw_hex_blocks(node_id: str, heights: range, window: int=EXPORT_WINDOW) \
+        -> Iterator[str]:
+    """Yields the blocks in height order. Up to 'window' blocks are requested at a time so that
+    the node is kept busy while only 'window' blocks are held in memory."""
+    client = get_node_rpc_client(node_id)
+
+    def get_block(height: int) -> str:
+        result = client.call('getblockbyheight', height, 0)
+        if result is None:
+            raise NodeRPCError(f"node component: '{node_id}' not found")
+        if result.get('error'):
+            raise NodeRPCError(f"getblockbyheight {height} failed: {result['error']}")
+        return cast(str, result['result'])
+
+    heights_iterator = iter(heights)
+    pending: Deque["concurrent.futures.Future[str]"] = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=window,
+            thread_name_prefix="block-export") as executor:
+        try:
+            for height in itertools.islice(heights_iterator, window):
+                pending.append(executor.submit(get_block, height))
+            while pending:
+                raw_hex_block = pending.popleft().result()
+                for height in itertools.islice(heights_iterator, 1):
+                    pending.append(executor.submit(get_block, height))
+                yield raw_hex_block
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def get_chain_height(node_id: str) -> Optional[int]:
+    result = get_node_rpc_client(node_id).call('getinfo')
+    return int(result['result']['blocks']) if result else None
+
+
+def write_raw_blocks_to_file(filepath: Union[Path, str], node_id: str,
+        from_height: Optional[int]=None, to_height: Optional[int]=None,
+        window: int=EXPORT_WINDOW) -> None:
+    """Appends the blocks 'from_height' to 'to_height' (inclusive - default: the whole chain) to
+    the file. If it is a block archive (see: block_archive.py - e.g. 'blocks.blocks') the blocks
+    are stored in binary form and indexed, otherwise as hex (one line per block). The blocks are
+    streamed to the file in height order (see: fetch_raw_hex_blocks) so memory use does not grow
+    with the number of blocks.
+
+    An interrupted export resumes where it left off if this is called again with the same
+    heights - an archive continues after its last block and a hex file after the progress
+    recorded in '<filepath>.progress'."""
+    filepath = Path(filepath)
     if not to_height:
-        result = call_any_node_rpc('getinfo', node_id=node_id)
-        if result:
-            to_height = int(result['result']['blocks'])
-        else:
+        to_height = get_chain_height(node_id)
+        if to_height is None:
             return
 
     if not from_height:
         from_height = 0
 
-    raw_hex_blocks = []
-    for height in range(from_height, to_height+1):
-        result = call_any_node_rpc('getblockbyheight', str(height), str(0), node_id=node_id)
-        if result:
-            raw_hex_block = result['result']
-            raw_hex_blocks.append(raw_hex_block)
+    if is_block_archive(filepath):
+        write_raw_blocks_to_archive(filepath, node_id, from_height, to_height, window)
+        return
 
-    if not os.path.exists(filepath):
-        open(filepath, 'w').close()
+    progress_path = get_export_progress_path(filepath)
+    progress = read_export_progress(progress_path)
+    with open(filepath, 'ab') as f:
+        if progress and progress['from_height'] == from_height and \
+                progress['to_height'] == to_height:
+            # anything after the recorded offset is a partially written block
+            f.truncate(progress['offset'])
+            logger.info(f"resuming the export to {filepath} at height {progress['next_height']}")
+        else:
+            progress = ExportProgressTypedDict(from_height=from_height, to_height=to_height,
+                next_height=from_height, offset=f.tell())
 
-    with open(filepath, 'a') as f:
-        for line in raw_hex_blocks:
-            f.write(line + "\n")
+        heights = range(progress['next_height'], to_height + 1)
+        meter = ThroughputMeter("exported", len(heights))
+        try:
+            for raw_hex_block in fetch_raw_hex_blocks(node_id, heights, window):
+                line = raw_hex_block.encode() + b"\n"
+                f.write(line)
+                progress['next_height'] += 1
+                if meter.update(len(line)):
+                    f.flush()
+                    progress['offset'] = f.tell()
+                    write_export_progress(progress_path, progress)
+        finally:
+            f.flush()
+            progress['offset'] = f.tell()
+            if progress['next_height'] > to_height:
+                if progress_path.exists():
+                    progress_path.unlink()
+            else:
+                write_export_progress(progress_path, progress)
+    meter.log_summary()
+
+
+def write_raw_blocks_to_archive(filepath: Path, node_id: str, from_height: int, to_height: int,
+        window: int=EXPORT_WINDOW) -> None:
+    with BlockArchiveWriter(filepath) as writer:
+        next_height = from_height
+        if writer.last_height is not None and writer.last_height >= from_height:
+            # the blocks up to the last height were already exported
+            next_height = writer.last_height + 1
+            logger.info(f"resuming the export to {filepath} at height {next_height}")
+
+        heights = range(next_height, to_height + 1)
+        meter = ThroughputMeter("exported", len(heights))
+        for height, raw_hex_block in zip(heights,
+                fetch_raw_hex_blocks(node_id, heights, window)):
+            raw_block = bytes.fromhex(raw_hex_block)
+            writer.append(height, raw_block)
+            if meter.update(len(raw_block)):
+                writer.flush()
+    meter.log_summary()
 
 
 def read_raw_blocks_from_file(filepath: Path) -> List[str]:
+    """hex blocks (of either format - prefer block_archive.BlockArchive for archives)"""
     if not os.path.exists(filepath):
         raise FileNotFoundError
 
+    if is_block_archive(filepath):
+        with BlockArchive(filepath) as archive:
+            return [raw_block.hex() for _entry, raw_block in archive.iter_blocks()]
+
     with open(filepath, 'r') as f:
         return f.readlines()
 
@@ -473,64 +791,148 @@ def delete_raw_blocks_file(filepath: Union[Path, str]) -> None:
     if not os.path.exists(filepath):
         raise FileNotFoundError
 
+    if is_block_archive(filepath):
+        delete_block_archive(filepath)
+        return
     os.remove(filepath)
 
 
-def submit_blocks_from_file(node_id: str, filepath: Union[Path, str]) -> None:
-    if not os.path.exists(filepath):
-        raise FileNotFoundError
+def read_raw_hex_blocks(filepath: Union[Path, str], from_height: Optional[int]=None,
+        to_height: Optional[int]=None, first_height: int=0) \
+        -> Generator[Tuple[int, str], None, None]:
+    """Yields (height, hex block) of either format in file order, one block at a time. A hex file
+    does not record the heights of its blocks so they are numbered from 'first_height'."""
+    if is_block_archive(filepath):
+        with BlockArchive(filepath) as archive:
+            for entry, raw_block in archive.iter_blocks(from_height, to_height):
+                yield entry.height, raw_block.hex()
+        return
 
     with open(filepath, 'r') as f:
-        hex_blocks = f.readlines()
+        height = first_height
+        for line in f:
+            raw_hex_block = line.strip()
+            if not raw_hex_block:
+                continue
+            if to_height is not None and height > to_height:
+                return
+            if from_height is None or height >= from_height:
+                yield height, raw_hex_block
+            height += 1
+
+
+def get_block_batches(blocks: Iterator[Tuple[int, str]], window: int,
+        window_bytes: int=SUBMIT_WINDOW_BYTES) -> Iterator[List[Tuple[int, str]]]:
+    """consecutive blocks grouped into batches of at most 'window' blocks / 'window_bytes'"""
+    batch: List[Tuple[int, str]] = []
+    batch_bytes = 0
+    for height, raw_hex_block in blocks:
+        num_bytes = len(raw_hex_block) // 2
+        if batch and (len(batch) >= window or batch_bytes + num_bytes > window_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append((height, raw_hex_block))
+        batch_bytes += num_bytes
+    if batch:
+        yield batch
+
+
+def submit_blocks_from_file(node_id: str, filepath: Union[Path, str],
+        from_height: Optional[int]=None, to_height: Optional[int]=None,
+        window: int=SUBMIT_WINDOW, first_height: int=0) -> SubmitBlocksResultTypedDict:
+    """Replays the blocks 'from_height' to 'to_height' (inclusive - default: all of them) of the
+    file onto the node in file order i.e. parents first (see: read_raw_hex_blocks).
+
+    The blocks are streamed from the file and submitted as json-rpc batches of up to 'window'
+    blocks over the keep-alive connection of the node's client. The node processes the calls of a
+    batch in order so a block never arrives before its parent, while the next batch is read and
+    queued to be sent as soon as the node has processed the one in flight. The throughput is
+    logged as it goes."""
+    if not os.path.exists(filepath):
+        raise FileNotFoundError
 
-    for hex_block in hex_blocks:
-        call_any_node_rpc('submitblock', hex_block.rstrip('\n'), node_id=node_id)
+    client = get_node_rpc_client(node_id)
+
+    def submit(batch: List[Tuple[int, str]]) -> List[Dict[str, Any]]:
+        batch_requests = [client.make_request('submitblock', raw_hex_block)
+            for _height, raw_hex_block in batch]
+        responses = client.post(batch_requests)
+        if responses is None:
+            raise NodeRPCError(f"node component: '{node_id}' not found")
+        return get_batch_responses(node_id, batch_requests, responses)
+
+    total_blocks: Optional[int] = None
+    if is_block_archive(filepath):
+        with BlockArchive(filepath) as archive:
+            total_blocks = sum(1 for _entry in archive.iter_entries(from_height, to_height))
+
+    meter = ThroughputMeter("submitted", total_blocks)
+    rejected = 0
+
+    def handle_responses(batch: List[Tuple[int, str]], responses: List[Dict[str, Any]]) -> None:
+        nonlocal rejected
+        for (height, raw_hex_block), response in zip(batch, responses):
+            result = f"error: {response['error'].get('message')}" if response.get('error') \
+                else response.get('result')
+            if result not in SUBMIT_ACCEPTED_RESULTS:
+                rejected += 1
+                logger.warning(f"the block at height {height} was rejected: {result}")
+            meter.update(len(raw_hex_block) // 2)
+
+    blocks = read_raw_hex_blocks(filepath, from_height, to_height, first_height)
+    BatchFuture = Tuple[List[Tuple[int, str]], "concurrent.futures.Future[Any]"]
+    in_flight: Optional[BatchFuture] = None
+    # a single worker sends the batches one after the other i.e. in order
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1,
+            thread_name_prefix="block-submit") as executor:
+        try:
+            for batch in get_block_batches(blocks, max(1, window)):
+                previous, in_flight = in_flight, (batch, executor.submit(submit, batch))
+                if previous is not None:
+                    handle_responses(previous[0], previous[1].result())
+            if in_flight is not None:
+                handle_responses(in_flight[0], in_flight[1].result())
+        finally:
+            if in_flight is not None:
+                in_flight[1].cancel()
+            blocks.close()
+
+    meter.log_summary()
+    if rejected:
+        logger.warning(f"{rejected} of {meter.blocks} blocks were rejected")
+    return SubmitBlocksResultTypedDict(submitted=meter.blocks, rejected=rejected,
+        num_bytes=meter.num_bytes, seconds=meter.get_elapsed())
+
+
+def parse_rpc_call(line: str) -> Optional[RPCCall]:
+    """one line of 'node --batch' input - either as it would be given on the command-line (e.g.
+    'getblockhash 10') or as json (e.g. '["getblockhash", 10]' or '{"method": "getblockhash",
+    "params": [10]}'). None for blank lines and comments. Raises ValueError if it is invalid."""
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if line.startswith("{"):
+        call = json.loads(line)
+        if not isinstance(call, dict) or not isinstance(call.get("method"), str) or \
+                not isinstance(call.get("params", []), list):
+            raise ValueError("expected {\"method\": <str>, \"params\": <list>}")
+        return call["method"], call.get("params", [])
+    if line.startswith("["):
+        call = json.loads(line)
+        if not isinstance(call, list) or not call or not isinstance(call[0], str):
+            raise ValueError("expected [<method>, <args>...]")
+        return call[0], call[1:]
+    args = shlex.split(line)
+    return args[0], cast_str_bool_args_to_bool(cast_str_int_args_to_int(args[1:]))
 
 
 def call_any_node_rpc(method: str, *args: str, node_id: str='node1') -> Optional[Any]:
+    """string args are cast to int / bool (e.g. from the command-line). The client of each node
+    is cached so that repeated calls reuse its endpoint and keep-alive connection (see:
+    node_rpc.py)"""
     rpc_args = cast_str_int_args_to_int(list(args))
     rpc_args = cast_str_bool_args_to_bool(rpc_args)
-
-    rpchost = os.getenv("BITCOIN_NODE_HOST")
-    rpcport = int(os.getenv("BITCOIN_NODE_PORT", "0"))
-    if rpchost and rpcport:
-        assert electrumsv_node.is_running(rpcport, rpchost), (
-            "bitcoin node must be running to respond to rpc methods. "
-            "try: electrumsv-sdk start node")
-
-        result = electrumsv_node.call_any(method, *rpc_args, rpchost=rpchost, rpcport=rpcport,
-            rpcuser="rpcuser", rpcpassword="rpcpassword")
-
-        return json.loads(result.content)
-
-    component_store = ComponentStore()
-    DEFAULT_RPCHOST = "127.0.0.1"
-    DEFAULT_RPCPORT = 18332
-    component_dict: Optional[ComponentTypedDict] = \
-        component_store.component_status_data_by_id(node_id)
-    rpchost = DEFAULT_RPCHOST
-    if component_dict is None:
-        logger.error(f"node component: '{node_id}' not found")
-        return None
-
-    assert component_dict is not None  # typing bug
-    metadata = component_dict["metadata"]
-    assert metadata is not None  # typing bug
-    rpcport = int(metadata.get("rpcport", 18332))
-    if not metadata:
-        logger.error(f"could not locate metadata for node instance: {node_id}, "
-                     f"using default of 18332")
-        rpchost = DEFAULT_RPCHOST
-        rpcport = DEFAULT_RPCPORT
-
-    assert electrumsv_node.is_running(rpcport, rpchost), (
-        "bitcoin node must be running to respond to rpc methods. "
-        "try: electrumsv-sdk start node")
-
-    result = electrumsv_node.call_any(method, *rpc_args, rpchost=rpchost, rpcport=rpcport,
-        rpcuser="rpcuser", rpcpassword="rpcpassword")
-
-    return json.loads(result.content)
+    return get_node_rpc_client(node_id).call(method, *rpc_args)
 
 
 def set_deterministic_electrumsv_seed(component_type: str, component_id: Optional[str]=None) -> \
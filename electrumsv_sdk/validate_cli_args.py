@@ -2,8 +2,11 @@
 logging information"""
 import logging
 import platform
+import sys
 
-from .constants import NameSpace
+from .cgroups import is_cgroup_v2_supported
+from .constants import NameSpace, RestartPolicy
+from .cpu_affinity import is_cpu_affinity_supported, parse_cpu_list, validate_cpus
 from .config import CLIInputs, ParsedArgs
 from .utils import read_sdk_version
 
@@ -53,6 +56,44 @@ class ValidateCliArgs:
             logger.debug(f"repo flag={parsed_args.repo}")
         if parsed_args.branch != "":
             logger.debug(f"branch flag={parsed_args.branch}")
+        if parsed_args.restart != RestartPolicy.NEVER:
+            logger.debug(f"restart flag={parsed_args.restart} "
+                f"(max restarts={parsed_args.max_restarts})")
+            if parsed_args.inline or parsed_args.new_terminal:
+                logger.warning("restart policies only apply to background components")
+        if parsed_args.cgroup:
+            logger.debug("cgroup flag=set")
+            if not parsed_args.background:
+                logger.warning("cgroup resource limits only apply to background components")
+            elif not is_cgroup_v2_supported():
+                logger.warning("cgroup v2 is not available - components are started without "
+                    "resource limits")
+        if parsed_args.count != 1:
+            logger.debug(f"count flag={parsed_args.count}")
+            if parsed_args.count < 1:
+                logger.error("--count must be at least 1")
+                sys.exit(1)
+            if not self.cli_inputs.selected_component:
+                logger.error("--count requires a component type e.g. 'start --count=10 node'")
+                sys.exit(1)
+            if parsed_args.id:
+                logger.error("--count cannot be combined with --id (the ids are allocated "
+                    "automatically)")
+                sys.exit(1)
+            if parsed_args.inline:
+                logger.error("--count cannot be combined with --inline")
+                sys.exit(1)
+        if parsed_args.cpus or parsed_args.cpu_layout:
+            logger.debug(f"cpus flag={parsed_args.cpus} cpu layout flag={parsed_args.cpu_layout}")
+            if not is_cpu_affinity_supported():
+                logger.warning("cpu affinity is only supported on linux - the components are "
+                    "not pinned")
+            elif parsed_args.cpus:
+                try:
+                    validate_cpus(parse_cpu_list(parsed_args.cpus))
+                except ValueError as e:
+                    logger.error(f"--cpus: {e}")
+                    sys.exit(1)
 
     def handle_stop_args(self, parsed_args: ParsedArgs) -> None:
         """takes no arguments"""
@@ -79,3 +120,12 @@ class ValidateCliArgs:
 
     def handle_config_args(self, parsed_args: ParsedArgs) -> None:
         return
+
+    def handle_supervisor_args(self, parsed_args: ParsedArgs) -> None:
+        return
+
+    def handle_top_args(self, parsed_args: ParsedArgs) -> None:
+        return
+
+    def handle_logs_args(self, parsed_args: ParsedArgs) -> None:
+        return
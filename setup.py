@@ -84,7 +84,8 @@ setup(
             "electrumsv-server/*",
             "electrumsv_sdk/builtin_components/merchant_api/exe-config/*",
             "electrumsv_sdk/builtin_components/header_sv/exe-config/*",
-            "electrumsv_sdk/builtin_components/dpp_proxy/exe-config/*"
+            "electrumsv_sdk/builtin_components/dpp_proxy/exe-config/*",
+            "electrumsv_sdk/builtin_components/*/manifest.json"
         ],
     },
     packages=find_packages(),